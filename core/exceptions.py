@@ -117,3 +117,24 @@ class UserIsLastAdmin(MontaCoreException):
         This is the constructor for the UserIsLastAdmin class.
         """
         super().__init__("User is the last admin.", 403)
+
+
+class QueryBudgetExceeded(MontaCoreException):
+    """
+    Exception to raise when a view runs more queries than its budget.
+    """
+
+    def __init__(self, view_name: str, query_count: int, budget: int) -> None:
+        """
+        This is the constructor for the QueryBudgetExceeded class.
+
+        :param view_name: Name of the view
+        :type view_name: str
+        :param query_count: Number of queries the view ran
+        :type query_count: int
+        :param budget: Query budget of the view
+        :type budget: int
+        """
+        super().__init__(
+            f"{view_name} ran {query_count} queries, its budget is {budget}.", 500
+        )
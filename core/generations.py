@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save
+
+FRAGMENT_CACHE_TIMEOUT: int = 60 * 60 * 24
+
+ORDERS: str = "orders"
+
+# Models whose saves and deletes bump a family, by model label.
+FAMILY_MODELS: dict[str, tuple[str, ...]] = {
+    ORDERS: (
+        "monta_order.Order",
+        "monta_order.Commodity",
+        "monta_customer.Customer",
+    ),
+}
+
+
+def get_generation_key(family: str, organization_id: int) -> str:
+    """
+    Get the cache key of the generation counter of a family.
+
+    :param family: Model family
+    :type family: str
+    :param organization_id: Id of the organization
+    :type organization_id: int
+    :return: Cache key
+    :rtype: str
+    """
+    return f"monta:generation:{family}:{organization_id}"
+
+
+def _new_generation() -> int:
+    """
+    Start a counter from the clock, so a counter lost from the cache never
+    repeats a generation that is still in cached keys.
+    """
+    return time.time_ns()
+
+
+def get_generations(organization_id: int, families: Iterable[str]) -> dict[str, int]:
+    """
+    Get the current generation of several families with one cache read.
+
+    :param organization_id: Id of the organization
+    :type organization_id: int
+    :param families: Model families
+    :type families: Iterable[str]
+    :return: Generation of every family
+    :rtype: dict[str, int]
+    """
+    keys: dict[str, str] = {
+        family: get_generation_key(family, organization_id) for family in families
+    }
+    found: dict[str, int] = cache.get_many(keys.values())
+    generations: dict[str, int] = {}
+    for family, key in keys.items():
+        if key not in found:
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+        generations[family] = found[key]
+    return generations
+
+
+def bump_generations(organization_ids: Iterable[int], *families: str) -> None:
+    """
+    Move families to a new generation once the current transaction commits.
+
+    Every key built from the old generation stops being read, so cached
+    fragments of the families expire without being deleted. Bumping after the
+    commit keeps a concurrent request from caching the old rows under the new
+    generation.
+
+    :param organization_ids: Ids of the organizations whose rows changed
+    :type organization_ids: Iterable[int]
+    :param families: Model families that changed
+    :type families: str
+    :return: None
+    :rtype: None
+    """
+    keys: list[str] = [
+        get_generation_key(family, organization_id)
+        for organization_id in set(organization_ids)
+        if organization_id is not None
+        for family in families
+    ]
+
+    def bump() -> None:
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _new_generation(), None)
+
+    if keys:
+        transaction.on_commit(bump)
+
+
+def get_versioned_key(
+    name: str, organization_id: int, families: Iterable[str], *parts: Any
+) -> str:
+    """
+    Build a cache key that changes whenever one of the families changes.
+
+    :param name: Name of the cached value
+    :type name: str
+    :param organization_id: Id of the organization
+    :type organization_id: int
+    :param families: Model families the value is built from
+    :type families: Iterable[str]
+    :param parts: Anything else the value varies on
+    :type parts: Any
+    :return: Cache key
+    :rtype: str
+    """
+    generations: dict[str, int] = get_generations(organization_id, families)
+    version: str = ":".join(
+        f"{family}.{generation}" for family, generation in sorted(generations.items())
+    )
+    digest: str = hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+    return f"monta:fragment:{name}:{organization_id}:{version}:{digest}"
+
+
+def get_or_set(
+    name: str,
+    organization_id: int,
+    families: Iterable[str],
+    default: Callable[[], Any],
+    *parts: Any,
+    timeout: int = FRAGMENT_CACHE_TIMEOUT,
+) -> Any:
+    """
+    Get a value cached until one of its families changes, building it on a miss.
+
+    :param name: Name of the cached value
+    :type name: str
+    :param organization_id: Id of the organization
+    :type organization_id: int
+    :param families: Model families the value is built from
+    :type families: Iterable[str]
+    :param default: Builds the value
+    :type default: Callable[[], Any]
+    :param parts: Anything else the value varies on
+    :type parts: Any
+    :param timeout: Seconds the value is kept at most
+    :type timeout: int
+    :return: Cached or built value
+    :rtype: Any
+    """
+    return cache.get_or_set(
+        get_versioned_key(name, organization_id, families, *parts),
+        default,
+        timeout,
+    )
+
+
+def _bump_instance(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """
+    Bump the families of a saved or deleted model.
+    """
+    bump_generations(
+        [getattr(instance, "organization_id", None)],
+        *(
+            family
+            for family, labels in FAMILY_MODELS.items()
+            if sender._meta.label in labels
+        ),
+    )
+
+
+def connect_signals() -> None:
+    """
+    Bump the families of FAMILY_MODELS on every save and delete.
+
+    Bulk writes send no signals, services that bulk write call
+    bump_generations themselves.
+
+    :return: None
+    :rtype: None
+    """
+    for label in {label for labels in FAMILY_MODELS.values() for label in labels}:
+        model: type[Model] = apps.get_model(label)
+        post_save.connect(
+            _bump_instance, sender=model, dispatch_uid=f"generation_{label}_save"
+        )
+        post_delete.connect(
+            _bump_instance, sender=model, dispatch_uid=f"generation_{label}_delete"
+        )
@@ -179,9 +179,9 @@ class MontaGenericDetailView(
             )
 
     def _check_template_attr(self) -> None:
-        if self.template_name:
+        if not self.template_name:
             raise ImproperlyConfigured(
-                f"{self.__class__.__name__} requires the template_name to be None. "
+                f"{self.__class__.__name__} requires the template_name to be set. "
                 "Check your template_name attribute."
             )
 
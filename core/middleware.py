@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from collections.abc import Callable
+from typing import Any
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse
+
+from core.query_inspector import QueryInspector, dump_report
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class QueryInspectorMiddleware:
+    """
+    Record the SQL of every request and enforce per-view query budgets.
+
+    Opt in with MONTA_QUERY_INSPECTOR = True. Budgets are read from the
+    query_budget attribute of the view class (or view function). Exceeding a
+    budget or repeating a statement logs a warning, or raises
+    QueryBudgetExceeded when MONTA_QUERY_BUDGET_STRICT is set. With
+    MONTA_QUERY_REPORT_PATH set, the worst report of every view is merged into
+    that JSON file.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not getattr(settings, "MONTA_QUERY_INSPECTOR", False):
+            raise MiddlewareNotUsed
+        self.get_response: Callable[[HttpRequest], HttpResponse] = get_response
+        self.strict: bool = getattr(settings, "MONTA_QUERY_BUDGET_STRICT", False)
+        self.report_path: str | None = getattr(
+            settings, "MONTA_QUERY_REPORT_PATH", None
+        )
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with QueryInspector(name=request.path) as inspector:
+            request.query_inspector = inspector
+            response: HttpResponse = self.get_response(request)
+
+        report: dict[str, Any] = inspector.report()
+        response["X-Query-Count"] = str(report["query_count"])
+        if self.report_path:
+            dump_report(self.report_path, report)
+        if report["duplicates"]:
+            logger.warning(
+                "Possible N+1 queries in %s: %s", inspector.name, report["duplicates"]
+            )
+        if inspector.over_budget:
+            logger.warning(
+                "%s ran %s queries, its budget is %s",
+                inspector.name,
+                report["query_count"],
+                report["budget"],
+            )
+            if self.strict:
+                inspector.check_budget()
+        return response
+
+    def process_view(
+        self,
+        request: HttpRequest,
+        view_func: Callable[..., Any],
+        view_args: tuple[Any, ...],
+        view_kwargs: dict[str, Any],
+    ) -> None:
+        inspector: QueryInspector = request.query_inspector
+        view: Any = getattr(view_func, "view_class", view_func)
+        inspector.name = f"{view.__module__}.{view.__qualname__}"
+        inspector.budget = getattr(view, "query_budget", None)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import copy
+from typing import Any
+
+from django.db import models
+from django_extensions.db.fields import ModificationDateTimeField
+
+
+class FieldTrackerMixin:
+    """
+    Remember the values a model instance was loaded with.
+
+    The values of the tracked fields are recorded when the instance is loaded
+    from the database and again after every save, so the previous value of a
+    field is known without another query. Saving an existing instance writes
+    only the changed columns, and nothing at all if no column changed. Fields
+    that are not tracked are always written.
+
+    Place the mixin before the model base class.
+
+    Typical Usage Example:
+        >>> class Movement(FieldTrackerMixin, TimeStampedModel):
+        ...     tracked_fields = ("status",)
+        >>> movement = Movement.objects.get(pk=1)
+        >>> movement.status = StatusChoices.IN_PROGRESS
+        >>> movement.has_changed("status")
+        True
+    """
+
+    # Names of the tracked fields, None tracks every concrete field.
+    tracked_fields: tuple[str, ...] | None = None
+
+    _loaded_values: dict[str, Any] | None = None
+
+    @classmethod
+    def from_db(
+        cls, db: str, field_names: list[str], values: list[Any]
+    ) -> models.Model:
+        """
+        Record the loaded values of an instance created from a database row.
+
+        :param db: Database alias the row was read from
+        :type db: str
+        :param field_names: Attribute names of the loaded fields
+        :type field_names: list[str]
+        :param values: Values of the loaded fields
+        :type values: list[Any]
+        :return: Model instance
+        :rtype: models.Model
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._get_tracked_values()
+        return instance
+
+    def _get_tracked_fields(self) -> list[models.Field]:
+        """
+        Concrete fields of the model that are tracked.
+        """
+        return [
+            field
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and (self.tracked_fields is None or field.name in self.tracked_fields)
+        ]
+
+    def _get_tracked_values(self) -> dict[str, Any]:
+        """
+        Current values of the tracked fields that are loaded, keyed by attribute name.
+        """
+        values: dict[str, Any] = {}
+        for field in self._get_tracked_fields():
+            if field.attname in self.__dict__:
+                value: Any = self.__dict__[field.attname]
+                # Only containers can change in place, everything else is kept as is.
+                values[field.attname] = (
+                    copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+                )
+        return values
+
+    def get_loaded_value(self, field: str) -> Any:
+        """
+        Get the value a field had when the instance was loaded or last saved.
+
+        :param field: Name of the field
+        :type field: str
+        :return: Loaded value, None if the field was not loaded
+        :rtype: Any
+        """
+        return (self._loaded_values or {}).get(self._meta.get_field(field).attname)
+
+    def has_changed(self, field: str) -> bool:
+        """
+        Check if a field differs from its loaded value.
+
+        Every field of an instance that has not been loaded from the database
+        counts as changed, a field that was deferred counts as changed once it
+        is assigned.
+
+        :param field: Name of the field
+        :type field: str
+        :return: True if the field changed
+        :rtype: bool
+        """
+        if self._state.adding or self._loaded_values is None:
+            return True
+        attname: str = self._meta.get_field(field).attname
+        if attname not in self._loaded_values:
+            # Deferred when loaded, changed only if it was assigned since.
+            return attname in self.__dict__
+        return self.__dict__.get(attname) != self._loaded_values[attname]
+
+    @property
+    def changed_fields(self) -> set[str]:
+        """
+        Names of the tracked fields that differ from their loaded value.
+
+        :return: Field names
+        :rtype: set[str]
+        """
+        return {
+            field.name
+            for field in self._get_tracked_fields()
+            if self.has_changed(field.name)
+        }
+
+    def refresh_from_db(self, using: str | None = None, fields=None) -> None:
+        """
+        Reload the instance and record the reloaded values.
+
+        :param using: Database alias to read from
+        :type using: str | None
+        :param fields: Fields to reload, every field if None
+        :type fields: Iterable[str] | None
+        :return: None
+        :rtype: None
+        """
+        super().refresh_from_db(using=using, fields=fields)
+        self._loaded_values = {
+            **(self._loaded_values or {}),
+            **self._get_tracked_values(),
+        }
+
+    def save(self, **kwargs: Any) -> None:
+        """
+        Save the instance, writing only the changed columns of a loaded instance.
+
+        :param kwargs: Keyword arguments
+        :type kwargs: Any
+        :return: None
+        :rtype: None
+        """
+        if (
+            not self._state.adding
+            and self._loaded_values is not None
+            and kwargs.get("update_fields") is None
+        ):
+            tracked_fields: list[models.Field] = self._get_tracked_fields()
+            update_fields: set[str] = self.changed_fields | {
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field not in tracked_fields
+                and field.attname in self.__dict__
+            }
+            if update_fields:
+                # Columns set in pre_save, such as the modified time, must be written too.
+                update_fields.update(
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if isinstance(field, ModificationDateTimeField)
+                    or getattr(field, "auto_now", False)
+                )
+            kwargs["update_fields"] = sorted(update_fields)
+        super().save(**kwargs)
+        self._loaded_values = self._get_tracked_values()
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import re
+import threading
+import time
+import traceback
+from collections import defaultdict
+from collections.abc import Callable
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.db import connections
+
+from core.exceptions import QueryBudgetExceeded
+
+# Statements repeated at least this many times in one request are reported
+# as N+1 candidates.
+N_PLUS_ONE_THRESHOLD: int = 3
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:%s|\?|\$\d+)\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_report_lock: threading.Lock = threading.Lock()
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Strip literals from a statement so repeats with different values group together.
+
+    :param sql: SQL statement
+    :type sql: str
+    :return: Normalized statement
+    :rtype: str
+    """
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def get_call_site() -> str:
+    """
+    Get the innermost frame of project code that led to the current statement.
+
+    :return: "path:line in function" or an empty string
+    :rtype: str
+    """
+    base_dir: str = str(getattr(settings, "BASE_DIR", ""))
+    for frame in reversed(traceback.extract_stack()):
+        filename: str = frame.filename
+        if (
+            "site-packages" in filename
+            or "/django/" in filename
+            or filename == __file__
+            or (base_dir and not filename.startswith(base_dir))
+        ):
+            continue
+        if base_dir:
+            filename = str(Path(filename).relative_to(base_dir))
+        return f"{filename}:{frame.lineno} in {frame.name}"
+    return ""
+
+
+@dataclass
+class QueryRecord:
+    """
+    One executed SQL statement.
+    """
+
+    sql: str
+    normalized: str
+    duration: float
+    call_site: str
+
+
+@dataclass
+class QueryInspector:
+    """
+    Record every statement executed on any database connection while active.
+
+    Typical Usage Example:
+        >>> with QueryInspector(name="order_list", budget=5) as inspector:
+        ...     client.get("/order/")
+        >>> inspector.report()["query_count"]
+        3
+    """
+
+    name: str = ""
+    budget: int | None = None
+    threshold: int = N_PLUS_ONE_THRESHOLD
+    queries: list[QueryRecord] = field(default_factory=list)
+    _stack: ExitStack | None = field(default=None, init=False, repr=False)
+
+    def __call__(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,
+        context: dict[str, Any],
+    ) -> Any:
+        """
+        Database execute wrapper that records the statement.
+        """
+        started: float = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                QueryRecord(
+                    sql=sql,
+                    normalized=normalize_sql(sql),
+                    duration=time.perf_counter() - started,
+                    call_site=get_call_site(),
+                )
+            )
+
+    def __enter__(self) -> "QueryInspector":
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._stack is not None:
+            self._stack.close()
+            self._stack = None
+
+    @property
+    def query_count(self) -> int:
+        """
+        Number of statements recorded.
+
+        :return: Query count
+        :rtype: int
+        """
+        return len(self.queries)
+
+    @property
+    def over_budget(self) -> bool:
+        """
+        Whether more statements were recorded than the budget allows.
+
+        :return: True if a budget is set and exceeded
+        :rtype: bool
+        """
+        return self.budget is not None and self.query_count > self.budget
+
+    def get_duplicates(self) -> list[dict[str, Any]]:
+        """
+        Group statements by normalized SQL and return the N+1 candidates.
+
+        :return: Repeated statements with their count and call sites, most repeated first
+        :rtype: list[dict[str, Any]]
+        """
+        groups: defaultdict[str, list[QueryRecord]] = defaultdict(list)
+        for query in self.queries:
+            groups[query.normalized].append(query)
+        return sorted(
+            (
+                {
+                    "sql": normalized,
+                    "count": len(queries),
+                    "call_sites": sorted({query.call_site for query in queries}),
+                }
+                for normalized, queries in groups.items()
+                if len(queries) >= self.threshold
+            ),
+            key=lambda duplicate: -duplicate["count"],
+        )
+
+    def report(self) -> dict[str, Any]:
+        """
+        Summarize the recorded statements.
+
+        :return: Query count, time, budget and N+1 candidates
+        :rtype: dict[str, Any]
+        """
+        return {
+            "name": self.name,
+            "query_count": self.query_count,
+            "duration": round(sum(query.duration for query in self.queries), 4),
+            "budget": self.budget,
+            "over_budget": self.over_budget,
+            "duplicates": self.get_duplicates(),
+        }
+
+    def check_budget(self) -> None:
+        """
+        Raise if the budget was exceeded.
+
+        :return: None
+        :rtype: None
+        :raises QueryBudgetExceeded: If more statements ran than the budget allows
+        """
+        if self.over_budget:
+            raise QueryBudgetExceeded(self.name, self.query_count, self.budget)
+
+
+def dump_report(path: str | Path, report: dict[str, Any]) -> None:
+    """
+    Merge a report into a JSON file keyed by report name.
+
+    Each name keeps the report with the highest query count, so the file
+    holds the worst case of every view and can be diffed between CI runs.
+
+    :param path: JSON file to write
+    :type path: str | Path
+    :param report: Report from QueryInspector.report
+    :type report: dict[str, Any]
+    :return: None
+    :rtype: None
+    """
+    path = Path(path)
+    with _report_lock:
+        reports: dict[str, Any] = json.loads(path.read_text()) if path.exists() else {}
+        existing: dict[str, Any] | None = reports.get(report["name"])
+        if existing is None or report["query_count"] >= existing["query_count"]:
+            reports[report["name"]] = report
+        path.write_text(json.dumps(reports, indent=2, sort_keys=True))
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin to assert the query budget of a block of code.
+
+    Typical Usage Example:
+        >>> class OrderViewTest(QueryBudgetMixin, TestCase):
+        ...     def test_list(self):
+        ...         with self.assertQueryBudget(5):
+        ...             self.client.get("/order/")
+    """
+
+    def assertQueryBudget(
+        self, budget: int, name: str = "", allow_duplicates: bool = False
+    ) -> "_QueryBudgetContext":
+        """
+        Fail if the block runs more than budget queries or contains N+1 patterns.
+
+        :param budget: Maximum number of queries
+        :type budget: int
+        :param name: Name used in the report
+        :type name: str
+        :param allow_duplicates: Do not fail on repeated statements
+        :type allow_duplicates: bool
+        :return: Context manager wrapping the block
+        :rtype: _QueryBudgetContext
+        """
+        return _QueryBudgetContext(
+            self,
+            QueryInspector(name=name or self.id(), budget=budget),
+            allow_duplicates,
+        )
+
+
+class _QueryBudgetContext:
+    """
+    Context manager behind QueryBudgetMixin.assertQueryBudget.
+    """
+
+    def __init__(
+        self, test_case: Any, inspector: QueryInspector, allow_duplicates: bool
+    ) -> None:
+        self.test_case: Any = test_case
+        self.inspector: QueryInspector = inspector
+        self.allow_duplicates: bool = allow_duplicates
+
+    def __enter__(self) -> QueryInspector:
+        return self.inspector.__enter__()
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        self.inspector.__exit__(exc_type, *exc_info)
+        if exc_type is not None:
+            return
+        report: dict[str, Any] = self.inspector.report()
+        report_path: str | None = getattr(settings, "MONTA_QUERY_REPORT_PATH", None)
+        if report_path:
+            dump_report(report_path, report)
+        self.test_case.assertFalse(
+            self.inspector.over_budget,
+            f"{report['query_count']} queries exceeded the budget of "
+            f"{report['budget']}:\n{json.dumps(report, indent=2)}",
+        )
+        if not self.allow_duplicates:
+            self.test_case.assertFalse(
+                report["duplicates"],
+                f"N+1 queries detected:\n{json.dumps(report['duplicates'], indent=2)}",
+            )
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+import pgtrigger
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import F, FloatField, Model, Q, QuerySet
+from django.db.models.functions import Cast
+
+# Text search configuration of the stored vectors, "simple" keeps IDs unstemmed.
+SEARCH_CONFIG: str = "simple"
+SEARCH_LIMIT: int = 25
+SEARCH_CACHE_TIMEOUT: int = 60
+MAX_SEARCH_TERMS: int = 8
+
+
+def search_vector_trigger(document: dict[str, str]) -> pgtrigger.Trigger:
+    """
+    Trigger that keeps the search_vector column of a model current.
+
+    The vector is rebuilt before every insert and update, so a row can be
+    refreshed by setting its search_vector to NULL.
+
+    :param document: SQL expressions on NEW mapped to their weight, A to D
+    :type document: dict[str, str]
+    :return: Trigger for the Meta.triggers of the model
+    :rtype: pgtrigger.Trigger
+    """
+    vector: str = " || ".join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(({expression})::text, '')), '{weight}')"
+        for expression, weight in document.items()
+    )
+    return pgtrigger.Trigger(
+        name="search_vector",
+        when=pgtrigger.Before,
+        operation=pgtrigger.Insert | pgtrigger.Update,
+        func=f"NEW.search_vector := {vector}; RETURN NEW;",
+    )
+
+
+def build_search_query(text: str) -> SearchQuery | None:
+    """
+    Build a query that matches every word of the text as a prefix.
+
+    :param text: Text entered by the user
+    :type text: str
+    :return: Search query or None if the text has no words
+    :rtype: SearchQuery | None
+    """
+    terms: list[str] = re.findall(r"\w+", text.lower())[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return SearchQuery(
+        " & ".join(f"{term}:*" for term in terms),
+        config=SEARCH_CONFIG,
+        search_type="raw",
+    )
+
+
+def encode_cursor(rank: float, pk: Any) -> str:
+    """
+    Encode the position after a result.
+
+    :param rank: Rank of the result
+    :type rank: float
+    :param pk: Primary key of the result
+    :type pk: Any
+    :return: Cursor
+    :rtype: str
+    """
+    return f"{rank!r}:{pk}"
+
+
+def decode_cursor(model: type[Model], cursor: str | None) -> tuple[float, Any] | None:
+    """
+    Decode a cursor made by encode_cursor.
+
+    :param model: Model the cursor points into
+    :type model: type[Model]
+    :param cursor: Cursor
+    :type cursor: str | None
+    :return: Rank and primary key, None if the cursor is missing or invalid
+    :rtype: tuple[float, Any] | None
+    """
+    if not cursor:
+        return None
+    rank, _, pk = cursor.partition(":")
+    try:
+        return float(rank), model._meta.pk.to_python(pk)
+    except (ValueError, ValidationError):
+        return None
+
+
+@dataclass
+class SearchPage:
+    """
+    One page of ranked search results.
+    """
+
+    results: list[Model] = field(default_factory=list)
+    next_cursor: str | None = None
+
+
+def search(
+    queryset: QuerySet[Model],
+    text: str,
+    *,
+    trigram_fields: tuple[str, ...] = (),
+    limit: int = SEARCH_LIMIT,
+    cursor: str | None = None,
+    cache_timeout: int = SEARCH_CACHE_TIMEOUT,
+) -> SearchPage:
+    """
+    Search the stored search vectors of a queryset.
+
+    Rows match when every word of the text prefixes a word of their vector,
+    or when a trigram field is similar to the text, which finds partial IDs.
+    Results are ordered by rank and paged with a cursor, so a page costs the
+    same no matter how deep it is. The primary keys of a page are cached for
+    a short time, a repeated search only loads the rows.
+
+    :param queryset: Rows to search, the model needs a search_vector field
+    :type queryset: QuerySet[Model]
+    :param text: Text entered by the user
+    :type text: str
+    :param trigram_fields: Fields matched by trigram word similarity
+    :type trigram_fields: tuple[str, ...]
+    :param limit: Results per page
+    :type limit: int
+    :param cursor: Cursor of the previous page
+    :type cursor: str | None
+    :param cache_timeout: Seconds a page is cached, 0 disables the cache
+    :type cache_timeout: int
+    :return: Page of results
+    :rtype: SearchPage
+    """
+    query: SearchQuery | None = build_search_query(text)
+    if query is None:
+        return SearchPage()
+
+    rank = SearchRank(F("search_vector"), query)
+    match: Q = Q(search_vector=query)
+    for trigram_field in trigram_fields:
+        rank += TrigramWordSimilarity(text, trigram_field)
+        match |= Q(**{f"{trigram_field}__trigram_word_similar": text})
+    # Double precision survives the round trip, so the rank of a cursor compares equal.
+    ranked = queryset.filter(match).annotate(search_rank=Cast(rank, FloatField()))
+
+    position: tuple[float, Any] | None = decode_cursor(queryset.model, cursor)
+    if position is not None:
+        ranked = ranked.filter(
+            Q(search_rank__lt=position[0])
+            | Q(search_rank=position[0], pk__lt=position[1])
+        )
+    ranked = ranked.order_by("-search_rank", "-pk").values_list("pk", "search_rank")
+
+    cache_key: str = (
+        "monta_search:" + hashlib.md5(f"{ranked.query}|{limit}".encode()).hexdigest()
+    )
+    page: tuple[list[Any], str | None] | None = (
+        cache.get(cache_key) if cache_timeout else None
+    )
+    if page is None:
+        rows: list[tuple[Any, float]] = list(ranked[: limit + 1])
+        page = (
+            [pk for pk, _ in rows[:limit]],
+            encode_cursor(rows[limit - 1][1], rows[limit - 1][0])
+            if len(rows) > limit
+            else None,
+        )
+        if cache_timeout:
+            cache.set(cache_key, page, cache_timeout)
+
+    pks, next_cursor = page
+    objects: dict[Any, Model] = queryset.in_bulk(pks)
+    return SearchPage(
+        results=[objects[pk] for pk in pks if pk in objects],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import threading
+import weakref
+
+from django.db import connection
+
+# Every sequence handed to an allocator must be created with this increment,
+# each nextval() call then reserves one block of ids for the process.
+SEQUENCE_BLOCK_SIZE: int = 20
+
+_allocators: weakref.WeakSet["SequenceAllocator"] = weakref.WeakSet()
+
+
+class SequenceAllocator:
+    """
+    Hand out numbers from a PostgreSQL sequence in blocks cached in the process.
+
+    nextval() is never rolled back and never waits on other transactions, so
+    concurrent callers cannot collide or serialize on a table scan. Numbers of a
+    block that a process never hands out are skipped, which leaves gaps but
+    never duplicates.
+
+    Typical Usage Example:
+        >>> order_id_sequence = SequenceAllocator("monta_seq_order_id")
+        >>> order_id_sequence.next_value()
+        41
+    """
+
+    def __init__(
+        self, sequence_name: str, block_size: int = SEQUENCE_BLOCK_SIZE
+    ) -> None:
+        """
+        :param sequence_name: Name of the database sequence
+        :type sequence_name: str
+        :param block_size: INCREMENT BY of the database sequence
+        :type block_size: int
+        """
+        self.sequence_name: str = sequence_name
+        self.block_size: int = block_size
+        self._lock: threading.Lock = threading.Lock()
+        self._next: int = 0
+        self._last: int = -1
+        _allocators.add(self)
+
+    def reset(self) -> None:
+        """
+        Drop the cached block so the next call reserves a new one.
+
+        :return: None
+        :rtype: None
+        """
+        self._lock = threading.Lock()
+        self._next = 0
+        self._last = -1
+
+    def _reserve_block(self) -> int:
+        """
+        Reserve the next block of numbers from the database.
+
+        :return: First number of the block
+        :rtype: int
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s)", [self.sequence_name])
+            return cursor.fetchone()[0]
+
+    def next_values(self, count: int) -> list[int]:
+        """
+        Get the next count numbers, reserving as many blocks as needed.
+
+        :param count: How many numbers to hand out
+        :type count: int
+        :return: Numbers in ascending order
+        :rtype: list[int]
+        """
+        values: list[int] = []
+        with self._lock:
+            while len(values) < count:
+                if self._next > self._last:
+                    start: int = self._reserve_block()
+                    self._next, self._last = start, start + self.block_size - 1
+                take: int = min(count - len(values), self._last - self._next + 1)
+                values.extend(range(self._next, self._next + take))
+                self._next += take
+        return values
+
+    def next_value(self) -> int:
+        """
+        Get the next number.
+
+        :return: Next number of the sequence
+        :rtype: int
+        """
+        return self.next_values(1)[0]
+
+
+def _reset_after_fork() -> None:
+    """
+    Forked workers must not hand out the block cached by their parent.
+    """
+    for allocator in list(_allocators):
+        allocator.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+order_id_sequence: SequenceAllocator = SequenceAllocator("monta_seq_order_id")
+batch_name_sequence: SequenceAllocator = SequenceAllocator("monta_seq_batch_name")
+manifest_number_sequence: SequenceAllocator = SequenceAllocator(
+    "monta_seq_manifest_number"
+)
+driver_id_sequence: SequenceAllocator = SequenceAllocator("monta_seq_driver_id")
+fleet_id_sequence: SequenceAllocator = SequenceAllocator("monta_seq_fleet_id")
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from unittest import skipUnless
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from django.template import engines
+from django.template.response import TemplateResponse
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.views import View
+
+from core import generations
+from core.exceptions import QueryBudgetExceeded
+from core.query_inspector import QueryBudgetMixin, QueryInspector, normalize_sql
+from core.search import build_search_query, decode_cursor, encode_cursor, search
+from core.sequences import SequenceAllocator
+from core.views import GenerationCacheMixin
+from monta_billing.models import ChargeType
+from monta_driver.models import Driver
+from monta_order.models import Commodity
+from monta_user.factories.organization import OrganizationFactory
+from monta_user.factories.user import ProfileFactory
+
+
+class QueryInspectorTest(QueryBudgetMixin, TestCase):
+    def test_normalize_sql(self) -> None:
+        """
+        Test that statements differing only in literals normalize the same
+        """
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id = 1 AND name = 'a''b'"),
+            normalize_sql("SELECT  *  FROM t WHERE id = 22 AND name = 'c'"),
+        )
+        self.assertEqual(
+            normalize_sql('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            'SELECT * FROM "t" WHERE "id" IN (...)',
+        )
+
+    def test_detects_n_plus_one(self) -> None:
+        """
+        Test that a query repeated in a loop is reported with its call site
+        """
+        with QueryInspector(name="loop") as inspector:
+            for pk in range(3):
+                Permission.objects.filter(pk=pk).exists()
+        duplicates = inspector.report()["duplicates"]
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0]["count"], 3)
+        self.assertIn("test_detects_n_plus_one", duplicates[0]["call_sites"][0])
+
+    def test_budget(self) -> None:
+        """
+        Test that exceeding the budget raises and staying within it does not
+        """
+        with self.assertQueryBudget(1):
+            Permission.objects.exists()
+
+        with QueryInspector(name="view", budget=1) as inspector:
+            Permission.objects.exists()
+            Permission.objects.count()
+        with self.assertRaises(QueryBudgetExceeded):
+            inspector.check_budget()
+
+
+class FieldTrackerMixinTest(TestCase):
+    def setUp(self) -> None:
+        Driver.objects.create(
+            organization=OrganizationFactory.create(),
+            first_name="Jane",
+            last_name="Smith",
+        )
+        self.driver = Driver.objects.get()
+
+    def test_changed_fields(self) -> None:
+        """
+        Test that changes are detected against the loaded values
+        """
+        self.assertEqual(self.driver.changed_fields, set())
+        self.driver.last_name = "Jones"
+        self.assertTrue(self.driver.has_changed("last_name"))
+        self.assertFalse(self.driver.has_changed("first_name"))
+        self.assertEqual(self.driver.changed_fields, {"last_name"})
+        self.assertEqual(self.driver.get_loaded_value("last_name"), "Smith")
+
+    def test_save_writes_changed_columns(self) -> None:
+        """
+        Test that saving writes only the changed columns and resets the loaded values
+        """
+        self.driver.last_name = "Jones"
+        with CaptureQueriesContext(connection) as queries:
+            self.driver.save()
+        update = next(
+            query["sql"] for query in queries if query["sql"].startswith("UPDATE")
+        )
+        self.assertIn("last_name", update)
+        self.assertNotIn("first_name", update)
+        self.assertEqual(self.driver.changed_fields, set())
+        self.assertEqual(Driver.objects.get().last_name, "Jones")
+
+    def test_refresh_from_db(self) -> None:
+        """
+        Test that reloading an instance records the reloaded values
+        """
+        Driver.objects.update(first_name="Janet")
+        self.driver.refresh_from_db()
+        self.assertEqual(self.driver.changed_fields, set())
+        self.assertEqual(self.driver.get_loaded_value("first_name"), "Janet")
+
+
+class FakeSequenceAllocator(SequenceAllocator):
+    """
+    Allocator that counts block reservations instead of calling the database
+    """
+
+    def __init__(self, block_size: int) -> None:
+        super().__init__("fake_sequence", block_size=block_size)
+        self.reserved_blocks: int = 0
+
+    def _reserve_block(self) -> int:
+        self.reserved_blocks += 1
+        return (self.reserved_blocks - 1) * self.block_size + 1
+
+
+class SequenceAllocatorTest(TestCase):
+    def test_allocator_caches_blocks(self) -> None:
+        """
+        Test that numbers are handed out from a cached block
+        """
+        allocator = FakeSequenceAllocator(block_size=5)
+        self.assertEqual([allocator.next_value() for _ in range(3)], [1, 2, 3])
+        self.assertEqual(allocator.reserved_blocks, 1)
+        self.assertEqual(allocator.next_values(4), [4, 5, 6, 7])
+        self.assertEqual(allocator.reserved_blocks, 2)
+
+    def test_allocator_reset_skips_cached_block(self) -> None:
+        """
+        Test that a reset allocator never hands out numbers twice
+        """
+        allocator = FakeSequenceAllocator(block_size=5)
+        allocator.next_value()
+        allocator.reset()
+        self.assertEqual(allocator.next_value(), 6)
+
+
+class SearchTest(TestCase):
+    def test_build_search_query(self) -> None:
+        """
+        Test that every word of the text is matched as a prefix
+        """
+        query = build_search_query("DRV-0012, smith!")
+        self.assertEqual(query.source_expressions[-1].value, "drv:* & 0012:* & smith:*")
+        self.assertIsNone(build_search_query(" ;& "))
+
+    def test_cursor_round_trip(self) -> None:
+        """
+        Test that a cursor decodes to the rank and primary key it was made from
+        """
+        cursor: str = encode_cursor(0.1 + 0.2, 42)
+        self.assertEqual(decode_cursor(Driver, cursor), (0.1 + 0.2, 42))
+        self.assertIsNone(decode_cursor(Driver, "0.5:not-a-pk"))
+        self.assertIsNone(decode_cursor(Driver, None))
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "Search vectors are kept by PostgreSQL triggers"
+)
+class SearchDatabaseTest(TestCase):
+    def setUp(self) -> None:
+        organization = OrganizationFactory.create()
+        self.by_name = [
+            ChargeType.objects.create(organization=organization, name=f"Fuel {index}")
+            for index in range(5)
+        ]
+        self.by_description = [
+            ChargeType.objects.create(
+                organization=organization,
+                name=f"Surcharge {index}",
+                description="Fuel surcharge",
+            )
+            for index in range(3)
+        ]
+        ChargeType.objects.create(organization=organization, name="Detention")
+
+    def test_trigger_populates_vector(self) -> None:
+        """
+        Test that inserts and updates store the search vector of the row
+        """
+        self.assertFalse(ChargeType.objects.filter(search_vector=None).exists())
+        ChargeType.objects.filter(name="Detention").update(name="Layover")
+        self.assertEqual(
+            [
+                charge_type.name
+                for charge_type in search(
+                    ChargeType.objects.all(), "layov", cache_timeout=0
+                ).results
+            ],
+            ["Layover"],
+        )
+
+    def test_rank_and_cursor_pages(self) -> None:
+        """
+        Test that pages follow the rank and the cursor walks every match once
+        """
+        results: list[ChargeType] = []
+        cursor: str | None = None
+        pages: int = 0
+        while True:
+            page = search(
+                ChargeType.objects.all(),
+                "fuel",
+                limit=3,
+                cursor=cursor,
+                cache_timeout=0,
+            )
+            results += page.results
+            pages += 1
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(results), len({result.pk for result in results}))
+        # Name matches weigh more than description matches.
+        self.assertEqual(
+            {result.pk for result in results[:5]},
+            {charge_type.pk for charge_type in self.by_name},
+        )
+        self.assertEqual(
+            {result.pk for result in results[5:]},
+            {charge_type.pk for charge_type in self.by_description},
+        )
+
+
+class RenderView(View):
+    renders: int = 0
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        RenderView.renders += 1
+        return TemplateResponse(
+            request,
+            engines["django"].from_string("Render {{ renders }}"),
+            {"renders": RenderView.renders},
+        )
+
+
+class CachedRenderView(GenerationCacheMixin, RenderView):
+    cache_families = (generations.ORDERS,)
+
+
+class GenerationCacheTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.profile = ProfileFactory.create()
+        self.organization_id = self.profile.organization_id
+        RenderView.renders = 0
+
+    def get(self, **headers: str) -> HttpResponse:
+        request = RequestFactory().get("/orders/", **headers)
+        request.user = self.profile.user
+        return CachedRenderView.as_view()(request)
+
+    def test_bump_changes_key(self) -> None:
+        """
+        Test that a bump only moves the keys of the organization that changed
+        """
+        other_id = OrganizationFactory.create().id
+        key = generations.get_versioned_key("x", self.organization_id, ["orders"])
+        other_key = generations.get_versioned_key("x", other_id, ["orders"])
+        with self.captureOnCommitCallbacks(execute=True):
+            generations.bump_generations([self.organization_id], generations.ORDERS)
+        self.assertNotEqual(
+            generations.get_versioned_key("x", self.organization_id, ["orders"]), key
+        )
+        self.assertEqual(
+            generations.get_versioned_key("x", other_id, ["orders"]), other_key
+        )
+
+    def test_save_bumps_after_commit(self) -> None:
+        """
+        Test that saving a model of a family bumps it once the transaction commits
+        """
+        before = generations.get_generations(self.organization_id, ["orders"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Commodity.objects.create(
+                organization_id=self.organization_id,
+                commodity_id="FOOD",
+                name="Food",
+            )
+            self.assertEqual(
+                generations.get_generations(self.organization_id, ["orders"]), before
+            )
+        self.assertNotEqual(
+            generations.get_generations(self.organization_id, ["orders"]), before
+        )
+
+    def test_page_cached_until_orders_change(self) -> None:
+        """
+        Test that a page is rendered once per generation and revalidated by ETag
+        """
+        response = self.get()
+        self.assertEqual(response.content, b"Render 1")
+        self.assertEqual(self.get().content, b"Render 1")
+        self.assertEqual(
+            self.get(HTTP_IF_NONE_MATCH=response.headers["ETag"]).status_code, 304
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            generations.bump_generations([self.organization_id], generations.ORDERS)
+        self.assertEqual(
+            self.get(HTTP_IF_NONE_MATCH=response.headers["ETag"]).content,
+            b"Render 2",
+        )
@@ -18,15 +18,18 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import hashlib
+
 # If you use anything less than python 3.11 you will have to change
 # the import to >>> from typing import Any, Type
-
 from typing import Any, Type
 
 from braces import views
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth import mixins
-from django.contrib.postgres.search import SearchQuery, SearchRank
-from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
 from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Model, QuerySet
 from django.forms import Form
@@ -36,8 +39,10 @@ from django.http import JsonResponse
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response
 from django.views import generic
 
+from core import generations, search
 from core.generic import (
     MontaGenericCreateView,
     MontaGenericDeleteView,
@@ -54,6 +59,8 @@ class MontaTemplateView(MontaGenericTemplateView):
 
     permission_required: str
     context_data: dict[str, Any] | None = None
+    # Maximum queries per request, enforced by QueryInspectorMiddleware.
+    query_budget: int | None = None
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         """
@@ -70,6 +77,73 @@ class MontaTemplateView(MontaGenericTemplateView):
         return super().get_context_data(**context)
 
 
+class GenerationCacheMixin:
+    """
+    Cache the rendered page of a template view until its model families change.
+
+    Pages are cached per organization, session and path under a key holding
+    the generation of every family in cache_families, see core.generations.
+    The key is sent as the ETag, so a browser revalidating an unchanged page
+    gets a 304 without the page being rendered or read from the cache.
+
+    Typical Usage Example:
+        >>> class OrderBoardView(GenerationCacheMixin, MontaTemplateView):
+        ...     cache_families = (generations.ORDERS,)
+    """
+
+    cache_families: tuple[str, ...] = ()
+    cache_timeout: int = generations.FRAGMENT_CACHE_TIMEOUT
+
+    def get_cache_key(self, request: HttpRequest) -> str:
+        """
+        Get the cache key of the page for a request.
+
+        :param request: The request object
+        :type request: HttpRequest
+        :return: Cache key
+        :rtype: str
+        """
+        return generations.get_versioned_key(
+            f"page:{self.__class__.__module__}.{self.__class__.__qualname__}",
+            request.user.profile.organization_id,
+            self.cache_families,
+            request.user.pk,
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME, ""),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+            request.get_full_path(),
+        )
+
+    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        """
+        Serve the page from the cache, rendering and caching it on a miss.
+
+        :param request: The request object
+        :type request: HttpRequest
+        :param args: The args
+        :param kwargs: The kwargs
+        :return: Rendered page, or a 304 if the browser has it
+        :rtype: HttpResponse
+        """
+        key: str = self.get_cache_key(request)
+        etag: str = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+        not_modified: HttpResponse | None = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        content: bytes | None = cache.get(key)
+        if content is None:
+            response: HttpResponse = super().get(request, *args, **kwargs)
+            response.render()
+            # Pending messages are shown once, a page showing them is not reused.
+            if response.status_code != 200 or len(messages.get_messages(request)):
+                return response
+            cache.set(key, response.content, self.cache_timeout)
+        else:
+            response = HttpResponse(content)
+        response.headers["ETag"] = etag
+        return response
+
+
 class MontaCreateView(MontaGenericCreateView):
     """
     View for creating a new object, with a Json response.
@@ -151,6 +225,7 @@ class MontaDetailView(MontaGenericDetailView):
     filter_organization: bool = True
     select_related: bool = False
     select_related_fields: list[str] | tuple[str, ...]
+    query_budget: int | None = None
 
     def get_queryset(self) -> QuerySet[Model]:
         """
@@ -202,14 +277,27 @@ class MontaSearchView(
 ):
     """
     View for searching an object, with a template response
+
+    The model must have a search_vector field kept current by
+    core.search.search_vector_trigger. Subclasses opt in by declaring the
+    model and, optionally, the ID fields to match partially.
+
+    Typical Usage Example:
+        >>> class DriverSearchView(MontaSearchView):
+        ...     model = models.Driver
+        ...     search_trigram_fields = ("driver_id",)
     """
 
     permission_required: str
     template_name: str
     model: Type[Model]
     form_class: Type[Form]
-    search_vector: str
-    filter_organization: bool
+    filter_organization: bool = True
+    # Fields matched by trigram similarity, so partial IDs are found.
+    search_trigram_fields: tuple[str, ...] = ()
+    search_select_related: tuple[str, ...] = ()
+    search_limit: int = search.SEARCH_LIMIT
+    search_cache_timeout: int = search.SEARCH_CACHE_TIMEOUT
 
     def __init__(self) -> None:
         """
@@ -221,6 +309,28 @@ class MontaSearchView(
                 raise ImproperlyConfigured(
                     "MontaSearchView.form_class must be a subclass of BaseForm."
                 )
+        try:
+            self.model._meta.get_field("search_vector")
+        except FieldDoesNotExist as e:
+            raise ImproperlyConfigured(
+                f"{self.model.__name__} must have a search_vector field to be searched."
+            ) from e
+
+    def get_search_queryset(self) -> QuerySet[Model]:
+        """
+        Get the rows the search runs over.
+
+        :return: Queryset of the model
+        :rtype: QuerySet[Model]
+        """
+        queryset: QuerySet[Model] = self.model.objects.all()
+        if self.search_select_related:
+            queryset = queryset.select_related(*self.search_select_related)
+        if self.filter_organization:
+            queryset = queryset.filter(
+                organization=self.request.user.profile.organization
+            )
+        return queryset
 
     def get(self, request: ASGIRequest, *args: Any, **kwargs: Any) -> HttpResponse:  # type: ignore
         """
@@ -233,37 +343,24 @@ class MontaSearchView(
         """
         query = request.GET["query"] if "query" in request.GET else None
         form: Form = self.form_class(request.GET)
-        results: QuerySet[Model] = self.model.objects.none()
+        page: search.SearchPage = search.SearchPage()
         if query:
             form: Form = self.form_class({"query": query})
-            search_query: SearchQuery = SearchQuery(query)
-            if self.filter_organization:
-                results: QuerySet[Model] = (
-                    self.model.objects.annotate(
-                        search=self.search_vector,
-                        rank=SearchRank(self.search_vector, search_query),
-                    )
-                    .filter(
-                        search=search_query,
-                        organization=self.request.user.profile.organization,
-                    )
-                    .order_by("-rank")
-                )
-            else:
-                results: QuerySet[Model] = (
-                    self.model.objects.annotate(
-                        search=self.search_vector,
-                        rank=SearchRank(self.search_vector, search_query),
-                    )
-                    .filter(search=search_query)
-                    .order_by("-rank")
-                )
+            page = search.search(
+                self.get_search_queryset(),
+                query,
+                trigram_fields=self.search_trigram_fields,
+                limit=self.search_limit,
+                cursor=request.GET.get("cursor"),
+                cache_timeout=self.search_cache_timeout,
+            )
         return render(
             self.request,
             self.template_name,
             {
                 "form": form,
                 "query": query,
-                "results": results,
+                "results": page.results,
+                "next_cursor": page.next_cursor,
             },
         )
@@ -5,3 +5,8 @@ from django.apps import AppConfig
 class MontaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "monta"
+
+    def ready(self):
+        from core import generations
+
+        generations.connect_signals()
@@ -18,14 +18,10 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models.base import ModelBase
 
-from core.exceptions import UserNotFound
 from monta_user.models import MontaUser
-
-UserModel: ModelBase = get_user_model()
+from monta_user.services import identity
 
 
 class MontaBackend(ModelBackend):
@@ -37,17 +33,17 @@ class MontaBackend(ModelBackend):
         """
         Get the user object
 
-        # TODO - Optimize the query to not return so much data. Use .only() on the ORM query.
+        The user, profile, organization and permission set come from the
+        identity cache until the entry is invalidated by a change to any of
+        them. The password hash is never cached, so the session hash check of
+        an authenticated request loads it with one query.
 
         :param user_id: The user id of the user
         :type user_id: int
         :return: The user object or None if the user does not exist
         :rtype: AbstractBaseUser | None
         """
-        try:
-            user: MontaUser = UserModel._default_manager.select_related(
-                "profile", "profile__title", "profile__organization"
-            ).get(pk__exact=user_id)
-        except UserNotFound:
+        user: MontaUser | None = identity.get_cached_user(user_id)
+        if user is None:
             return None
         return user if self.user_can_authenticate(user) else None
@@ -18,31 +18,77 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import inspect
 from functools import wraps
 from typing import Any, Callable, Type
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.handlers.asgi import ASGIRequest
 from django.db import models
 from ninja.responses import Response
 
 
-def check_organization(model: Type[models.Model]) -> Callable[..., Any]:
+def check_organization(
+    model: Type[models.Model], lookup: str = "id", fetch: bool = True
+) -> Callable[..., Any]:
     """
     Decorator to check if the record belongs to user organization
+
+    The decorator must be placed below the ``@api`` route decorator so Ninja
+    registers the wrapped handler. The record named by the ``lookup`` path
+    parameter is loaded with a single query and compared on
+    ``organization_id``. With ``fetch`` the record is shared with the handler as
+    ``request.record`` so the handler does not load it again, otherwise only
+    the organization id is read. A handler without the ``lookup`` parameter
+    is a configuration error, the check never passes it through unchecked.
+
+    :param model: Model of the record
+    :type model: Type[models.Model]
+    :param lookup: Name of the path parameter holding the primary key
+    :type lookup: str
+    :param fetch: Load the whole record and attach it to the request
+    :type fetch: bool
+    :return: Decorator
+    :rtype: Callable[..., Any]
+    :raises ImproperlyConfigured: If the handler has no ``lookup`` parameter
     """
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        if lookup not in inspect.signature(func).parameters:
+            raise ImproperlyConfigured(
+                f"{func.__qualname__} has no {lookup!r} parameter to check the organization of"
+            )
+
         @wraps(func)
         def wrapper(request: ASGIRequest, *args, **kwargs) -> Response | Any:
             """
             Wrapper function
             """
-            record = model.objects.get(id=kwargs["id"])
-            if record.organization != request.user.profile.organization:
+            if lookup not in kwargs:
+                raise ImproperlyConfigured(
+                    f"{func.__qualname__} was called without its {lookup!r} parameter"
+                )
+
+            queryset = model.objects.filter(pk=kwargs[lookup])
+            if fetch:
+                record: models.Model | None = queryset.first()
+                organization_id: int | None = (
+                    record.organization_id if record is not None else None
+                )
+            else:
+                organization_id = queryset.values_list(
+                    "organization_id", flat=True
+                ).first()
+
+            if organization_id is None:
+                return Response({"error": "Record not found"}, status=404)
+            if organization_id != request.user.profile.organization_id:
                 return Response(
                     {"error": "Record does not belong to your organization"},
                     status=403,
                 )
+            if fetch:
+                request.record = record
             return func(request, *args, **kwargs)
 
         return wrapper
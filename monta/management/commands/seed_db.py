@@ -137,6 +137,7 @@ class Command(BaseCommand):
             name="test",
             description="test delay code - do not use in production",
             organization=organization,
+            is_default=True,
         )
         OrderType.objects.create(
             name="test",
@@ -25,15 +25,20 @@ from django.views.decorators.http import require_safe
 from django.views.decorators.vary import vary_on_cookie
 from django.views.generic import TemplateView
 
+from core import generations
+from core.views import GenerationCacheMixin
+
 
 @method_decorator(require_safe, name="dispatch")
-@method_decorator(cache_control(max_age=60 * 60 * 24), name="dispatch")
+@method_decorator(cache_control(private=True, no_cache=True), name="dispatch")
 @method_decorator(vary_on_cookie, name="dispatch")
-class HomePage(LoginRequiredMixin, TemplateView):
+class HomePage(LoginRequiredMixin, GenerationCacheMixin, TemplateView):
     """
     Class to render homepage.
 
-    # TODO: Pop the cache if something changes.
+    The page is cached on the server until the organization's orders change,
+    browsers revalidate it with its ETag.
     """
 
     template_name: str = "homepage/index.html"
+    cache_families: tuple[str, ...] = (generations.ORDERS,)
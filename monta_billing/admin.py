@@ -95,9 +95,46 @@ class BillingExceptionAdmin(admin.ModelAdmin):
         "order",
         "exception_type",
         "exception_message",
+        "resolved_at",
     )
     search_fields: tuple[str, ...] = (
         "order",
         "exception_type",
         "exception_message",
     )
+
+
+@admin.register(models.BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    """
+    Admin for BillingRun
+    """
+
+    list_display: tuple[str, ...] = (
+        "run_type",
+        "status",
+        "completed_chunks",
+        "total_chunks",
+        "created",
+    )
+    list_filter: tuple[str, ...] = (
+        "run_type",
+        "status",
+    )
+
+
+@admin.register(models.EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """
+    Admin for EmailOutbox
+    """
+
+    list_display: tuple[str, ...] = (
+        "subject",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "sent_at",
+    )
+    list_filter: tuple[str, ...] = ("status",)
+    search_fields: tuple[str, ...] = ("subject",)
@@ -28,7 +28,8 @@ from ninja.pagination import paginate
 from ninja.responses import Response
 
 from monta import decorators
-from monta_billing import models, schema
+from monta_billing import models, schema, tasks
+from monta_billing.services import billing_run, charges
 
 """
 NOTE: Do not add docstrings to this file. Docstrings are added to the generated
@@ -39,7 +40,6 @@ included in the documentation.
 api: NinjaAPI = NinjaAPI(csrf=True, version="1.0.0")
 
 
-@decorators.check_organization(models.ChargeType)
 @api.post("/charge_types", tags=["Charge Types"])
 def create_charge_type(
     request: ASGIRequest, payload: schema.ChargeTypeIn
@@ -56,19 +56,17 @@ def create_charge_type(
     return schema.ChargeTypeIn.from_orm(charge_type)
 
 
-@decorators.check_organization(models.ChargeType)
 @api.get(
     "/charge_types/{charge_id}", response=schema.ChargeTypeSchema, tags=["Charge Types"]
 )
+@decorators.check_organization(models.ChargeType, lookup="charge_id")
 def get_charge_type(request: ASGIRequest, charge_id: int) -> models.ChargeType:
     """
     Get a charge type by id
     """
-    charge_type: models.ChargeType = get_object_or_404(models.ChargeType, pk=charge_id)
-    return charge_type
+    return request.record
 
 
-@decorators.check_organization(models.ChargeType)
 @api.get("/charge_types", response=List[schema.ChargeTypeSchema], tags=["Charge Types"])
 @paginate
 def list_charge_types(request: ASGIRequest) -> QuerySet[models.ChargeType] | QuerySet:
@@ -85,31 +83,96 @@ def list_charge_types(request: ASGIRequest) -> QuerySet[models.ChargeType] | Que
     return queryset
 
 
-@decorators.check_organization(models.ChargeType)
 @api.put("/charge_types/{charge_id}", tags=["Charge Types"])
+@decorators.check_organization(models.ChargeType, lookup="charge_id")
 def update_charge_type(
     request: ASGIRequest, charge_id: int, payload: schema.ChargeTypeSchema
 ) -> Response | schema.ChargeTypeSchema:
     """
     Update a charge type
     """
-    charge_type: models.ChargeType = models.ChargeType.objects.get(
-        pk__exact=charge_id, organization=request.user.profile.organization
-    )
+    charge_type: models.ChargeType = request.record
     for attr, value in payload.dict().items():
         setattr(charge_type, attr, value)
     charge_type.save()
     return schema.ChargeTypeSchema.from_orm(charge_type)
 
 
-@decorators.check_organization(models.ChargeType)
 @api.delete("/charge_types/{charge_id}", tags=["Charge Types"])
+@decorators.check_organization(models.ChargeType, lookup="charge_id")
 def delete_charge_type(request: ASGIRequest, charge_id: int) -> Response:
     """
     Delete a charge type
     """
-    charge_type: models.ChargeType = models.ChargeType.objects.get(
-        pk__exact=charge_id, organization=request.user.profile.organization
-    )
-    charge_type.delete()
+    request.record.delete()
     return Response({"detail": "Charge type deleted."}, status=204)
+
+
+@api.post(
+    "/billing_runs",
+    response={200: schema.BillingRunSchema, 403: schema.ErrorSchema},
+    tags=["Billing Runs"],
+)
+def start_billing_run(
+    request: ASGIRequest, payload: schema.BillingRunIn
+) -> models.BillingRun | Response:
+    """
+    Start a transfer or billing run in the background
+
+    Note:
+    - **Organization** is set to the organization of the user making the request
+    - An unfinished run of the same type is resumed from its last finished chunk
+    - Transfer runs need the transfer to billing permission, billing runs the bill orders permission
+    """
+    if not request.user.has_perm(billing_run.RUN_PERMISSIONS[payload.run_type]):
+        return Response({"detail": "Permission denied."}, status=403)
+    run: models.BillingRun = billing_run.start_run(
+        organization_id=request.user.profile.organization_id,
+        run_type=payload.run_type,
+        user_id=request.user.id,
+        chunk_size=payload.chunk_size,
+    )
+    tasks.dispatch_run(run)
+    return run
+
+
+@api.get(
+    "/billing_runs/{run_id}", response=schema.BillingRunSchema, tags=["Billing Runs"]
+)
+def get_billing_run(request: ASGIRequest, run_id: int) -> models.BillingRun:
+    """
+    Get the progress of a billing run
+    """
+    return get_object_or_404(
+        models.BillingRun,
+        pk=run_id,
+        organization_id=request.user.profile.organization_id,
+    )
+
+
+@api.post(
+    "/additional_charges",
+    response={201: List[schema.AdditionalChargeSchema], 400: schema.ErrorSchema},
+    tags=["Additional Charges"],
+)
+def add_additional_charges(
+    request: ASGIRequest, payload: schema.AdditionalChargeBatchIn
+) -> tuple[int, list[models.AdditionalCharge]] | Response:
+    """
+    Add many additional charges to many orders at once
+
+    Note:
+    - **Organization** is set to the organization of the user making the request
+    - The other charge amount of every order is the sum of its charges, and the orders are re-rated once
+    - A charge without a name takes the name of its charge type
+    """
+    if not request.user.has_perm("monta_billing.add_additionalcharge"):
+        return Response({"detail": "Permission denied."}, status=403)
+    try:
+        created: list[models.AdditionalCharge] = charges.add_charges(
+            request.user.profile.organization_id,
+            [charges.NewCharge(**charge.dict()) for charge in payload.charges],
+        )
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+    return 201, created
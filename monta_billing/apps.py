@@ -23,3 +23,15 @@ from django.apps import AppConfig
 class MontaBillingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "monta_billing"
+
+    def ready(self):
+        from celery import current_app
+
+        import monta_billing.signals
+        from monta_billing.tasks import BEAT_SCHEDULE
+
+        # Entries of the project's own beat_schedule setting take precedence.
+        current_app.conf.beat_schedule = {
+            **BEAT_SCHEDULE,
+            **(current_app.conf.beat_schedule or {}),
+        }
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from monta_billing.services import invoices
+from monta_order.models import Order
+from monta_user.models import Organization
+
+
+class Command(BaseCommand):
+    help: str = "Measures how many invoices per second per core are rendered"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("organization", type=str)
+        parser.add_argument("--count", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Renders invoices of an organization's orders without storing them"""
+        try:
+            organization: Organization = Organization.objects.get(
+                name=options["organization"]
+            )
+        except Organization.DoesNotExist as e:
+            raise CommandError(e) from e
+
+        order_ids: list[int] = list(
+            Order.objects.filter(organization=organization)
+            .order_by("-pk")
+            .values_list("pk", flat=True)[: options["count"]]
+        )
+        if not order_ids:
+            raise CommandError("The organization has no orders to invoice")
+        loaded: list[invoices.InvoiceData] = list(
+            invoices.load_invoices(organization.id, order_ids).values()
+        )
+        # Repeat the orders until the requested count is reached.
+        data: list[invoices.InvoiceData] = [
+            loaded[index % len(loaded)] for index in range(options["count"])
+        ]
+        workers: int = options["workers"]
+
+        started: float = time.perf_counter()
+        invoices.render_documents(data, workers)
+        elapsed: float = time.perf_counter() - started
+        per_second: float = len(data) / elapsed
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {len(data)} invoices with {workers} workers in {elapsed:.2f}s: "
+                f"{per_second:.1f}/s, {per_second / workers:.1f}/s per core"
+            )
+        )
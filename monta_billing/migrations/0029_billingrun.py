@@ -0,0 +1,159 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:06
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_user", "0018_alter_organization_description"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("monta_billing", "0028_alter_billingexception_exception_type_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BillingRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    django_extensions.db.fields.ModificationDateTimeField(
+                        auto_now=True, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "run_type",
+                    models.CharField(
+                        choices=[
+                            ("TRANSFER", "Transfer to Billing"),
+                            ("BILLING", "Bill Orders"),
+                        ],
+                        max_length=10,
+                        verbose_name="Run Type",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("COMPLETED", "Completed"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "chunk_size",
+                    models.PositiveIntegerField(
+                        default=500,
+                        help_text="Number of records processed by each chunk",
+                        verbose_name="Chunk Size",
+                    ),
+                ),
+                (
+                    "total_items",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Number of records eligible when the run started",
+                        verbose_name="Total Items",
+                    ),
+                ),
+                (
+                    "total_chunks",
+                    models.PositiveIntegerField(default=0, verbose_name="Total Chunks"),
+                ),
+                (
+                    "completed_chunks",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Completed Chunks"
+                    ),
+                ),
+                (
+                    "processed_items",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Processed Items"
+                    ),
+                ),
+                (
+                    "last_processed_id",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Primary key of the last record in the last finished chunk",
+                        verbose_name="Last Processed ID",
+                    ),
+                ),
+                (
+                    "result",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Accumulated row counts and timings",
+                        verbose_name="Result",
+                    ),
+                ),
+                (
+                    "error_message",
+                    models.TextField(
+                        blank=True, null=True, verbose_name="Error Message"
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        related_name="billing_runs",
+                        related_query_name="billing_run",
+                        to="monta_user.organization",
+                        verbose_name="Organization",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="User that started the run",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="billing_runs",
+                        related_query_name="billing_run",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Billing Run",
+                "verbose_name_plural": "Billing Runs",
+                "ordering": ["-created"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="billingrun",
+            index=models.Index(
+                fields=["organization", "run_type", "status"],
+                name="monta_billi_organiz_b2fa24_idx",
+            ),
+        ),
+    ]
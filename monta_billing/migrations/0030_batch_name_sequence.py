@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 4.1.2 on 2026-10-17 20:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_billing", "0029_billingrun"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE IF NOT EXISTS monta_seq_batch_name INCREMENT BY 20 MINVALUE 1;",
+                "SELECT setval('monta_seq_batch_name', COALESCE((SELECT MAX(substring(batch_name FROM '[0-9]+$')::bigint) "
+                "FROM monta_billing_billinghistory), 0) + 1, false);",
+            ],
+            reverse_sql="DROP SEQUENCE IF EXISTS monta_seq_batch_name;",
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+import pgtrigger.compiler
+import pgtrigger.migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_billing", "0030_batch_name_sequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chargetype",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Search Vector"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chargetype",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="chargetype_search_vector_idx"
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="chargetype",
+            trigger=pgtrigger.compiler.Trigger(
+                name="search_vector",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="NEW.search_vector := setweight(to_tsvector('simple', coalesce((NEW.name)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.description)::text, '')), 'B'); RETURN NEW;",
+                    hash="cef7bc725f516d24fc23f63621ace01cb60ba472",
+                    operation="INSERT OR UPDATE",
+                    pgid="pgtrigger_search_vector_df5f8",
+                    table="monta_billing_chargetype",
+                    when="BEFORE",
+                ),
+            ),
+        ),
+        # The trigger builds the vector of every existing row.
+        migrations.RunSQL(
+            sql="UPDATE monta_billing_chargetype SET search_vector = NULL",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_billing", "0032_email_outbox"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="additionalcharge",
+            name="name",
+            field=models.CharField(
+                max_length=255, verbose_name="Name of the additional charge"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="additionalcharge",
+            constraint=models.UniqueConstraint(
+                fields=("order", "name"), name="unique_additional_charge_name"
+            ),
+        ),
+    ]
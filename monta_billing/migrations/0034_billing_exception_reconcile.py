@@ -0,0 +1,82 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def link_document_classes(apps, schema_editor):
+    """
+    Fill document_class from "Missing Document <id>" messages and resolve
+    duplicate open exceptions, so the constraint can be added.
+    """
+    BillingException = apps.get_model("monta_billing", "BillingException")
+    DocumentClassification = apps.get_model("monta_customer", "DocumentClassification")
+    prefix = "Missing Document "
+    exceptions = list(
+        BillingException.objects.filter(
+            exception_type="PAPERWORK", exception_message__startswith=prefix
+        )
+    )
+    class_ids = set(DocumentClassification.objects.values_list("pk", flat=True))
+    for exception in exceptions:
+        value = exception.exception_message[len(prefix) :]
+        if value.isdigit() and int(value) in class_ids:
+            exception.document_class_id = int(value)
+    BillingException.objects.bulk_update(exceptions, ["document_class"], batch_size=500)
+
+    seen = set()
+    duplicates = []
+    for pk, order_id, exception_type, document_class_id in (
+        BillingException.objects.filter(resolved_at__isnull=True)
+        .order_by("pk")
+        .values_list("pk", "order_id", "exception_type", "document_class_id")
+    ):
+        key = (order_id, exception_type, document_class_id)
+        if document_class_id is not None and key in seen:
+            duplicates.append(pk)
+        seen.add(key)
+    BillingException.objects.filter(pk__in=duplicates).update(
+        resolved_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_customer", "0017_search_vector"),
+        ("monta_billing", "0033_additional_charge_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="billingexception",
+            name="document_class",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Missing document of a paperwork exception",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="billing_exceptions",
+                related_query_name="billing_exception",
+                to="monta_customer.documentclassification",
+                verbose_name="Document Class",
+            ),
+        ),
+        migrations.AddField(
+            model_name="billingexception",
+            name="resolved_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Resolved At"
+            ),
+        ),
+        migrations.RunPython(link_document_classes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="billingexception",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("resolved_at__isnull", True)),
+                fields=("order", "exception_type", "document_class"),
+                name="unique_open_billing_exception",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.2 on 2026-10-17 21:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_billing", "0034_billing_exception_reconcile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailoutbox",
+            name="attachment",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Storage path of a document attached to the email",
+                max_length=255,
+                verbose_name="Attachment",
+            ),
+        ),
+    ]
@@ -20,14 +20,22 @@ along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 
 from typing import Any, final
 
+import pgtrigger
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 
+from core.mixins import FieldTrackerMixin
+from core.search import search_vector_trigger
+from core.sequences import batch_name_sequence
+from monta_customer.models import DocumentClassification
 from monta_order.models import Order, StatusChoices
-from monta_user.models import Organization
+from monta_user.models import MontaUser, Organization
 
 
 @final
@@ -56,6 +64,39 @@ class BillTypeChoices(models.TextChoices):
     OTHER = "OTHER", _("Other")
 
 
+@final
+class BillingRunTypeChoices(models.TextChoices):
+    """
+    Run type choices for Billing Run model
+    """
+
+    TRANSFER = "TRANSFER", _("Transfer to Billing")
+    BILLING = "BILLING", _("Bill Orders")
+
+
+@final
+class BillingRunStatusChoices(models.TextChoices):
+    """
+    Status choices for Billing Run model
+    """
+
+    PENDING = "PENDING", _("Pending")
+    RUNNING = "RUNNING", _("Running")
+    COMPLETED = "COMPLETED", _("Completed")
+    FAILED = "FAILED", _("Failed")
+
+
+@final
+class EmailStatusChoices(models.TextChoices):
+    """
+    Status choices for Email Outbox model
+    """
+
+    PENDING = "PENDING", _("Pending")
+    SENT = "SENT", _("Sent")
+    FAILED = "FAILED", _("Failed")
+
+
 class ChargeType(TimeStampedModel):
     """
     Charge Type Model Fields
@@ -82,6 +123,7 @@ class ChargeType(TimeStampedModel):
         blank=True,
         null=True,
     )
+    search_vector = SearchVectorField(_("Search Vector"), null=True, editable=False)
 
     class Meta:
         """
@@ -91,6 +133,12 @@ class ChargeType(TimeStampedModel):
         ordering: list[str] = ["name"]
         verbose_name: str = _("Charge Type")
         verbose_name_plural: str = _("Charge Types")
+        indexes: list[models.Index] = [
+            GinIndex(fields=["search_vector"], name="chargetype_search_vector_idx"),
+        ]
+        triggers: list[pgtrigger.Trigger] = [
+            search_vector_trigger({"NEW.name": "A", "NEW.description": "B"}),
+        ]
 
     def __str__(self) -> str:
         """
@@ -124,11 +172,18 @@ class ChargeType(TimeStampedModel):
         return reverse("charge_type_edit", kwargs={"pk": self.pk})
 
 
-class AdditionalCharge(TimeStampedModel):
+class AdditionalCharge(FieldTrackerMixin, TimeStampedModel):
     """
     Additional Charge Model Fields
+
+    ----------------------------------------
+    NOTE: The other charge amount of an order is the sum of its additional
+    charges, kept by monta_billing.services.charges on every save and delete.
+    ----------------------------------------
     """
 
+    tracked_fields: tuple[str, ...] = ("order",)
+
     organization = models.ForeignKey(
         Organization,
         on_delete=models.RESTRICT,
@@ -146,7 +201,6 @@ class AdditionalCharge(TimeStampedModel):
     name = models.CharField(
         _("Name of the additional charge"),
         max_length=255,
-        unique=True,
     )
     description = models.TextField(
         _("Description"),
@@ -191,6 +245,12 @@ class AdditionalCharge(TimeStampedModel):
         indexes: list[models.Index] = [
             models.Index(fields=["name"]),
         ]
+        constraints: list[models.BaseConstraint] = [
+            models.UniqueConstraint(
+                fields=["order", "name"],
+                name="unique_additional_charge_name",
+            ),
+        ]
 
     def __str__(self) -> str:
         """
@@ -210,14 +270,22 @@ class AdditionalCharge(TimeStampedModel):
         :return: None
         :rtype: None
         """
+        # Imported here, the charges service depends on these models.
+        from monta_billing.services import charges
+
         self.name = self.name.upper()
         self.total_amount = self.unit * self.amount
-        self.order.other_charge_amount = self.total_amount
-        self.order.save()
-        super().save(**kwargs)
+        # A charge moved to another order leaves its previous order to be totaled.
+        order_ids: set[int] = {self.order_id, self.get_loaded_value("order")} - {None}
+        with transaction.atomic():
+            super().save(**kwargs)
+            charges.update_other_charges(order_ids)
+        if self._meta.get_field("order").is_cached(self):
+            # The order was totaled in the database.
+            self.order.refresh_from_db(fields=["other_charge_amount", "sub_total"])
 
 
-class BillingQueue(TimeStampedModel):
+class BillingQueue(FieldTrackerMixin, TimeStampedModel):
     """
     Billing Queue Model Fields
 
@@ -306,11 +374,13 @@ class BillingQueue(TimeStampedModel):
         :return: None
         :rtype: None
         """
-        self.full_clean()
+        # The order is only checked and totaled when it is queued, afterwards it is already transferred.
+        if self.has_changed("order"):
+            self.full_clean()
+            self.total_amount = self.order.sub_total
+            self.other_charge_total = self.order.other_charge_amount
         if not self.bill_type:
             self.bill_type = BillTypeChoices.INVOICE
-        self.total_amount = self.order.sub_total
-        self.other_charge_total = self.order.other_charge_amount
         super().save(**kwargs)
 
     def __str__(self) -> str:
@@ -328,7 +398,10 @@ class BillingException(TimeStampedModel):
     Billing Exception Model Fields
 
     ----------------------------------------
-    NOTE: Model responsible for storing billing exceptions.
+    NOTE: Model responsible for storing billing exceptions. An order has
+    at most one open exception per type and document classification. Paperwork
+    exceptions are resolved, not deleted, once the document arrives, see
+    monta_billing.services.exceptions.
     ----------------------------------------
     """
 
@@ -351,11 +424,26 @@ class BillingException(TimeStampedModel):
         related_query_name="billing_exception",
         verbose_name=_("Order"),
     )
+    document_class = models.ForeignKey(
+        DocumentClassification,
+        on_delete=models.CASCADE,
+        related_name="billing_exceptions",
+        related_query_name="billing_exception",
+        verbose_name=_("Document Class"),
+        blank=True,
+        null=True,
+        help_text=_("Missing document of a paperwork exception"),
+    )
     exception_message = models.TextField(
         _("Exception"),
         blank=True,
         null=True,
     )
+    resolved_at = models.DateTimeField(
+        _("Resolved At"),
+        blank=True,
+        null=True,
+    )
 
     class Meta:
         """
@@ -364,6 +452,13 @@ class BillingException(TimeStampedModel):
 
         verbose_name: str = _("Billing Exception")
         verbose_name_plural: str = _("Billing Exceptions")
+        constraints: list[models.BaseConstraint] = [
+            models.UniqueConstraint(
+                fields=["order", "exception_type", "document_class"],
+                name="unique_open_billing_exception",
+                condition=models.Q(resolved_at__isnull=True),
+            ),
+        ]
 
     def __str__(self) -> str:
         """
@@ -457,22 +552,7 @@ class BillingHistory(TimeStampedModel):
         :return: Batch Name
         :rtype: str
         """
-        last_batch_name: BillingHistory | None = (
-            BillingHistory.objects.filter(
-                organization=self.organization,
-            )
-            .order_by("-created")
-            .first()
-        )
-        if last_batch_name:
-            batch_name = last_batch_name.batch_name
-            batch_name = batch_name[1:]
-            batch_name = int(batch_name) + 1
-            batch_name = f"B{batch_name}"
-        else:
-            batch_name = "B1"
-
-        return batch_name
+        return f"B{batch_name_sequence.next_value()}"
 
     def save(self, **kwargs: Any) -> None:
         """
@@ -484,6 +564,209 @@ class BillingHistory(TimeStampedModel):
         :rtype: None
         """
         self.full_clean()
-        self.batch_name = self.generate_batch_name
+        if not self.batch_name:
+            self.batch_name = self.generate_batch_name
         self.sub_total = round(self.order.sub_total, 2)
         super().save(**kwargs)
+
+
+class BillingRun(TimeStampedModel):
+    """
+    Billing Run Model Fields
+
+    ----------------------------------------
+    NOTE: Checkpoint for a chunked transfer or billing pipeline. Chunks are
+    processed in primary key order and last_processed_id records where the
+    next chunk starts, so a crashed worker resumes after the last finished chunk.
+    ----------------------------------------
+    """
+
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.RESTRICT,
+        related_name="billing_runs",
+        related_query_name="billing_run",
+        verbose_name=_("Organization"),
+    )
+    user = models.ForeignKey(
+        MontaUser,
+        on_delete=models.SET_NULL,
+        related_name="billing_runs",
+        related_query_name="billing_run",
+        verbose_name=_("User"),
+        null=True,
+        blank=True,
+        help_text=_("User that started the run"),
+    )
+    run_type = models.CharField(
+        _("Run Type"),
+        max_length=10,
+        choices=BillingRunTypeChoices.choices,
+    )
+    status = models.CharField(
+        _("Status"),
+        max_length=10,
+        choices=BillingRunStatusChoices.choices,
+        default=BillingRunStatusChoices.PENDING,
+    )
+    chunk_size = models.PositiveIntegerField(
+        _("Chunk Size"),
+        default=500,
+        help_text=_("Number of records processed by each chunk"),
+    )
+    total_items = models.PositiveIntegerField(
+        _("Total Items"),
+        default=0,
+        help_text=_("Number of records eligible when the run started"),
+    )
+    total_chunks = models.PositiveIntegerField(
+        _("Total Chunks"),
+        default=0,
+    )
+    completed_chunks = models.PositiveIntegerField(
+        _("Completed Chunks"),
+        default=0,
+    )
+    processed_items = models.PositiveIntegerField(
+        _("Processed Items"),
+        default=0,
+    )
+    last_processed_id = models.BigIntegerField(
+        _("Last Processed ID"),
+        default=0,
+        help_text=_("Primary key of the last record in the last finished chunk"),
+    )
+    result = models.JSONField(
+        _("Result"),
+        default=dict,
+        blank=True,
+        help_text=_("Accumulated row counts and timings"),
+    )
+    error_message = models.TextField(
+        _("Error Message"),
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        """
+        Metaclass for Billing Run Model
+        """
+
+        verbose_name: str = _("Billing Run")
+        verbose_name_plural: str = _("Billing Runs")
+        ordering: list[str] = ["-created"]
+        indexes: list[models.Index] = [
+            models.Index(fields=["organization", "run_type", "status"]),
+        ]
+
+    def __str__(self) -> str:
+        """
+        String representation of the Billing Run Model
+
+        :return: Run type and status of the Billing Run
+        :rtype: str
+        """
+        return f"{self.run_type} - {self.status}"
+
+    @property
+    def progress(self) -> float:
+        """
+        Percentage of chunks finished.
+
+        :return: Progress between 0 and 100
+        :rtype: float
+        """
+        if not self.total_chunks:
+            return 100.0 if self.status == BillingRunStatusChoices.COMPLETED else 0.0
+        return round(self.completed_chunks / self.total_chunks * 100, 2)
+
+
+class EmailOutbox(TimeStampedModel):
+    """
+    Email Outbox Model Fields
+
+    ----------------------------------------
+    NOTE: Emails are written here in the transaction that produces them and
+    sent later by the send_email_outbox task, so an email goes out only if
+    its transaction commits and a slow mail server never blocks the writer.
+    ----------------------------------------
+    """
+
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name="outbox_emails",
+        related_query_name="outbox_email",
+        verbose_name=_("Organization"),
+    )
+    status = models.CharField(
+        _("Status"),
+        max_length=10,
+        choices=EmailStatusChoices.choices,
+        default=EmailStatusChoices.PENDING,
+    )
+    subject = models.CharField(_("Subject"), max_length=255)
+    body = models.TextField(_("Body"))
+    from_email = models.EmailField(_("From Email"))
+    to = models.JSONField(
+        _("To"),
+        default=list,
+        help_text=_("Recipient addresses"),
+    )
+    attachment = models.CharField(
+        _("Attachment"),
+        max_length=255,
+        blank=True,
+        default="",
+        help_text=_("Storage path of a document attached to the email"),
+    )
+    attempts = models.PositiveSmallIntegerField(
+        _("Attempts"),
+        default=0,
+    )
+    next_attempt_at = models.DateTimeField(
+        _("Next Attempt At"),
+        default=timezone.now,
+        help_text=_("Time the email is due to be sent or retried"),
+    )
+    sent_at = models.DateTimeField(
+        _("Sent At"),
+        blank=True,
+        null=True,
+    )
+    last_error = models.TextField(
+        _("Last Error"),
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        """
+        Metaclass for Email Outbox Model
+        """
+
+        verbose_name: str = _("Email Outbox")
+        verbose_name_plural: str = _("Email Outbox")
+        ordering: list[str] = ["next_attempt_at"]
+        indexes: list[models.Index] = [
+            models.Index(
+                fields=["next_attempt_at"],
+                name="outbox_pending_idx",
+                condition=models.Q(status="PENDING"),
+            ),
+            models.Index(
+                fields=["organization", "sent_at"],
+                name="outbox_org_sent_idx",
+                condition=models.Q(status="SENT"),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """
+        String representation of the Email Outbox Model
+
+        :return: Subject and status of the email
+        :rtype: str
+        """
+        return f"{self.subject} - {self.status}"
@@ -18,11 +18,13 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from decimal import Decimal
 from typing import Type
 
-from ninja import ModelSchema, Schema
+from ninja import Field, ModelSchema, Schema
 
 from monta_billing import models
+from monta_billing.services import billing_run
 
 
 class ChargeTypeIn(Schema):
@@ -46,3 +48,95 @@ class ChargeTypeSchema(ModelSchema):
 
         model: Type[models.ChargeType] = models.ChargeType
         model_fields: list[str] = ["id", "name", "description"]
+
+
+class BillingRunIn(Schema):
+    """
+    Schema for starting a billing run.
+    """
+
+    run_type: models.BillingRunTypeChoices
+    chunk_size: int = Field(
+        billing_run.DEFAULT_CHUNK_SIZE, ge=1, le=billing_run.MAX_CHUNK_SIZE
+    )
+
+
+class BillingRunSchema(ModelSchema):
+    """
+    BillingRunSchema
+    """
+
+    progress: float
+
+    class Config:
+        """
+        Config class
+        """
+
+        model: Type[models.BillingRun] = models.BillingRun
+        model_fields: list[str] = [
+            "id",
+            "run_type",
+            "status",
+            "chunk_size",
+            "total_items",
+            "total_chunks",
+            "completed_chunks",
+            "processed_items",
+            "result",
+            "error_message",
+            "created",
+            "modified",
+        ]
+
+
+class AdditionalChargeIn(Schema):
+    """
+    Schema for adding an additional charge to an order.
+    """
+
+    order_id: int
+    charge_type_id: int
+    amount: Decimal = Field(..., max_digits=10, decimal_places=2)
+    unit: int = Field(1, ge=1)
+    name: str | None = Field(None, max_length=255)
+    description: str | None = None
+
+
+class AdditionalChargeBatchIn(Schema):
+    """
+    Schema for adding many additional charges at once.
+    """
+
+    charges: list[AdditionalChargeIn] = Field(..., min_items=1, max_items=1000)
+
+
+class AdditionalChargeSchema(ModelSchema):
+    """
+    AdditionalChargeSchema
+    """
+
+    class Config:
+        """
+        Config class
+        """
+
+        model: Type[models.AdditionalCharge] = models.AdditionalCharge
+        model_fields: list[str] = [
+            "id",
+            "order",
+            "charge_type",
+            "name",
+            "description",
+            "unit",
+            "amount",
+            "total_amount",
+        ]
+
+
+class ErrorSchema(Schema):
+    """
+    Schema for an error response.
+    """
+
+    detail: str
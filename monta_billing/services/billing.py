@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import generations
+from core.sequences import batch_name_sequence
+from monta_billing import models
+from monta_billing.services import exceptions, invoices, outbox
+from monta_customer.models import CustomerBillingProfile, CustomerContact
+from monta_order.models import Order, OrderDocumentation
+from monta_user.models import Organization
+
+
+@dataclass
+class BillingBatchResult:
+    """
+    Row counts and timings for one billing batch.
+    """
+
+    queue_rows: int = 0
+    orders_billed: int = 0
+    exceptions_created: int = 0
+    exceptions_resolved: int = 0
+    emails_queued: int = 0
+    missing_contacts: list[str] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Total time spent on the batch in seconds.
+
+        :return: Elapsed seconds
+        :rtype: float
+        """
+        return sum(self.timings.values())
+
+    def as_dict(self) -> dict[str, object]:
+        """
+        Serialize the result for a JsonResponse or task result.
+
+        :return: Dictionary of counts and timings
+        :rtype: dict[str, object]
+        """
+        return {
+            "queue_rows": self.queue_rows,
+            "orders_billed": self.orders_billed,
+            "exceptions_created": self.exceptions_created,
+            "exceptions_resolved": self.exceptions_resolved,
+            "emails_queued": self.emails_queued,
+            "missing_contacts": self.missing_contacts,
+            "timings": {key: round(value, 4) for key, value in self.timings.items()},
+            "elapsed": round(self.elapsed, 4),
+        }
+
+
+def get_missing_requirements(required: set[int], provided: set[int]) -> set[int]:
+    """
+    Get the document classifications an order is still missing.
+
+    :param required: Document classification ids required by the customer
+    :type required: set[int]
+    :param provided: Document classification ids attached to the order
+    :type provided: set[int]
+    :return: Document classification ids that are required but not provided
+    :rtype: set[int]
+    """
+    return required - provided
+
+
+def bill_queue(
+    *,
+    organization: Organization,
+    sender_email: str,
+    queue_ids: Iterable[int] | None = None,
+) -> BillingBatchResult:
+    """
+    Bill a batch of the organization's billing queue.
+
+    The batch is loaded with a fixed number of queries regardless of its size.
+    Orders whose documentation satisfies the customer's billing profile are
+    marked billed, written to the billing history and removed from the queue.
+    Orders missing documentation stay in the queue and their open PAPERWORK
+    exceptions are reconciled with the missing document classifications, so
+    a batch run twice opens no duplicates. All writes happen in one
+    transaction, invoice emails are added to the outbox in it and sent
+    after it commits. The invoice documents of billed orders are rendered
+    by a worker after the commit and attached to their emails.
+
+    :param organization: Organization to bill
+    :type organization: Organization
+    :param sender_email: From address of the invoice emails
+    :type sender_email: str
+    :param queue_ids: Restrict the batch to these BillingQueue ids
+    :type queue_ids: Iterable[int] | None
+    :return: Row counts and timings for the batch
+    :rtype: BillingBatchResult
+    """
+    result: BillingBatchResult = BillingBatchResult()
+
+    # Load the queue and everything needed to evaluate it.
+    started: float = time.perf_counter()
+    queue = models.BillingQueue.objects.filter(organization=organization)
+    if queue_ids is not None:
+        queue = queue.filter(pk__in=list(queue_ids))
+    queue_items: list[models.BillingQueue] = list(
+        queue.select_related("order").only(
+            "id",
+            "bill_type",
+            "order",
+            "order__id",
+            "order__order_id",
+            "order__customer_id",
+            "order__sub_total",
+        )
+    )
+    result.queue_rows = len(queue_items)
+    if not queue_items:
+        result.timings["load"] = time.perf_counter() - started
+        return result
+
+    order_ids: set[int] = {item.order.id for item in queue_items}
+    customer_ids: set[int] = {item.order.customer_id for item in queue_items}
+
+    profile_documents = CustomerBillingProfile.document_class.through.objects.filter(
+        customerbillingprofile__organization=organization,
+        customerbillingprofile__customer_id__in=customer_ids,
+    ).values_list("customerbillingprofile__customer_id", "documentclassification_id")
+    requirements: defaultdict[int, set[int]] = defaultdict(set)
+    for customer_id, document_class_id in profile_documents:
+        requirements[customer_id].add(document_class_id)
+
+    documents: defaultdict[int, set[int]] = defaultdict(set)
+    for order_id, document_class_id in OrderDocumentation.objects.filter(
+        order_id__in=order_ids
+    ).values_list("order_id", "document_class_id"):
+        documents[order_id].add(document_class_id)
+
+    billing_contacts: dict[int, str] = dict(
+        CustomerContact.objects.filter(
+            organization=organization,
+            customer_id__in=customer_ids,
+            is_billing=True,
+        ).values_list("customer_id", "contact_email")
+    )
+    result.timings["load"] = time.perf_counter() - started
+
+    # Decide what happens to every order in memory.
+    started = time.perf_counter()
+    billed_items: list[models.BillingQueue] = []
+    missing_documents: dict[int, set[int]] = {}
+    for item in queue_items:
+        missing: set[int] = get_missing_requirements(
+            requirements[item.order.customer_id], documents[item.order.id]
+        )
+        missing_documents[item.order.id] = missing
+        if not missing:
+            billed_items.append(item)
+
+    emailed_items: list[models.BillingQueue] = []
+    for item in billed_items:
+        if billing_contacts.get(item.order.customer_id):
+            emailed_items.append(item)
+        else:
+            result.missing_contacts.append(item.order.order_id)
+    # The documents are rendered after the commit, under the digest of this data.
+    invoice_data: dict[int, invoices.InvoiceData] = invoices.load_invoices(
+        organization.id, [item.order.id for item in emailed_items]
+    )
+    messages: list[outbox.OutboxEmail] = [
+        outbox.OutboxEmail(
+            subject=f"Invoice for Order: {item.order.order_id}",
+            body=f"Please see attached invoice for order: {item.order.order_id}",
+            from_email=sender_email,
+            to=[billing_contacts[item.order.customer_id]],
+            attachment=invoices.get_document_path(
+                organization.id, invoice_data[item.order.id].digest
+            ),
+        )
+        for item in emailed_items
+    ]
+    result.timings["compute"] = time.perf_counter() - started
+
+    # Apply every change in a handful of statements.
+    started = time.perf_counter()
+    with transaction.atomic():
+        if billed_items:
+            now = timezone.now()
+            batch_numbers: list[int] = batch_name_sequence.next_values(
+                len(billed_items)
+            )
+            Order.objects.filter(
+                pk__in=[item.order.id for item in billed_items]
+            ).update(billed=True, bill_date=now.date(), modified=now)
+            models.BillingHistory.objects.bulk_create(
+                [
+                    models.BillingHistory(
+                        organization=organization,
+                        order_id=item.order.id,
+                        batch_name=f"B{batch_number}",
+                        bill_type=item.bill_type,
+                        sub_total=round(item.order.sub_total, 2)
+                        if item.order.sub_total is not None
+                        else Decimal("0.00"),
+                    )
+                    for item, batch_number in zip(billed_items, batch_numbers)
+                ]
+            )
+            models.BillingQueue.objects.filter(
+                pk__in=[item.id for item in billed_items]
+            ).delete()
+            generations.bump_generations([organization.id], generations.ORDERS)
+            # Imported here, the tasks depend on the billing services.
+            from monta_billing import tasks
+
+            billed_order_ids: list[int] = [item.order.id for item in billed_items]
+            transaction.on_commit(
+                lambda: tasks.render_invoices.delay(organization.id, billed_order_ids)
+            )
+        reconciled: exceptions.ReconcileResult = (
+            exceptions.reconcile_paperwork_exceptions(
+                organization.id, missing_documents
+            )
+        )
+        outbox.enqueue_emails(organization.id, messages)
+    result.timings["write"] = time.perf_counter() - started
+
+    result.orders_billed = len(billed_items)
+    result.exceptions_created = reconciled.created
+    result.exceptions_resolved = reconciled.resolved
+    result.emails_queued = len(messages)
+    return result
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import math
+import time
+from typing import Any
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, DateTimeField, F, QuerySet, Value
+from django.utils import timezone
+
+from core import generations
+from monta_billing import models
+from monta_billing.services import billing
+from monta_order.models import Order, StatusChoices
+
+DEFAULT_CHUNK_SIZE: int = 500
+MAX_CHUNK_SIZE: int = 5000
+
+# Permission needed to start a run of each type.
+RUN_PERMISSIONS: dict[str, str] = {
+    models.BillingRunTypeChoices.TRANSFER: "monta_billing.transfer_to_billing",
+    models.BillingRunTypeChoices.BILLING: "monta_billing.bill_orders",
+}
+
+# BillingQueue fields written by transfer_orders, in the order it selects them.
+TRANSFER_COLUMNS: tuple[str, ...] = (
+    "organization",
+    "order",
+    "bill_type",
+    "total_amount",
+    "other_charge_total",
+    "created",
+    "modified",
+)
+
+RESUMABLE_STATUSES: tuple[str, ...] = (
+    models.BillingRunStatusChoices.PENDING,
+    models.BillingRunStatusChoices.RUNNING,
+    models.BillingRunStatusChoices.FAILED,
+)
+
+
+def get_eligible_records(run_type: str, organization_id: int) -> QuerySet:
+    """
+    Get the records a run of the given type works through.
+
+    :param run_type: BillingRunTypeChoices value
+    :type run_type: str
+    :param organization_id: Organization of the run
+    :type organization_id: int
+    :return: Queryset of orders to transfer or billing queue rows to bill
+    :rtype: QuerySet
+    """
+    if run_type == models.BillingRunTypeChoices.TRANSFER:
+        return Order.objects.filter(
+            organization_id=organization_id,
+            ready_to_bill=True,
+            billed=False,
+            transferred_to_billing=False,
+            status=StatusChoices.COMPLETED,
+        )
+    return models.BillingQueue.objects.filter(organization_id=organization_id)
+
+
+def transfer_orders(
+    *, organization_id: int, order_ids: list[int] | None = None
+) -> dict[str, Any]:
+    """
+    Move ready to bill orders into the billing queue with set-based SQL.
+
+    The eligible orders are flagged with one UPDATE, which locks them, and
+    their queue rows are written with one INSERT ... SELECT from the flagged
+    orders, all in one transaction. No order is loaded or saved, so the
+    statement count does not grow with the number of orders, and a
+    concurrent transfer skips the orders this one flagged.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param order_ids: Restrict the transfer to these orders, all eligible
+        orders of the organization by default
+    :type order_ids: list[int] | None
+    :return: Row counts and timings of the transfer
+    :rtype: dict[str, Any]
+    """
+    started: float = time.perf_counter()
+    now = timezone.now()
+    eligible: QuerySet = get_eligible_records(
+        models.BillingRunTypeChoices.TRANSFER, organization_id
+    )
+    if order_ids is not None:
+        eligible = eligible.filter(pk__in=order_ids)
+    # The transfer date of this call marks its orders for the INSERT ... SELECT.
+    # Every column is an annotation, so the SELECT keeps the order of TRANSFER_COLUMNS.
+    transferred = (
+        Order.objects.filter(
+            organization_id=organization_id,
+            transferred_to_billing=True,
+            billing_transfer_date=now,
+        )
+        .order_by()
+        .annotate(
+            **{
+                f"queue_{name}": expression
+                for name, expression in zip(
+                    TRANSFER_COLUMNS,
+                    (
+                        F("organization_id"),
+                        F("pk"),
+                        Value(models.BillTypeChoices.INVOICE, output_field=CharField()),
+                        F("sub_total"),
+                        F("other_charge_amount"),
+                        Value(now, output_field=DateTimeField()),
+                        Value(now, output_field=DateTimeField()),
+                    ),
+                )
+            }
+        )
+        .values_list(*(f"queue_{name}" for name in TRANSFER_COLUMNS))
+    )
+    with transaction.atomic():
+        orders_transferred: int = eligible.update(
+            transferred_to_billing=True, billing_transfer_date=now, modified=now
+        )
+        if orders_transferred:
+            select_sql, params = transferred.query.sql_with_params()
+            table: str = connection.ops.quote_name(models.BillingQueue._meta.db_table)
+            columns: str = ", ".join(
+                connection.ops.quote_name(
+                    models.BillingQueue._meta.get_field(name).column
+                )
+                for name in TRANSFER_COLUMNS
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {table} ({columns}) {select_sql}", params)
+            generations.bump_generations([organization_id], generations.ORDERS)
+    elapsed: float = time.perf_counter() - started
+    return {
+        "orders_transferred": orders_transferred,
+        "timings": {"write": round(elapsed, 4)},
+        "elapsed": round(elapsed, 4),
+    }
+
+
+def _merge_result(total: dict[str, Any], chunk: dict[str, Any]) -> dict[str, Any]:
+    """
+    Add the counts and timings of a chunk to the running totals of a run.
+
+    :param total: Running totals of the run
+    :type total: dict[str, Any]
+    :param chunk: Counts and timings of the chunk
+    :type chunk: dict[str, Any]
+    :return: Updated totals
+    :rtype: dict[str, Any]
+    """
+    for key, value in chunk.items():
+        if isinstance(value, dict):
+            total[key] = _merge_result(total.get(key, {}), value)
+        elif isinstance(value, list):
+            total[key] = total.get(key, []) + value
+        elif isinstance(value, (int, float)):
+            total[key] = round(total.get(key, 0) + value, 4)
+    return total
+
+
+def start_run(
+    *,
+    organization_id: int,
+    run_type: str,
+    user_id: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> models.BillingRun:
+    """
+    Start a billing run, or pick up the organization's unfinished run of the same type.
+
+    :param organization_id: Organization to run for
+    :type organization_id: int
+    :param run_type: BillingRunTypeChoices value
+    :type run_type: str
+    :param user_id: User starting the run
+    :type user_id: int | None
+    :param chunk_size: Number of records per chunk
+    :type chunk_size: int
+    :return: The run to dispatch
+    :rtype: models.BillingRun
+    """
+    with transaction.atomic():
+        run: models.BillingRun | None = (
+            models.BillingRun.objects.select_for_update()
+            .filter(
+                organization_id=organization_id,
+                run_type=run_type,
+                status__in=RESUMABLE_STATUSES,
+            )
+            .order_by("created")
+            .first()
+        )
+        if run is not None:
+            run.status = models.BillingRunStatusChoices.RUNNING
+            run.error_message = None
+            run.save(update_fields=["status", "error_message", "modified"])
+            return run
+
+        total_items: int = get_eligible_records(run_type, organization_id).count()
+        return models.BillingRun.objects.create(
+            organization_id=organization_id,
+            user_id=user_id,
+            run_type=run_type,
+            chunk_size=chunk_size,
+            total_items=total_items,
+            total_chunks=math.ceil(total_items / chunk_size),
+            status=models.BillingRunStatusChoices.RUNNING
+            if total_items
+            else models.BillingRunStatusChoices.COMPLETED,
+        )
+
+
+def process_chunk(run_id: int, chunk_index: int) -> bool:
+    """
+    Process one chunk of a run and checkpoint it in the same transaction.
+
+    The pair (run_id, chunk_index) is the idempotency key of the chunk. A chunk
+    that was already checkpointed, for example a task redelivered after the
+    worker acknowledged late, is skipped without touching any records.
+
+    :param run_id: Billing run to advance
+    :type run_id: int
+    :param chunk_index: Zero based index of the chunk
+    :type chunk_index: int
+    :return: True if another chunk should be dispatched
+    :rtype: bool
+    """
+    with transaction.atomic():
+        run: models.BillingRun = (
+            models.BillingRun.objects.select_for_update(of=("self",))
+            .select_related("user", "organization")
+            .get(pk=run_id)
+        )
+        if (
+            run.status != models.BillingRunStatusChoices.RUNNING
+            or chunk_index != run.completed_chunks
+        ):
+            return False
+
+        record_ids: list[int] = list(
+            get_eligible_records(run.run_type, run.organization_id)
+            .filter(pk__gt=run.last_processed_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[: run.chunk_size]
+        )
+        if not record_ids:
+            run.status = models.BillingRunStatusChoices.COMPLETED
+            run.save(update_fields=["status", "modified"])
+            return False
+
+        if run.run_type == models.BillingRunTypeChoices.TRANSFER:
+            chunk_result: dict[str, Any] = transfer_orders(
+                organization_id=run.organization_id, order_ids=record_ids
+            )
+        else:
+            chunk_result = billing.bill_queue(
+                organization=run.organization,
+                sender_email=run.user.email
+                if run.user
+                else settings.DEFAULT_FROM_EMAIL,
+                queue_ids=record_ids,
+            ).as_dict()
+
+        run.completed_chunks += 1
+        run.total_chunks = max(run.total_chunks, run.completed_chunks)
+        run.processed_items += len(record_ids)
+        run.last_processed_id = record_ids[-1]
+        run.result = _merge_result(run.result, chunk_result)
+        if len(record_ids) < run.chunk_size:
+            run.status = models.BillingRunStatusChoices.COMPLETED
+        run.save()
+    return run.status == models.BillingRunStatusChoices.RUNNING
+
+
+def fail_run(run_id: int, message: str) -> None:
+    """
+    Mark a run as failed. Starting a run of the same type resumes it from its checkpoint.
+
+    :param run_id: Billing run that failed
+    :type run_id: int
+    :param message: Error message to store
+    :type message: str
+    :return: None
+    :rtype: None
+    """
+    models.BillingRun.objects.filter(pk=run_id).update(
+        status=models.BillingRunStatusChoices.FAILED,
+        error_message=message,
+        modified=timezone.now(),
+    )
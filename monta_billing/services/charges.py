@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core import generations
+from monta_billing import models
+from monta_order.models import Order
+from monta_order.services import rating
+
+
+@dataclass
+class NewCharge:
+    """
+    An additional charge to attach to an order.
+    """
+
+    order_id: int
+    charge_type_id: int
+    amount: Decimal
+    unit: int = 1
+    name: str | None = None
+    description: str | None = None
+
+
+def update_other_charges(order_ids: Iterable[int]) -> int:
+    """
+    Set the other charge amount of orders to the sum of their additional charges.
+
+    Every order is totaled by one UPDATE with a correlated SUM, so the amount
+    is always the sum of the stored charges no matter how they were added or
+    deleted. The orders are then re-rated together, against the rate tables
+    of their customers only. Billed orders are left alone.
+
+    :param order_ids: Orders whose charges changed
+    :type order_ids: Iterable[int]
+    :return: Number of unbilled orders updated
+    :rtype: int
+    """
+    order_ids = set(order_ids)
+    if not order_ids:
+        return 0
+    charge_total = (
+        models.AdditionalCharge.objects.filter(order_id=OuterRef("pk"))
+        .order_by()
+        .values("order_id")
+        .annotate(total=Sum("total_amount"))
+        .values("total")
+    )
+    # A billed order keeps the amounts it was invoiced at, as rerate_orders does.
+    orders = Order.objects.filter(pk__in=order_ids, billed=False)
+    with transaction.atomic():
+        updated: int = orders.update(
+            other_charge_amount=Coalesce(
+                Subquery(charge_total),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            modified=timezone.now(),
+        )
+        customers: defaultdict[int, set[int]] = defaultdict(set)
+        for organization_id, customer_id in (
+            orders.order_by().values_list("organization_id", "customer_id").distinct()
+        ):
+            customers[organization_id].add(customer_id)
+        # Only the rate tables of the affected customers are loaded.
+        for organization_id, customer_ids in customers.items():
+            rating.rerate_orders(
+                organization_id,
+                customer_ids=customer_ids,
+                order_ids=order_ids,
+            )
+        generations.bump_generations(list(customers), generations.ORDERS)
+    return updated
+
+
+def add_charges(
+    organization_id: int, charges: list[NewCharge]
+) -> list[models.AdditionalCharge]:
+    """
+    Attach many additional charges to many orders at once.
+
+    The orders and charge types are checked with one query each and the
+    charges are written with one bulk_create. The other charge amount of
+    every affected order is then totaled and re-rated once, however many
+    charges it received.
+
+    :param organization_id: Organization of the orders and charge types
+    :type organization_id: int
+    :param charges: Charges to add, a charge without a name takes the name of its type
+    :type charges: list[NewCharge]
+    :return: Created charges
+    :rtype: list[models.AdditionalCharge]
+    :raises ValueError: If an order or charge type is not in the organization
+    """
+    if not charges:
+        return []
+    order_ids: set[int] = set(
+        Order.objects.filter(
+            organization_id=organization_id,
+            pk__in={charge.order_id for charge in charges},
+        ).values_list("pk", flat=True)
+    )
+    charge_types: dict[int, str] = dict(
+        models.ChargeType.objects.filter(
+            organization_id=organization_id,
+            pk__in={charge.charge_type_id for charge in charges},
+        ).values_list("pk", "name")
+    )
+    missing: defaultdict[str, set[int]] = defaultdict(set)
+    for charge in charges:
+        if charge.order_id not in order_ids:
+            missing["orders"].add(charge.order_id)
+        if charge.charge_type_id not in charge_types:
+            missing["charge types"].add(charge.charge_type_id)
+    if missing:
+        raise ValueError(
+            "; ".join(
+                f"Unknown {kind}: {', '.join(map(str, sorted(ids)))}"
+                for kind, ids in missing.items()
+            )
+        )
+
+    now = timezone.now()
+    new_charges: list[models.AdditionalCharge] = [
+        models.AdditionalCharge(
+            organization_id=organization_id,
+            order_id=charge.order_id,
+            charge_type_id=charge.charge_type_id,
+            name=(charge.name or charge_types[charge.charge_type_id]).upper(),
+            description=charge.description,
+            unit=charge.unit,
+            amount=charge.amount,
+            total_amount=charge.unit * charge.amount,
+            created=now,
+            modified=now,
+        )
+        for charge in charges
+    ]
+    # A name is used once per order, check the batch and the stored charges.
+    names: list[tuple[int, str]] = [
+        (charge.order_id, charge.name) for charge in new_charges
+    ]
+    taken: set[tuple[int, str]] = set(
+        models.AdditionalCharge.objects.filter(
+            order_id__in=order_ids, name__in={name for _, name in names}
+        ).values_list("order_id", "name")
+    )
+    duplicates: list[tuple[int, str]] = sorted(
+        {key for key in names if key in taken or names.count(key) > 1}
+    )
+    if duplicates:
+        raise ValueError(
+            "Duplicate charges: "
+            + ", ".join(f"{name} on order {order_id}" for order_id, name in duplicates)
+        )
+
+    with transaction.atomic():
+        created: list[
+            models.AdditionalCharge
+        ] = models.AdditionalCharge.objects.bulk_create(new_charges)
+        update_other_charges(order_ids)
+    return created
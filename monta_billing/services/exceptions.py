@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from monta_billing import models
+from monta_customer.models import DocumentClassification
+
+# (order_id, exception_type, document_class_id) of an open exception.
+ExceptionKey = tuple[int, str, int | None]
+
+
+@dataclass
+class ReconcileResult:
+    """
+    Rows written by one reconciliation.
+    """
+
+    created: int = 0
+    resolved: int = 0
+
+
+def get_paperwork_message(document_class_name: str) -> str:
+    """
+    Message of a PAPERWORK exception.
+
+    :param document_class_name: Name of the missing document classification
+    :type document_class_name: str
+    :return: Exception message
+    :rtype: str
+    """
+    return f"Missing Document {document_class_name}"
+
+
+def reconcile_paperwork_exceptions(
+    organization_id: int, missing: dict[int, set[int]]
+) -> ReconcileResult:
+    """
+    Make the open PAPERWORK exceptions of orders match their missing documents.
+
+    The desired exceptions are computed in memory and diffed against the
+    open exceptions, loaded with one query. Missing ones are written with one
+    bulk_create and the ones whose document arrived are resolved with one
+    UPDATE, so running it again with the same input writes nothing.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param missing: Missing document classification ids by order id, every
+        order checked must be a key, even with nothing missing
+    :type missing: dict[int, set[int]]
+    :return: Number of exceptions created and resolved
+    :rtype: ReconcileResult
+    """
+    result: ReconcileResult = ReconcileResult()
+    if not missing:
+        return result
+    paperwork: str = models.BillingExceptionChoices.PAPERWORK
+    desired: set[ExceptionKey] = {
+        (order_id, paperwork, document_class_id)
+        for order_id, document_class_ids in missing.items()
+        for document_class_id in document_class_ids
+    }
+    rows = models.BillingException.objects.filter(
+        order_id__in=missing.keys(),
+        exception_type=paperwork,
+        resolved_at__isnull=True,
+    ).values_list("pk", "order_id", "exception_type", "document_class_id")
+    open_exceptions: dict[ExceptionKey, int] = {
+        (order_id, exception_type, document_class_id): pk
+        for pk, order_id, exception_type, document_class_id in rows
+    }
+    to_create: list[ExceptionKey] = sorted(desired - open_exceptions.keys())
+    to_resolve: list[int] = [
+        pk for key, pk in open_exceptions.items() if key not in desired
+    ]
+    if not to_create and not to_resolve:
+        return result
+
+    names: dict[int, str] = dict(
+        DocumentClassification.objects.filter(
+            pk__in={key[2] for key in to_create}
+        ).values_list("pk", "name")
+    )
+    now: datetime = timezone.now()
+    with transaction.atomic():
+        if to_create:
+            # A concurrent run may have opened the same exception, the
+            # unique_open_billing_exception constraint keeps one of them.
+            models.BillingException.objects.bulk_create(
+                [
+                    models.BillingException(
+                        organization_id=organization_id,
+                        order_id=order_id,
+                        exception_type=exception_type,
+                        document_class_id=document_class_id,
+                        exception_message=get_paperwork_message(
+                            names.get(document_class_id, str(document_class_id))
+                        ),
+                        created=now,
+                        modified=now,
+                    )
+                    for order_id, exception_type, document_class_id in to_create
+                ],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts returns the dropped rows too, count what was written.
+            created: set[ExceptionKey] = set(
+                models.BillingException.objects.filter(
+                    order_id__in={key[0] for key in to_create},
+                    exception_type=paperwork,
+                    resolved_at__isnull=True,
+                    created__gte=now,
+                ).values_list("order_id", "exception_type", "document_class_id")
+            )
+            result.created = len(created.intersection(to_create))
+        if to_resolve:
+            models.BillingException.objects.filter(pk__in=to_resolve).update(
+                resolved_at=now, modified=now
+            )
+    result.resolved = len(to_resolve)
+    return result
+
+
+def resolve_paperwork_exceptions(documents: Iterable[tuple[int, int]]) -> int:
+    """
+    Resolve the open PAPERWORK exceptions of documents that arrived.
+
+    :param documents: (order_id, document_class_id) of the attached documents
+    :type documents: Iterable[tuple[int, int]]
+    :return: Number of exceptions resolved
+    :rtype: int
+    """
+    condition: Q = Q()
+    for order_id, document_class_id in set(documents):
+        condition |= Q(order_id=order_id, document_class_id=document_class_id)
+    if not condition:
+        return 0
+    now: datetime = timezone.now()
+    return models.BillingException.objects.filter(
+        condition,
+        exception_type=models.BillingExceptionChoices.PAPERWORK,
+        resolved_at__isnull=True,
+    ).update(resolved_at=now, modified=now)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+
+from monta_billing import models
+from monta_customer.models import CustomerBillingProfile
+from monta_order.models import Order
+from monta_order.services import rating
+
+INVOICE_TEMPLATE: str = "monta_billing/invoice.html"
+# Bump when the template changes, so stored documents are rendered again.
+INVOICE_TEMPLATE_VERSION: int = 2
+INVOICE_STORAGE_PREFIX: str = "invoices"
+# Invoices sent to a worker process at a time.
+RENDER_CHUNK_SIZE: int = 50
+
+
+@dataclass(frozen=True)
+class InvoiceLine:
+    """
+    An additional charge printed on an invoice.
+    """
+
+    name: str
+    description: str
+    unit: int
+    amount: str
+    total_amount: str
+
+
+@dataclass(frozen=True)
+class InvoiceData:
+    """
+    Everything printed on an invoice, in plain values that pickle and hash.
+    """
+
+    organization: str
+    order_id: str
+    bol_number: str
+    customer: str
+    billing_profile: str
+    required_documents: tuple[str, ...]
+    origin_address: str
+    destination_address: str
+    pieces: int | None
+    weight: int | None
+    mileage: str
+    rate_method: str
+    freight_units: str
+    freight_rate: str
+    freight_amount: str
+    other_charge_amount: str
+    sub_total: str
+    lines: tuple[InvoiceLine, ...] = ()
+
+    @property
+    def digest(self) -> str:
+        """
+        Hash of the invoice data and template version, the document's storage key.
+
+        :return: Hex SHA-256 digest
+        :rtype: str
+        """
+        content: str = json.dumps(
+            [INVOICE_TEMPLATE_VERSION, asdict(self)], sort_keys=True
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+
+@dataclass
+class InvoiceRenderResult:
+    """
+    Outcome of rendering a set of invoices.
+    """
+
+    rendered: int = 0
+    reused: int = 0
+    documents: dict[int, str] = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+def _text(value: object) -> str:
+    return "" if value is None else str(value)
+
+
+def get_freight(order: Order) -> tuple[Decimal, Decimal, Decimal]:
+    """
+    Units, rate per unit and amount of the freight charge of a rated order.
+
+    The amount is what rating charged for freight, the sub total less the
+    other charges, so the invoice lines add up to the total even when a rate
+    table or minimum charge applied. The rate is that amount per unit of the
+    order's rating method.
+
+    :param order: Rated order
+    :type order: Order
+    :return: Units, rate and amount
+    :rtype: tuple[Decimal, Decimal, Decimal]
+    """
+    amount: Decimal = (order.sub_total or rating.ZERO) - (
+        order.other_charge_amount or rating.ZERO
+    )
+    units: Decimal = rating.get_quantity(
+        order.rate_method, order.mileage, order.weight, order.stop_count
+    )
+    rate: Decimal = (
+        (amount / units).quantize(rating.CENT, ROUND_HALF_UP) if units else amount
+    )
+    return units, rate, amount
+
+
+def load_invoices(
+    organization_id: int, order_ids: Iterable[int]
+) -> dict[int, InvoiceData]:
+    """
+    Build the invoice data of orders with a fixed number of queries.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param order_ids: Orders to invoice
+    :type order_ids: Iterable[int]
+    :return: Invoice data by order id
+    :rtype: dict[int, InvoiceData]
+    """
+    orders: list[Order] = list(
+        Order.objects.filter(organization_id=organization_id, pk__in=list(order_ids))
+        .select_related("organization", "customer")
+        .order_by()
+    )
+    if not orders:
+        return {}
+
+    lines: defaultdict[int, list[InvoiceLine]] = defaultdict(list)
+    for charge in models.AdditionalCharge.objects.filter(
+        order_id__in=[order.pk for order in orders]
+    ).order_by("order_id", "name"):
+        lines[charge.order_id].append(
+            InvoiceLine(
+                name=charge.name,
+                description=_text(charge.description),
+                unit=charge.unit,
+                amount=_text(charge.amount),
+                total_amount=_text(charge.total_amount),
+            )
+        )
+    profiles: dict[int, CustomerBillingProfile] = {
+        profile.customer_id: profile
+        for profile in CustomerBillingProfile.objects.filter(
+            customer_id__in={order.customer_id for order in orders}
+        ).prefetch_related("document_class")
+    }
+
+    invoices: dict[int, InvoiceData] = {}
+    for order in orders:
+        profile: CustomerBillingProfile | None = profiles.get(order.customer_id)
+        units, rate, amount = get_freight(order)
+        invoices[order.pk] = InvoiceData(
+            organization=order.organization.name,
+            order_id=order.order_id,
+            bol_number=_text(order.bol_number),
+            customer=order.customer.name,
+            billing_profile=profile.name if profile else "",
+            required_documents=tuple(
+                sorted(document.name for document in profile.document_class.all())
+            )
+            if profile
+            else (),
+            origin_address=_text(order.origin_address),
+            destination_address=_text(order.destination_address),
+            pieces=order.pieces,
+            weight=order.weight,
+            mileage=_text(order.mileage),
+            rate_method=_text(order.rate_method),
+            freight_units=_text(units),
+            freight_rate=_text(rate),
+            freight_amount=_text(amount),
+            other_charge_amount=_text(order.other_charge_amount),
+            sub_total=_text(order.sub_total),
+            lines=tuple(lines[order.pk]),
+        )
+    return invoices
+
+
+def get_document_path(organization_id: int, digest: str) -> str:
+    """
+    Storage path of a rendered invoice.
+
+    :param organization_id: Organization of the invoice
+    :type organization_id: int
+    :param digest: Digest of the invoice data
+    :type digest: str
+    :return: Path in the default storage
+    :rtype: str
+    """
+    return f"{INVOICE_STORAGE_PREFIX}/{organization_id}/{digest[:2]}/{digest}.html"
+
+
+def render_invoice(invoice: InvoiceData) -> str:
+    """
+    Render one invoice document.
+
+    :param invoice: Invoice data
+    :type invoice: InvoiceData
+    :return: Rendered document
+    :rtype: str
+    """
+    return render_to_string(INVOICE_TEMPLATE, {"invoice": invoice})
+
+
+def _render_chunk(invoices: list[InvoiceData]) -> list[str]:
+    return [render_invoice(invoice) for invoice in invoices]
+
+
+def render_documents(invoices: list[InvoiceData], workers: int = 1) -> list[str]:
+    """
+    Render invoices, in a pool of worker processes if workers is above one.
+
+    The workers only render templates and never touch the database. Inside a
+    Celery worker pass one, its processes may not start children.
+
+    :param invoices: Invoices to render
+    :type invoices: list[InvoiceData]
+    :param workers: Number of processes
+    :type workers: int
+    :return: Rendered documents, in the order given
+    :rtype: list[str]
+    """
+    if workers <= 1 or len(invoices) <= 1:
+        return _render_chunk(invoices)
+    chunk_size: int = min(RENDER_CHUNK_SIZE, max(1, -(-len(invoices) // workers)))
+    chunks: list[list[InvoiceData]] = [
+        invoices[start : start + chunk_size]
+        for start in range(0, len(invoices), chunk_size)
+    ]
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return [
+            document
+            for rendered in pool.map(_render_chunk, chunks)
+            for document in rendered
+        ]
+
+
+def render_invoices(
+    organization_id: int, order_ids: Iterable[int], *, workers: int | None = None
+) -> InvoiceRenderResult:
+    """
+    Render and store the invoice documents of orders.
+
+    Documents are stored under the digest of their data, so an invoice whose
+    order, charges and billing profile did not change since it was last
+    rendered reuses the stored document. Re-bills and re-sends cost a
+    storage lookup, not a render.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param order_ids: Orders to invoice
+    :type order_ids: Iterable[int]
+    :param workers: Number of render processes, the CPU count by default
+    :type workers: int | None
+    :return: Counts, timings and the storage path of every order's document
+    :rtype: InvoiceRenderResult
+    """
+    result: InvoiceRenderResult = InvoiceRenderResult()
+    started: float = time.perf_counter()
+    invoices: dict[int, InvoiceData] = load_invoices(organization_id, order_ids)
+    pending: dict[str, InvoiceData] = {}
+    for order_id, invoice in invoices.items():
+        path: str = get_document_path(organization_id, invoice.digest)
+        result.documents[order_id] = path
+        if path not in pending and not default_storage.exists(path):
+            pending[path] = invoice
+    result.reused = len(invoices) - len(pending)
+    result.timings["load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    documents: list[str] = render_documents(
+        list(pending.values()), workers or os.cpu_count() or 1
+    )
+    result.timings["render"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for path, document in zip(pending, documents):
+        default_storage.save(path, ContentFile(document.encode()))
+    result.rendered = len(pending)
+    result.timings["store"] = time.perf_counter() - started
+    return result
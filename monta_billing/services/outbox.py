@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import mimetypes
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from monta_billing import models
+
+OUTBOX_BATCH_SIZE: int = 100
+MAX_ATTEMPTS: int = 5
+RETRY_DELAY: timedelta = timedelta(minutes=1)
+MAX_RETRY_DELAY: timedelta = timedelta(hours=1)
+# A claimed email is retried after this long if its worker never reports back.
+CLAIM_TIMEOUT: timedelta = timedelta(minutes=10)
+THROTTLE_WINDOW: timedelta = timedelta(minutes=1)
+
+
+@dataclass
+class OutboxEmail:
+    """
+    An email to add to the outbox.
+    """
+
+    subject: str
+    body: str
+    from_email: str
+    to: list[str]
+    # Storage path of a document to attach, empty for none.
+    attachment: str = ""
+
+
+@dataclass
+class OutboxResult:
+    """
+    Outcome of one outbox delivery batch.
+    """
+
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+
+    @property
+    def claimed(self) -> int:
+        """
+        :return: Number of emails the batch handled
+        :rtype: int
+        """
+        return self.sent + self.retried + self.failed
+
+
+def get_rate_limit() -> int:
+    """
+    Emails an organization may send per THROTTLE_WINDOW.
+
+    :return: Maximum number of emails, set by MONTA_EMAIL_RATE_LIMIT
+    :rtype: int
+    """
+    return getattr(settings, "MONTA_EMAIL_RATE_LIMIT", 120)
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """
+    Exponential backoff before the next attempt.
+
+    :param attempts: Attempts made so far
+    :type attempts: int
+    :return: Delay before the next attempt
+    :rtype: timedelta
+    """
+    return min(RETRY_DELAY * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+
+
+def enqueue_emails(organization_id: int, emails: list[OutboxEmail]) -> int:
+    """
+    Add emails to the outbox and deliver them once the transaction commits.
+
+    Call it inside the transaction that produces the emails, they are then
+    only sent if that transaction commits.
+
+    :param organization_id: Organization sending the emails
+    :type organization_id: int
+    :param emails: Emails to send
+    :type emails: list[OutboxEmail]
+    :return: Number of emails added
+    :rtype: int
+    """
+    if not emails:
+        return 0
+    now: datetime = timezone.now()
+    models.EmailOutbox.objects.bulk_create(
+        [
+            models.EmailOutbox(
+                organization_id=organization_id,
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email,
+                to=email.to,
+                attachment=email.attachment,
+                next_attempt_at=now,
+                created=now,
+                modified=now,
+            )
+            for email in emails
+        ]
+    )
+    # Imported here, the tasks depend on the billing services.
+    from monta_billing import tasks
+
+    transaction.on_commit(tasks.send_email_outbox.delay)
+    return len(emails)
+
+
+def claim_emails(batch_size: int = OUTBOX_BATCH_SIZE) -> list[models.EmailOutbox]:
+    """
+    Claim due emails, respecting the rate limit of every organization.
+
+    Claimed emails are pushed CLAIM_TIMEOUT into the future, so concurrent
+    workers skip them and they are retried if this worker dies.
+
+    :param batch_size: Maximum number of emails to claim
+    :type batch_size: int
+    :return: Claimed emails
+    :rtype: list[models.EmailOutbox]
+    """
+    now: datetime = timezone.now()
+    rate_limit: int = get_rate_limit()
+    with transaction.atomic():
+        remaining: dict[int, int] = defaultdict(lambda: rate_limit)
+        for row in (
+            models.EmailOutbox.objects.filter(
+                status=models.EmailStatusChoices.SENT,
+                sent_at__gte=now - THROTTLE_WINDOW,
+            )
+            .values("organization_id")
+            .annotate(sent=Count("id"))
+        ):
+            remaining[row["organization_id"]] = rate_limit - row["sent"]
+
+        due: list[models.EmailOutbox] = list(
+            models.EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=models.EmailStatusChoices.PENDING, next_attempt_at__lte=now)
+            .exclude(
+                organization_id__in=[
+                    organization_id
+                    for organization_id, count in remaining.items()
+                    if count <= 0
+                ]
+            )
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        claimed: list[models.EmailOutbox] = []
+        for email in due:
+            if remaining[email.organization_id] > 0:
+                remaining[email.organization_id] -= 1
+                email.next_attempt_at = now + CLAIM_TIMEOUT
+                email.modified = now
+                claimed.append(email)
+        models.EmailOutbox.objects.bulk_update(claimed, ["next_attempt_at", "modified"])
+    return claimed
+
+
+def attach_document(message: EmailMessage, path: str) -> None:
+    """
+    Attach a stored document to an email.
+
+    :param message: Email to attach the document to
+    :type message: EmailMessage
+    :param path: Path of the document in the default storage
+    :type path: str
+    :return: None
+    :rtype: None
+    """
+    with default_storage.open(path) as document:
+        content: bytes = document.read()
+    message.attach(os.path.basename(path), content, mimetypes.guess_type(path)[0])
+
+
+def deliver_emails(batch_size: int = OUTBOX_BATCH_SIZE) -> OutboxResult:
+    """
+    Send a batch of due emails over one SMTP connection.
+
+    Each email is sent on its own so one rejected address does not fail the
+    batch. Failed emails are retried with exponential backoff and marked
+    failed after MAX_ATTEMPTS. An email whose attachment is not stored yet
+    fails and is retried the same way. If the connection fails, every
+    claimed email that was not sent yet is retried, emails already sent
+    stay sent.
+
+    :param batch_size: Maximum number of emails to send
+    :type batch_size: int
+    :return: Counts of sent, retried and failed emails
+    :rtype: OutboxResult
+    """
+    result: OutboxResult = OutboxResult()
+    emails: list[models.EmailOutbox] = claim_emails(batch_size)
+    if not emails:
+        return result
+
+    errors: dict[int, str] = {}
+    # Emails handed to the server, which closing the connection cannot take back.
+    sent: set[int] = set()
+    try:
+        with get_connection() as connection:
+            for email in emails:
+                try:
+                    message: EmailMessage = EmailMessage(
+                        subject=email.subject,
+                        body=email.body,
+                        from_email=email.from_email,
+                        to=email.to,
+                        connection=connection,
+                    )
+                    if email.attachment:
+                        attach_document(message, email.attachment)
+                    connection.send_messages([message])
+                except Exception as e:
+                    errors[email.pk] = str(e)
+                else:
+                    sent.add(email.pk)
+    except Exception as e:
+        errors.update(
+            {
+                email.pk: str(e)
+                for email in emails
+                if email.pk not in errors and email.pk not in sent
+            }
+        )
+
+    now: datetime = timezone.now()
+    for email in emails:
+        email.modified = now
+        if email.pk not in errors:
+            email.status = models.EmailStatusChoices.SENT
+            email.sent_at = now
+            email.last_error = None
+            result.sent += 1
+            continue
+        email.attempts += 1
+        email.last_error = errors[email.pk]
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = models.EmailStatusChoices.FAILED
+            result.failed += 1
+        else:
+            email.next_attempt_at = now + get_retry_delay(email.attempts)
+            result.retried += 1
+    models.EmailOutbox.objects.bulk_update(
+        emails,
+        ["status", "attempts", "next_attempt_at", "sent_at", "last_error", "modified"],
+    )
+    return result
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from django.db.models.signals import post_delete, post_save
+
+# Core Django Imports
+from django.dispatch import receiver
+
+# Monta Imports
+from monta_billing import models
+from monta_billing.services import charges, exceptions
+from monta_order.models import OrderDocumentation
+
+
+@receiver(post_save, sender=OrderDocumentation)
+def resolve_paperwork_exceptions(sender, instance, **kwargs):
+    exceptions.resolve_paperwork_exceptions(
+        [(instance.order_id, instance.document_class_id)]
+    )
+
+
+@receiver(post_delete, sender=models.AdditionalCharge)
+def update_other_charges(sender, instance, **kwargs):
+    # A receiver rather than AdditionalCharge.delete(), so queryset and cascade
+    # deletes total the order too.
+    charges.update_other_charges([instance.order_id])
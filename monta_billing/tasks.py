@@ -18,20 +18,128 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from datetime import timedelta
+from typing import Any
+
 from celery import shared_task
+from django.utils import timezone
+
+from monta_billing import models
+from monta_billing.services import billing_run, invoices, outbox
+
+STALLED_RUN_TIMEOUT: timedelta = timedelta(minutes=15)
+
+# Periodic tasks of the billing app, added to the Celery beat schedule on startup.
+BEAT_SCHEDULE: dict[str, dict[str, Any]] = {
+    "resume-stalled-billing-runs": {
+        "task": "monta_billing.tasks.resume_stalled_billing_runs",
+        "schedule": STALLED_RUN_TIMEOUT,
+    },
+    # Picks up emails backing off, throttled or whose claim expired, which no
+    # enqueue or full batch would send.
+    "send-email-outbox": {
+        "task": "monta_billing.tasks.send_email_outbox",
+        "schedule": outbox.THROTTLE_WINDOW,
+    },
+}
+
+
+def dispatch_run(run: models.BillingRun) -> None:
+    """
+    Queue the next unfinished chunk of a billing run.
+    """
+    if run.status == models.BillingRunStatusChoices.RUNNING:
+        process_billing_run_chunk.delay(run.id, run.completed_chunks)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=3, default_retry_delay=30)
+def process_billing_run_chunk(self, run_id: int, chunk_index: int) -> None:
+    """
+    Process one chunk of a billing run, then queue the next one
+    """
+    try:
+        has_more: bool = billing_run.process_chunk(run_id, chunk_index)
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            billing_run.fail_run(run_id, str(exc))
+            raise
+        raise self.retry(exc=exc)
+    if has_more:
+        process_billing_run_chunk.delay(run_id, chunk_index + 1)
 
 
 @shared_task
-def run_order_transfer() -> None:
+def run_order_transfer(
+    organization_id: int,
+    user_id: int | None = None,
+    chunk_size: int = billing_run.DEFAULT_CHUNK_SIZE,
+) -> int:
     """
     Create pipeline for orders transfer to billing
     """
-    pass
+    run: models.BillingRun = billing_run.start_run(
+        organization_id=organization_id,
+        run_type=models.BillingRunTypeChoices.TRANSFER,
+        user_id=user_id,
+        chunk_size=chunk_size,
+    )
+    dispatch_run(run)
+    return run.id
 
 
 @shared_task
-def run_billing_queue() -> None:
+def run_billing_queue(
+    organization_id: int,
+    user_id: int | None = None,
+    chunk_size: int = billing_run.DEFAULT_CHUNK_SIZE,
+) -> int:
     """
     Create pipeline for billing
     """
-    pass
+    run: models.BillingRun = billing_run.start_run(
+        organization_id=organization_id,
+        run_type=models.BillingRunTypeChoices.BILLING,
+        user_id=user_id,
+        chunk_size=chunk_size,
+    )
+    dispatch_run(run)
+    return run.id
+
+
+@shared_task
+def resume_stalled_billing_runs() -> int:
+    """
+    Re-queue running billing runs whose worker stopped checkpointing
+    """
+    stalled_runs = models.BillingRun.objects.filter(
+        status=models.BillingRunStatusChoices.RUNNING,
+        modified__lt=timezone.now() - STALLED_RUN_TIMEOUT,
+    )
+    count: int = 0
+    for run in stalled_runs:
+        dispatch_run(run)
+        count += 1
+    return count
+
+
+@shared_task(acks_late=True)
+def send_email_outbox(batch_size: int = outbox.OUTBOX_BATCH_SIZE) -> int:
+    """
+    Send a batch of due outbox emails, queueing another batch while more are due
+    """
+    result: outbox.OutboxResult = outbox.deliver_emails(batch_size)
+    if result.claimed >= batch_size:
+        send_email_outbox.delay(batch_size)
+    return result.sent
+
+
+@shared_task(acks_late=True)
+def render_invoices(organization_id: int, order_ids: list[int]) -> int:
+    """
+    Render and store the invoice documents of billed orders, reusing stored ones
+    """
+    # Celery's pool already spreads the work, its processes may not start children.
+    result: invoices.InvoiceRenderResult = invoices.render_invoices(
+        organization_id, order_ids, workers=1
+    )
+    return result.rendered
@@ -18,7 +18,45 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from django.test import TestCase
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from celery import current_app
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ninja.testing import TestClient
+
+from monta import decorators
+from monta_billing import api_v1, models, tasks
+from monta_billing.services import (
+    billing,
+    billing_run,
+    charges,
+    exceptions,
+    invoices,
+    outbox,
+)
+from monta_customer.models import (
+    CustomerBillingProfile,
+    CustomerContact,
+    DocumentClassification,
+)
+from monta_order.models import (
+    Order,
+    OrderDocumentation,
+    RateMethodChoices,
+    StatusChoices,
+)
+from monta_order.tests import OrderFixtureMixin
+from monta_user.factories.user import ProfileFactory
+from monta_user.models import MontaUser, Organization
 
 
 class ChargeTypeTest(TestCase):
@@ -30,3 +68,751 @@ class ChargeTypeTest(TestCase):
         Test that the charge type is created
         """
         pass
+
+
+class ChargeTypeApiTest(TestCase):
+    def setUp(self) -> None:
+        self.profile = ProfileFactory.create()
+        self.user = self.profile.user
+        # The API is also mounted in the url conf, let the test client reuse it.
+        patcher = mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(api_v1.api)
+        self.charge_type = models.ChargeType.objects.create(
+            organization=self.profile.organization,
+            name="Fuel",
+            description="Fuel Surcharge",
+        )
+        self.other_charge_type = models.ChargeType.objects.create(
+            organization=ProfileFactory.create().organization,
+            name="Detention",
+            description="Detention",
+        )
+
+    def test_get_charge_type_fetches_once(self) -> None:
+        """
+        Test that the ownership check and the handler share a single query
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f"/charge_types/{self.charge_type.id}", user=self.user
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "FUEL")
+
+    def test_other_organization_is_forbidden(self) -> None:
+        """
+        Test that records of another organization cannot be read, changed or deleted
+        """
+        path = f"/charge_types/{self.other_charge_type.id}"
+        self.assertEqual(self.client.get(path, user=self.user).status_code, 403)
+        self.assertEqual(
+            self.client.put(
+                path,
+                json={"id": self.other_charge_type.id, "name": "x", "description": ""},
+                user=self.user,
+            ).status_code,
+            403,
+        )
+        self.assertEqual(self.client.delete(path, user=self.user).status_code, 403)
+        self.assertTrue(
+            models.ChargeType.objects.filter(pk=self.other_charge_type.id).exists()
+        )
+
+    def test_missing_record(self) -> None:
+        """
+        Test that a missing record returns 404
+        """
+        response = self.client.get("/charge_types/0", user=self.user)
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_lookup_fails_closed(self) -> None:
+        """
+        Test that a handler without the lookup parameter is rejected instead of left unchecked
+        """
+        with self.assertRaises(ImproperlyConfigured):
+
+            @decorators.check_organization(models.ChargeType, lookup="charge_id")
+            def get_charge_type(request, pk: int) -> None:
+                pass
+
+        @decorators.check_organization(models.ChargeType, lookup="charge_id")
+        def get_charge_type(request, charge_id: int | None = None) -> None:
+            pass
+
+        with self.assertRaises(ImproperlyConfigured):
+            get_charge_type(mock.Mock(user=self.user))
+
+
+class BillingServiceTest(TestCase):
+    def setUp(self) -> None:
+        self.organization = Organization.objects.create(name="Test Organization")
+
+    def test_missing_requirements(self) -> None:
+        """
+        Test that only the required documents not attached to the order are missing
+        """
+        self.assertEqual(
+            billing.get_missing_requirements({1, 2, 3}, {2, 4}),
+            {1, 3},
+        )
+        self.assertEqual(billing.get_missing_requirements(set(), {1}), set())
+
+    def test_bill_empty_queue(self) -> None:
+        """
+        Test that billing an empty queue reports no rows
+        """
+        result = billing.bill_queue(
+            organization=self.organization, sender_email="billing@monta.io"
+        )
+        self.assertEqual(result.queue_rows, 0)
+        self.assertEqual(result.orders_billed, 0)
+        self.assertIn("load", result.timings)
+
+
+class BillingRunTest(TestCase):
+    def setUp(self) -> None:
+        self.organization = Organization.objects.create(name="Test Organization")
+        current_app.conf.task_always_eager = True
+
+    def tearDown(self) -> None:
+        current_app.conf.task_always_eager = False
+
+    def test_empty_transfer_run_completes(self) -> None:
+        """
+        Test that a transfer run with nothing to transfer completes immediately
+        """
+        run_id = tasks.run_order_transfer.apply(args=[self.organization.id]).get()
+        run = models.BillingRun.objects.get(pk=run_id)
+        self.assertEqual(run.status, models.BillingRunStatusChoices.COMPLETED)
+        self.assertEqual(run.progress, 100.0)
+
+    def test_finished_chunk_is_skipped(self) -> None:
+        """
+        Test that a redelivered chunk does not advance the checkpoint twice
+        """
+        run = models.BillingRun.objects.create(
+            organization=self.organization,
+            run_type=models.BillingRunTypeChoices.BILLING,
+            status=models.BillingRunStatusChoices.RUNNING,
+            total_chunks=2,
+            completed_chunks=1,
+            last_processed_id=10,
+        )
+        self.assertFalse(billing_run.process_chunk(run.id, 0))
+        run.refresh_from_db()
+        self.assertEqual(run.completed_chunks, 1)
+        self.assertEqual(run.last_processed_id, 10)
+
+    def test_failed_run_resumes_from_checkpoint(self) -> None:
+        """
+        Test that starting a run picks up the failed run of the same type
+        """
+        failed_run = models.BillingRun.objects.create(
+            organization=self.organization,
+            run_type=models.BillingRunTypeChoices.BILLING,
+            status=models.BillingRunStatusChoices.FAILED,
+            total_chunks=4,
+            completed_chunks=2,
+            last_processed_id=42,
+            error_message="Worker lost",
+        )
+        run = billing_run.start_run(
+            organization_id=self.organization.id,
+            run_type=models.BillingRunTypeChoices.BILLING,
+        )
+        self.assertEqual(run.pk, failed_run.pk)
+        self.assertEqual(run.status, models.BillingRunStatusChoices.RUNNING)
+        self.assertEqual(run.last_processed_id, 42)
+        self.assertIsNone(run.error_message)
+
+
+class BillingRunApiTest(TestCase):
+    def setUp(self) -> None:
+        self.profile = ProfileFactory.create()
+        self.user = self.profile.user
+        patcher = mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(api_v1.api)
+
+    def test_start_run_requires_permission(self) -> None:
+        """
+        Test that a run is only started with the permission of its type
+        """
+        payload = {"run_type": models.BillingRunTypeChoices.BILLING}
+        response = self.client.post("/billing_runs", json=payload, user=self.user)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(models.BillingRun.objects.exists())
+
+        self.user.user_permissions.add(
+            Permission.objects.get(
+                content_type__app_label="monta_billing", codename="bill_orders"
+            )
+        )
+        user = MontaUser.objects.get(pk=self.user.pk)
+        with mock.patch.object(tasks, "dispatch_run") as dispatch_run:
+            response = self.client.post("/billing_runs", json=payload, user=user)
+        self.assertEqual(response.status_code, 200)
+        dispatch_run.assert_called_once()
+        response = self.client.post(
+            "/billing_runs",
+            json={"run_type": models.BillingRunTypeChoices.TRANSFER},
+            user=user,
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_chunk_size_is_validated(self) -> None:
+        """
+        Test that a chunk size outside its bounds is rejected before a run starts
+        """
+        self.user.is_superuser = True
+        for chunk_size in (0, billing_run.MAX_CHUNK_SIZE + 1):
+            response = self.client.post(
+                "/billing_runs",
+                json={
+                    "run_type": models.BillingRunTypeChoices.BILLING,
+                    "chunk_size": chunk_size,
+                },
+                user=self.user,
+            )
+            self.assertEqual(response.status_code, 422)
+        self.assertFalse(models.BillingRun.objects.exists())
+
+    def test_stalled_runs_are_scheduled(self) -> None:
+        """
+        Test that resuming stalled runs is in the beat schedule
+        """
+        self.assertEqual(
+            current_app.conf.beat_schedule["resume-stalled-billing-runs"]["task"],
+            tasks.resume_stalled_billing_runs.name,
+        )
+
+
+class CloseFailingEmailBackend(locmem.EmailBackend):
+    """
+    Backend that delivers every message and then fails to close the connection
+    """
+
+    def close(self) -> None:
+        raise OSError("Connection reset on QUIT")
+
+
+class EmailOutboxTest(TestCase):
+    def setUp(self) -> None:
+        self.organization = Organization.objects.create(name="Test Organization")
+        current_app.conf.task_always_eager = True
+
+    def tearDown(self) -> None:
+        current_app.conf.task_always_eager = False
+
+    def enqueue(self, count: int) -> None:
+        outbox.enqueue_emails(
+            self.organization.id,
+            [
+                outbox.OutboxEmail(
+                    subject=f"Invoice {i}",
+                    body="Please see attached invoice",
+                    from_email="billing@monta.io",
+                    to=[f"customer{i}@monta.io"],
+                )
+                for i in range(count)
+            ],
+        )
+
+    def test_emails_sent_after_commit(self) -> None:
+        """
+        Test that queued emails are only sent once their transaction commits
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enqueue(3)
+            self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            models.EmailOutbox.objects.filter(
+                status=models.EmailStatusChoices.SENT
+            ).count(),
+            3,
+        )
+
+    def test_failed_email_retried_with_backoff(self) -> None:
+        """
+        Test that a failed email is retried later and given up after MAX_ATTEMPTS
+        """
+        self.enqueue(1)
+        with mock.patch.object(
+            outbox, "get_connection", side_effect=OSError("Connection refused")
+        ):
+            result = outbox.deliver_emails()
+        self.assertEqual(result.retried, 1)
+        email = models.EmailOutbox.objects.get()
+        self.assertEqual(email.status, models.EmailStatusChoices.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, "Connection refused")
+        self.assertEqual(outbox.deliver_emails().claimed, 0)
+
+        email.attempts = outbox.MAX_ATTEMPTS - 1
+        email.next_attempt_at = email.created
+        email.save()
+        with mock.patch.object(
+            outbox, "get_connection", side_effect=OSError("Connection refused")
+        ):
+            self.assertEqual(outbox.deliver_emails().failed, 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, models.EmailStatusChoices.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(EMAIL_BACKEND=f"{__name__}.CloseFailingEmailBackend")
+    def test_sent_emails_not_retried_when_close_fails(self) -> None:
+        """
+        Test that a connection failing after delivery does not send the emails again
+        """
+        self.enqueue(2)
+        result = outbox.deliver_emails()
+        self.assertEqual((result.sent, result.retried), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(
+            models.EmailOutbox.objects.exclude(
+                status=models.EmailStatusChoices.SENT
+            ).exists()
+        )
+
+    @override_settings(MONTA_EMAIL_RATE_LIMIT=2)
+    def test_organization_throttled(self) -> None:
+        """
+        Test that an organization sends no more than its rate limit per window
+        """
+        self.enqueue(3)
+        self.assertEqual(outbox.deliver_emails().sent, 2)
+        self.assertEqual(outbox.deliver_emails().claimed, 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_periodic_delivery_sends_due_emails(self) -> None:
+        """
+        Test that the beat schedule sends emails no enqueue will send, once they are due
+        """
+        entry = current_app.conf.beat_schedule["send-email-outbox"]
+        self.assertEqual(entry["task"], tasks.send_email_outbox.name)
+        self.assertEqual(entry["schedule"], outbox.THROTTLE_WINDOW)
+
+        self.enqueue(1)
+        models.EmailOutbox.objects.update(
+            next_attempt_at=timezone.now() + outbox.RETRY_DELAY
+        )
+        self.assertEqual(tasks.send_email_outbox.apply().get(), 0)
+        models.EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(tasks.send_email_outbox.apply().get(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class AdditionalChargeTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.orders = [self.order, self.create_order()]
+        self.charge_type = models.ChargeType.objects.create(
+            organization=self.organization, name="Detention"
+        )
+
+    def test_charges_are_summed(self) -> None:
+        """
+        Test that every charge adds to the other charge amount instead of replacing it
+        """
+        order = self.orders[0]
+        for name, amount in (("Detention", "25.00"), ("Lumper", "10.00")):
+            models.AdditionalCharge.objects.create(
+                organization=self.organization,
+                order=order,
+                charge_type=self.charge_type,
+                name=name,
+                unit=2,
+                amount=Decimal(amount),
+            )
+        order.refresh_from_db()
+        self.assertEqual(order.other_charge_amount, Decimal("70.00"))
+        self.assertEqual(order.sub_total, Decimal("170.00"))
+
+        order.additional_charges.get(name="LUMPER").delete()
+        order.refresh_from_db()
+        self.assertEqual(order.other_charge_amount, Decimal("50.00"))
+
+    def test_queryset_delete_totals_orders(self) -> None:
+        """
+        Test that deleting charges with a queryset totals their orders again
+        """
+        charges.add_charges(
+            self.organization.id,
+            [
+                charges.NewCharge(
+                    order_id=order.id,
+                    charge_type_id=self.charge_type.id,
+                    amount=Decimal("12.50"),
+                )
+                for order in self.orders
+            ],
+        )
+        models.AdditionalCharge.objects.filter(order__in=self.orders).delete()
+        self.assertEqual(
+            list(
+                Order.objects.order_by("pk").values_list(
+                    "other_charge_amount", "sub_total"
+                )
+            ),
+            [(Decimal("0.00"), Decimal("100.00"))] * 2,
+        )
+
+    def test_billed_order_keeps_invoiced_amounts(self) -> None:
+        """
+        Test that a charge added to a billed order does not change its invoiced amounts
+        """
+        order = self.orders[0]
+        Order.objects.filter(pk=order.pk).update(
+            billed=True,
+            other_charge_amount=Decimal("0.00"),
+            sub_total=Decimal("100.00"),
+        )
+        charges.add_charges(
+            self.organization.id,
+            [
+                charges.NewCharge(
+                    order_id=order.id,
+                    charge_type_id=self.charge_type.id,
+                    amount=Decimal("12.50"),
+                )
+            ],
+        )
+        order.refresh_from_db()
+        self.assertEqual(
+            (order.other_charge_amount, order.sub_total),
+            (Decimal("0.00"), Decimal("100.00")),
+        )
+
+    def test_rerates_affected_customers_only(self) -> None:
+        """
+        Test that totaling the charges re-rates with the customers of the orders
+        """
+        with mock.patch.object(
+            charges.rating, "rerate_orders", wraps=charges.rating.rerate_orders
+        ) as rerate_orders:
+            charges.update_other_charges([self.orders[0].id])
+        rerate_orders.assert_called_once_with(
+            self.organization.id,
+            customer_ids={self.order.customer_id},
+            order_ids={self.orders[0].id},
+        )
+
+    def test_add_charges(self) -> None:
+        """
+        Test that charges for many orders are added and totaled in a fixed number of queries
+        """
+        with self.assertNumQueries(15):
+            created = charges.add_charges(
+                self.organization.id,
+                [
+                    charges.NewCharge(
+                        order_id=order.id,
+                        charge_type_id=self.charge_type.id,
+                        amount=Decimal("12.50"),
+                        unit=unit,
+                        name=name,
+                    )
+                    for order in self.orders
+                    for unit, name in ((1, None), (2, "Layover"))
+                ],
+            )
+        self.assertEqual(len(created), 4)
+        self.assertEqual(created[0].name, "DETENTION")
+        self.assertEqual(
+            list(
+                Order.objects.order_by("pk").values_list(
+                    "other_charge_amount", "sub_total"
+                )
+            ),
+            [(Decimal("37.50"), Decimal("137.50"))] * 2,
+        )
+
+        with self.assertRaisesMessage(
+            ValueError, f"LAYOVER on order {self.orders[0].id}"
+        ):
+            charges.add_charges(
+                self.organization.id,
+                [
+                    charges.NewCharge(
+                        order_id=self.orders[0].id,
+                        charge_type_id=self.charge_type.id,
+                        amount=Decimal("1.00"),
+                        name="layover",
+                    )
+                ],
+            )
+        with self.assertRaisesMessage(ValueError, "Unknown orders: 0"):
+            charges.add_charges(
+                self.organization.id,
+                [
+                    charges.NewCharge(
+                        order_id=0,
+                        charge_type_id=self.charge_type.id,
+                        amount=Decimal("1.00"),
+                    )
+                ],
+            )
+
+
+class BillingExceptionTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.document_classes = [
+            DocumentClassification.objects.create(
+                organization=self.organization, name=name
+            )
+            for name in ("POD", "BOL")
+        ]
+        billing_profile = CustomerBillingProfile.objects.create(
+            organization=self.organization,
+            name="Billing Profile",
+            customer=self.order.customer,
+        )
+        billing_profile.document_class.set(self.document_classes)
+        models.BillingQueue.objects.bulk_create(
+            [models.BillingQueue(organization=self.organization, order=self.order)]
+        )
+
+    def bill(self) -> billing.BillingBatchResult:
+        return billing.bill_queue(
+            organization=self.organization, sender_email="billing@monta.io"
+        )
+
+    def test_billing_twice_opens_no_duplicates(self) -> None:
+        """
+        Test that billing the same queue again leaves its exceptions as they are
+        """
+        self.assertEqual(self.bill().exceptions_created, 2)
+        result = self.bill()
+        self.assertEqual(result.exceptions_created, 0)
+        self.assertEqual(result.exceptions_resolved, 0)
+        self.assertEqual(
+            set(
+                self.order.billing_exceptions.values_list(
+                    "document_class__name", "exception_message"
+                )
+            ),
+            {("POD", "Missing Document POD"), ("BOL", "Missing Document BOL")},
+        )
+
+    def test_conflicting_exception_not_counted(self) -> None:
+        """
+        Test that an exception a concurrent run opened first is not counted as created
+        """
+        bulk_create = models.BillingException.objects.bulk_create
+
+        def open_first(objs, **kwargs):
+            models.BillingException.objects.filter(
+                pk=bulk_create(objs[:1])[0].pk
+            ).update(created=timezone.now() - timezone.timedelta(seconds=1))
+            return bulk_create(objs, **kwargs)
+
+        missing = {self.order.id: {document.id for document in self.document_classes}}
+        with mock.patch.object(
+            models.BillingException.objects, "bulk_create", side_effect=open_first
+        ):
+            result = exceptions.reconcile_paperwork_exceptions(
+                self.organization.id, missing
+            )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(
+            self.order.billing_exceptions.filter(resolved_at__isnull=True).count(), 2
+        )
+
+    def test_document_resolves_exception(self) -> None:
+        """
+        Test that attaching a missing document resolves its open exception
+        """
+        self.bill()
+        OrderDocumentation.objects.create(
+            organization=self.organization,
+            order=self.order,
+            document="pod.pdf",
+            document_class=self.document_classes[0],
+        )
+        self.assertEqual(
+            list(
+                self.order.billing_exceptions.filter(
+                    resolved_at__isnull=True
+                ).values_list("document_class__name", flat=True)
+            ),
+            ["BOL"],
+        )
+
+    def test_reconcile_resolves_stale_exceptions(self) -> None:
+        """
+        Test that exceptions of documents no longer missing are resolved in bulk
+        """
+        missing = {self.order.id: {document.id for document in self.document_classes}}
+        self.assertEqual(
+            exceptions.reconcile_paperwork_exceptions(self.organization.id, missing),
+            exceptions.ReconcileResult(created=2, resolved=0),
+        )
+        with self.assertNumQueries(4):
+            result = exceptions.reconcile_paperwork_exceptions(
+                self.organization.id, {self.order.id: set()}
+            )
+        self.assertEqual(result, exceptions.ReconcileResult(created=0, resolved=2))
+        self.assertFalse(
+            self.order.billing_exceptions.filter(resolved_at__isnull=True).exists()
+        )
+
+
+class TransferOrdersTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.orders = [self.order, self.create_order(), self.create_order()]
+        Order.objects.filter(pk__in=[order.pk for order in self.orders[:2]]).update(
+            ready_to_bill=True,
+            status=StatusChoices.COMPLETED,
+            sub_total=Decimal("100.00"),
+        )
+
+    def test_transfer_eligible_orders(self) -> None:
+        """
+        Test that every eligible order is queued and flagged in a fixed number of queries
+        """
+        with self.assertNumQueries(4):
+            result = billing_run.transfer_orders(organization_id=self.organization.id)
+        self.assertEqual(result["orders_transferred"], 2)
+        self.assertIn("elapsed", result)
+        queue = models.BillingQueue.objects.filter(organization=self.organization)
+        self.assertEqual(
+            set(queue.values_list("order_id", flat=True)),
+            {order.pk for order in self.orders[:2]},
+        )
+        self.assertEqual(
+            set(queue.values_list("bill_type", "total_amount")),
+            {(models.BillTypeChoices.INVOICE, Decimal("100.00"))},
+        )
+        self.assertEqual(
+            Order.objects.filter(
+                transferred_to_billing=True, billing_transfer_date__isnull=False
+            ).count(),
+            2,
+        )
+        self.assertEqual(
+            billing_run.transfer_orders(organization_id=self.organization.id)[
+                "orders_transferred"
+            ],
+            0,
+        )
+        self.assertEqual(queue.count(), 2)
+
+
+class InvoiceRenderTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.orders = [self.order, self.create_order()]
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_stored_documents_are_reused(self) -> None:
+        """
+        Test that an invoice is only rendered again once its data changes
+        """
+        order_ids = [order.pk for order in self.orders]
+        result = invoices.render_invoices(self.organization.id, order_ids, workers=1)
+        self.assertEqual((result.rendered, result.reused), (2, 0))
+        with default_storage.open(result.documents[self.orders[0].pk]) as document:
+            self.assertIn(self.orders[0].order_id, document.read().decode())
+
+        result = invoices.render_invoices(self.organization.id, order_ids, workers=1)
+        self.assertEqual((result.rendered, result.reused), (0, 2))
+
+        charges.add_charges(
+            self.organization.id,
+            [
+                charges.NewCharge(
+                    order_id=self.orders[0].pk,
+                    charge_type_id=models.ChargeType.objects.create(
+                        organization=self.organization, name="Lumper"
+                    ).pk,
+                    amount=Decimal("10.00"),
+                )
+            ],
+        )
+        result = invoices.render_invoices(self.organization.id, order_ids, workers=1)
+        self.assertEqual((result.rendered, result.reused), (1, 1))
+
+    def test_invoice_email_attaches_document(self) -> None:
+        """
+        Test that a billed order's email carries its invoice once it is rendered
+        """
+        CustomerContact.objects.create(
+            organization=self.organization,
+            customer=self.order.customer,
+            contact_name="Billing",
+            contact_email="billing@customer.io",
+            is_billing=True,
+        )
+        models.BillingQueue.objects.bulk_create(
+            [models.BillingQueue(organization=self.organization, order=self.order)]
+        )
+        path = invoices.get_document_path(
+            self.organization.id,
+            invoices.load_invoices(self.organization.id, [self.order.pk])[
+                self.order.pk
+            ].digest,
+        )
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, "task_always_eager", False)
+        # Deliver before the document is rendered.
+        with mock.patch.object(tasks.render_invoices, "delay"):
+            with self.captureOnCommitCallbacks(execute=True):
+                billing.bill_queue(
+                    organization=self.organization, sender_email="billing@monta.io"
+                )
+        email = models.EmailOutbox.objects.get()
+        self.assertEqual((email.attachment, email.attempts), (path, 1))
+        self.assertEqual(len(mail.outbox), 0)
+
+        invoices.render_invoices(self.organization.id, [self.order.pk], workers=1)
+        models.EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.deliver_emails().sent, 1)
+        ((filename, content, mimetype),) = mail.outbox[0].attachments
+        self.assertEqual((filename, mimetype), (os.path.basename(path), "text/html"))
+        self.assertIn(self.order.order_id, content)
+
+    def test_freight_line_adds_up_to_total(self) -> None:
+        """
+        Test that the freight line prints the rated amount as units times rate
+        """
+        order = self.orders[0]
+        order.rate_method = RateMethodChoices.PER_MILE
+        order.freight_charge_amount = Decimal("2.50")
+        order.other_charge_amount = Decimal("15.00")
+        order.ready_to_bill = True
+        order.save()
+        self.assertEqual(order.sub_total, Decimal("40.00"))
+
+        invoice = invoices.load_invoices(self.organization.id, [order.pk])[order.pk]
+        self.assertEqual(
+            (invoice.freight_units, invoice.freight_rate, invoice.freight_amount),
+            ("10.00", "2.50", "25.00"),
+        )
+        self.assertIn(
+            "<td>10.00</td><td>2.50</td><td>25.00</td>",
+            invoices.render_invoice(invoice),
+        )
+
+    def test_process_pool_renders_in_order(self) -> None:
+        """
+        Test that rendering in worker processes returns the documents in the order given
+        """
+        data = list(
+            invoices.load_invoices(
+                self.organization.id, [order.pk for order in self.orders]
+            ).values()
+        )
+        self.assertEqual(
+            invoices.render_documents(data, workers=2),
+            [invoices.render_invoice(invoice) for invoice in data],
+        )
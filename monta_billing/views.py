@@ -21,46 +21,45 @@ along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 from typing import Any, Type
 
 from ajax_datatable import AjaxDatatableView
-from asgiref.sync import async_to_sync
-from braces import views
 from django.contrib.auth import mixins
 from django.contrib.auth.decorators import login_required, permission_required
-from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
 from django.core.handlers.asgi import ASGIRequest
-from django.core.mail import send_mail
 from django.db.models import QuerySet
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import render
+from django.http import JsonResponse
 from django.urls import reverse
-from django.utils import timezone
 from django.utils.decorators import method_decorator
-from django.views import View
 from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_safe
 from django.views.decorators.vary import vary_on_cookie
 
+from core import generations
 from core.views import (
+    GenerationCacheMixin,
     MontaCreateView,
     MontaDeleteView,
+    MontaSearchView,
     MontaTemplateView,
     MontaUpdateView,
 )
 from monta_billing import forms, models
-from monta_customer.models import CustomerBillingProfile, CustomerContact
+from monta_billing.services import billing, billing_run
 from monta_driver.forms import SearchForm
 from monta_order.models import Order
 
 
 @method_decorator(require_safe, name="dispatch")
-@method_decorator(cache_control(max_age=60 * 60 * 24), name="dispatch")
+@method_decorator(cache_control(private=True, no_cache=True), name="dispatch")
 @method_decorator(vary_on_cookie, name="dispatch")
-class InteractiveBillingView(MontaTemplateView):
+class InteractiveBillingView(GenerationCacheMixin, MontaTemplateView):
     """
     View for Interactive Billing
+
+    The page and its orders are cached until the organization's orders change.
     """
 
     template_name: str = "monta_billing/interactive/index.html"
     permission_required: str = "monta_billing.view_billingqueue"
+    cache_families: tuple[str, ...] = (generations.ORDERS,)
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         """
@@ -70,6 +69,7 @@ class InteractiveBillingView(MontaTemplateView):
         :type kwargs: Any
         :return: Context Data
         """
+        organization_id: int = self.request.user.profile.organization_id
 
         # Queryset for orders ready to be billed out.
         ready_to_bill_orders: QuerySet[models.Order] = (
@@ -77,7 +77,7 @@ class InteractiveBillingView(MontaTemplateView):
                 ready_to_bill=True,
                 billed=False,
                 status="COMPLETED",
-                organization=self.request.user.profile.organization,
+                organization_id=organization_id,
             )
             .select_related("customer", "commodity")
             .only(
@@ -92,7 +92,13 @@ class InteractiveBillingView(MontaTemplateView):
         )
 
         context: dict = super().get_context_data(**kwargs)
-        context["orders"] = ready_to_bill_orders
+        # Shared by every user of the organization, unlike the rendered page.
+        context["orders"] = generations.get_or_set(
+            "ready_to_bill_orders",
+            organization_id,
+            self.cache_families,
+            lambda: list(ready_to_bill_orders),
+        )
         return context
 
 
@@ -250,139 +256,49 @@ class ChargeTypeDeleteView(MontaDeleteView):
     permission_required: str = "monta_billing.delete_chargetype"
 
 
-class ChargeTypeSearchView(
-    mixins.LoginRequiredMixin, views.PermissionRequiredMixin, View
-):
+class ChargeTypeSearchView(MontaSearchView):
     """
-    Class to delete a driver.
+    Class to search charge types.
     """
 
     permission_required: str = "monta_billing.view_chargetypes"
-
-    def get(self, request: ASGIRequest) -> HttpResponse:
-        """
-        Get request for getting results from the search with params.
-
-        :param request
-        :type request: ASGIRequest
-        :return HttpResponse of the Charge Type search form
-        :rtype HttpResponse
-        """
-        form: SearchForm = SearchForm()
-        query = request.GET["query"] if "query" in request.GET else None
-        results: QuerySet[models.ChargeType] | list = []
-        if query:
-            form: SearchForm = SearchForm({"query": query})
-            search_vector: SearchVector = SearchVector(
-                "organization__name",
-                "name",
-                "description",
-            )
-            search_query: SearchQuery = SearchQuery(query)
-            results: QuerySet[models.ChargeType] = (
-                models.ChargeType.objects.annotate(
-                    search=search_vector, rank=SearchRank(search_vector, search_query)
-                )
-                .filter(
-                    search=search_query, organization=request.user.profile.organization
-                )
-                .select_related("profile")
-                .order_by("-rank")
-            )
-
-        return render(
-            request,
-            "monta_driver/search.html",
-            {
-                "form": form,
-                "query": query,
-                "results": results,
-            },
-        )
+    model: Type[models.ChargeType] = models.ChargeType
+    template_name: str = "monta_driver/search.html"
+    form_class: Type[SearchForm] = SearchForm
 
 
-@async_to_sync
-async def bill_orders(request: ASGIRequest) -> JsonResponse:
+@login_required
+@permission_required("monta_billing.bill_orders", raise_exception=True)
+def bill_orders(request: ASGIRequest) -> JsonResponse:
     """
     Bill Orders out to customers
 
-    For each order validate that the OrderDocument doucment_class matches the
+    For each order validate that the OrderDocument document_class matches the
     CustomerBillingProfile document_class choices. If it does match, bill the
-    order out to customer primary contact email. If it does not match then keep the order in
-    the billing queue, and create a billing exception based on the BillingExceptionChoices
-    (PAPERWORK, CHARGE, CREDIT, OTHER)
+    order out to customer billing contact email. If it does not match then keep the order in
+    the billing queue, and create a billing exception for each missing document.
+    The whole queue is evaluated by the billing service in a constant number of queries.
 
     :param request
     :type request: ASGIRequest
     :return: JsonResponse
     :rtype: JsonResponse
     """
-    order_document = []
-    billing_requirements = []
-    billing_queue: QuerySet[models.BillingQueue] = models.BillingQueue.objects.filter(
+    result: billing.BillingBatchResult = billing.bill_queue(
         organization=request.user.profile.organization,
+        sender_email=request.user.email,
     )
-    for order in billing_queue:
-        customer_billing_profile: QuerySet[
-            CustomerBillingProfile
-        ] = CustomerBillingProfile.objects.filter(
-            customer=order.order.customer,
-            organization=request.user.profile.organization,
-        )
-        customer_contact: CustomerContact = CustomerContact.objects.filter(
-            customer=order.order.customer,
-            organization=request.user.profile.organization,
-            is_billing=True,
-        ).first()
-        for requirement in customer_billing_profile.values_list(
-            "document_class", flat=True
-        ):
-            billing_requirements.append(requirement)
-        for document in order.order.order_documentation.all():
-            order_document.append(document.document_class.id)
-        if set(billing_requirements).issubset(set(order_document)):
-            order.order.billed = True
-            order.order.bill_date = timezone.now()
-            order.order.save()
-            billing_history: models.BillingHistory = (
-                models.BillingHistory.objects.create(
-                    order=order.order,
-                    organization=request.user.profile.organization,
-                )
-            )
-            billing_history.save()
-            order.delete()
-            send_mail(
-                f"Invoice for Order: {order.order.order_id}",
-                f"Please see attached invoice for order: {order.order.order_id}",
-                f"{request.user.email}",
-                [customer_contact.contact_email],
-            )
-        else:
-            missing_requirements: set[Any] = set(billing_requirements) - set(
-                order_document
-            )
-            for requirement in missing_requirements:
-                if not models.BillingException.objects.filter(
-                    order=order.order,
-                    organization=request.user.profile.organization,
-                    exception_type="PAPERWORK",
-                ):
-                    billing_exception: models.BillingException = (
-                        models.BillingException.objects.create(
-                            order=order.order,
-                            organization=request.user.profile.organization,
-                            exception_type="PAPERWORK",
-                            exception_message="Missing Document " + str(requirement),
-                        )
-                    )
-                    billing_exception.save()
+    if not result.queue_rows:
         return JsonResponse(
-            {"result": "success", "message": "Orders billed out to customers."},
+            {"result": "success", "message": "No orders to bill."},
             status=201,
         )
     return JsonResponse(
-        {"result": "success", "message": "No orders to bill."},
+        {
+            "result": "success",
+            "message": "Orders billed out to customers.",
+            "batch": result.as_dict(),
+        },
         status=201,
     )
 
@@ -422,32 +338,33 @@ def re_bill_order(request: ASGIRequest, order_id: str) -> JsonResponse:
     )
 
 
-def transfer_service(request: ASGIRequest) -> JsonResponse | None:
+@login_required
+@permission_required("monta_billing.transfer_to_billing", raise_exception=True)
+def transfer_service(request: ASGIRequest) -> JsonResponse:
     """
-    Transfer the order to bill
+    Transfer every ready to bill order to the billing queue
+
+    The orders are transferred by the billing run service with set-based SQL
+    in one transaction, however many there are.
 
     :param request
     :type request: ASGIRequest
     :return: JsonResponse
     :rtype: JsonResponse
     """
-    orders: QuerySet[Order] = Order.objects.filter(
-        organization=request.user.profile.organization,
-        ready_to_bill=True,
-        billed=False,
-        status="COMPLETED",
+    result: dict[str, Any] = billing_run.transfer_orders(
+        organization_id=request.user.profile.organization_id
     )
-    for order in orders:
-        if order.transferred_to_billing:
-            continue
-        models.BillingQueue.objects.create(
-            order=order,
-            organization=request.user.profile.organization,
-        )
-        order.transferred_to_billing = True
-        order.billing_transfer_date = timezone.now()
-        order.save()
+    if not result["orders_transferred"]:
         return JsonResponse(
-            {"result": "success", "message": "Orders transferred to billing queue."},
+            {"result": "success", "message": "No orders to transfer."},
             status=201,
         )
+    return JsonResponse(
+        {
+            "result": "success",
+            "message": "Orders transferred to billing queue.",
+            "transfer": result,
+        },
+        status=201,
+    )
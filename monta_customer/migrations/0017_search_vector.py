@@ -0,0 +1,59 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.db import migrations
+import pgtrigger.compiler
+import pgtrigger.migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_customer", "0016_remove_customercontact_primary_contact_and_more"),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name="customer",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Search Vector"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="customer_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["customer_id"],
+                name="customer_customer_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="customer",
+            trigger=pgtrigger.compiler.Trigger(
+                name="search_vector",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="NEW.search_vector := setweight(to_tsvector('simple', coalesce((NEW.customer_id)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.name)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.city)::text, '')), 'C') || setweight(to_tsvector('simple', coalesce((NEW.state)::text, '')), 'C'); RETURN NEW;",
+                    hash="145e0f8b9501fe90a33c6adf39c5e65f95a59108",
+                    operation="INSERT OR UPDATE",
+                    pgid="pgtrigger_search_vector_2880c",
+                    table="monta_customer_customer",
+                    when="BEFORE",
+                ),
+            ),
+        ),
+        # The trigger builds the vector of every existing row.
+        migrations.RunSQL(
+            sql="UPDATE monta_customer_customer SET search_vector = NULL",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -21,6 +21,8 @@ along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 # Standard library imports
 from typing import Any, Optional
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
 
@@ -31,9 +33,11 @@ from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 
 # Third Party Imports
+import pgtrigger
 from localflavor.us.models import USStateField, USZipCodeField
 
 # Monta Imports
+from core.search import search_vector_trigger
 from monta_user.models import Organization
 
 
@@ -127,6 +131,7 @@ class Customer(TimeStampedModel):
     city = models.CharField(_("City"), max_length=255)
     state = USStateField(_("State"), max_length=2)
     zip_code = USZipCodeField(_("Zip Code"), max_length=5)
+    search_vector = SearchVectorField(_("Search Vector"), null=True, editable=False)
 
     class Meta:
         """
@@ -138,6 +143,22 @@ class Customer(TimeStampedModel):
         verbose_name_plural: str = _("Customers")
         indexes: list[models.Index] = [
             models.Index(fields=["customer_id"]),
+            GinIndex(fields=["search_vector"], name="customer_search_vector_idx"),
+            GinIndex(
+                fields=["customer_id"],
+                name="customer_customer_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+        triggers: list[pgtrigger.Trigger] = [
+            search_vector_trigger(
+                {
+                    "NEW.customer_id": "A",
+                    "NEW.name": "A",
+                    "NEW.city": "C",
+                    "NEW.state": "C",
+                }
+            ),
         ]
 
     def __str__(self) -> str:
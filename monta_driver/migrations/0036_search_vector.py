@@ -0,0 +1,73 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.db import migrations
+import pgtrigger.compiler
+import pgtrigger.migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_driver", "0035_driver_id_sequence"),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name="driver",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Search Vector"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="driver",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="driver_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="driver",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["driver_id"],
+                name="driver_driver_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="driver",
+            trigger=pgtrigger.compiler.Trigger(
+                name="search_vector",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="NEW.search_vector := setweight(to_tsvector('simple', coalesce((NEW.driver_id)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.first_name)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.last_name)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((SELECT concat_ws(' ', license_number, license_state) FROM monta_driver_driverprofile WHERE driver_id = NEW.id)::text, '')), 'B'); RETURN NEW;",
+                    hash="f09b0ab60fa50a30946044c4ed66915b5b6bdb1e",
+                    operation="INSERT OR UPDATE",
+                    pgid="pgtrigger_search_vector_490ac",
+                    table="monta_driver_driver",
+                    when="BEFORE",
+                ),
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="driverprofile",
+            trigger=pgtrigger.compiler.Trigger(
+                name="driver_search_vector",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="UPDATE monta_driver_driver SET search_vector = NULL WHERE id = NEW.driver_id; RETURN NULL;",
+                    hash="b3844d7bdbc0414b858ac25244de9e519f72911f",
+                    operation='INSERT OR UPDATE OF "license_number", "license_state"',
+                    pgid="pgtrigger_driver_search_vector_96fa9",
+                    table="monta_driver_driverprofile",
+                    when="AFTER",
+                ),
+            ),
+        ),
+        # The trigger builds the vector of every existing row.
+        migrations.RunSQL(
+            sql="UPDATE monta_driver_driver SET search_vector = NULL",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -22,6 +22,9 @@ from __future__ import annotations
 
 from typing import Any
 
+import pgtrigger
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import QuerySet, functions
@@ -31,12 +34,15 @@ from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 from localflavor.us.models import USStateField, USZipCodeField
 
+from core.mixins import FieldTrackerMixin
+from core.search import search_vector_trigger
+from core.sequences import driver_id_sequence
 from monta_customer.models import DocumentClassification
 from monta_fleet.models import Fleet
 from monta_user.models import Organization
 
 
-class Driver(TimeStampedModel):
+class Driver(FieldTrackerMixin, TimeStampedModel):
     """
     Driver Model Fields
     """
@@ -64,6 +70,7 @@ class Driver(TimeStampedModel):
         related_query_name="driver",
         verbose_name=_("Fleet"),
     )
+    search_vector = SearchVectorField(_("Search Vector"), null=True, editable=False)
 
     class Meta:
         """
@@ -75,6 +82,23 @@ class Driver(TimeStampedModel):
         verbose_name_plural: str = _("Drivers")
         indexes: list[models.Index] = [
             models.Index(fields=["-first_name"]),
+            GinIndex(fields=["search_vector"], name="driver_search_vector_idx"),
+            GinIndex(
+                fields=["driver_id"],
+                name="driver_driver_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+        triggers: list[pgtrigger.Trigger] = [
+            search_vector_trigger(
+                {
+                    "NEW.driver_id": "A",
+                    "NEW.first_name": "A",
+                    "NEW.last_name": "A",
+                    "SELECT concat_ws(' ', license_number, license_state) "
+                    "FROM monta_driver_driverprofile WHERE driver_id = NEW.id": "B",
+                }
+            ),
         ]
         permissions = [
             ("view_all_drivers", "Can All Drivers"),
@@ -113,7 +137,7 @@ class Driver(TimeStampedModel):
             self.driver_id = (
                 self.first_name[:1].upper()
                 + self.last_name[:4].upper()
-                + str(int(Driver.objects.count() + 1))
+                + str(driver_id_sequence.next_value())
             )
         self.driver_id: str = self.driver_id.upper()
         super().save(**kwargs)
@@ -240,6 +264,17 @@ class DriverProfile(TimeStampedModel):
 
         verbose_name: str = _("Driver Profile")
         verbose_name_plural: str = _("Driver Profiles")
+        triggers: list[pgtrigger.Trigger] = [
+            # The driver search vector includes the license, clearing it makes the driver trigger rebuild it.
+            pgtrigger.Trigger(
+                name="driver_search_vector",
+                when=pgtrigger.After,
+                operation=pgtrigger.Insert
+                | pgtrigger.UpdateOf("license_number", "license_state"),
+                func="UPDATE monta_driver_driver SET search_vector = NULL "
+                "WHERE id = NEW.driver_id; RETURN NULL;",
+            ),
+        ]
 
     def __str__(self) -> str:
         """
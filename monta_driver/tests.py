@@ -18,13 +18,18 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import json
+
 # Core Django Imports
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 
+from core.query_inspector import QueryBudgetMixin
+from monta_driver import views
 from monta_driver.factories.driver import DriverFactory, DriverProfileFactory
 from monta_driver.forms import AddDriverContactForm, AddDriverForm, AddDriverProfileForm
 
 # Monta Imports
+from monta_user.factories.user import ProfileFactory
 from monta_user.models import Organization
 
 
@@ -132,3 +137,56 @@ class DriverTest(TestCase):
         url = "/driver/{}/delete/".format(self.driver.id)
         response = self.client.get(url)
         self.assertEqual(response.status_code, 302)
+
+
+class DriverViewQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        profile = ProfileFactory.create()
+        self.user = profile.user
+        self.user.is_superuser = True
+        self.user.save()
+        self.drivers = [
+            DriverProfileFactory.create(
+                organization=profile.organization,
+                driver=DriverFactory.create(organization=profile.organization),
+            ).driver
+            for _ in range(5)
+        ]
+        self.factory = RequestFactory()
+
+    def test_driver_table_within_budget(self):
+        """
+        Test that the driver table loads every row and profile within its budget
+        """
+        request = self.factory.get(
+            "/driver/table/",
+            {
+                "draw": 1,
+                "start": 0,
+                "length": 10,
+                "columns[0][name]": "first_name",
+                "columns[0][orderable]": "true",
+                "order[0][column]": 0,
+                "order[0][dir]": "asc",
+            },
+            HTTP_ACCEPT="application/json",
+        )
+        request.user = self.user
+        with self.assertQueryBudget(views.DriverOverviewList.query_budget):
+            response = views.DriverOverviewList.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)["data"]), 5)
+
+    def test_driver_edit_within_budget(self):
+        """
+        Test that the driver edit page loads the driver and its profile within its budget
+        """
+        driver = self.drivers[0]
+        request = self.factory.get(f"/driver/{driver.pk}/edit/")
+        request.user = self.user
+        with self.assertQueryBudget(views.DriverEditView.query_budget):
+            response = views.DriverEditView.as_view()(request, pk=driver.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["object"], driver)
+        with self.assertNumQueries(0):
+            response.context_data["object"].profile
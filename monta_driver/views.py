@@ -24,7 +24,6 @@ from ajax_datatable import AjaxDatatableView
 from braces import views
 from django.contrib.auth import mixins
 from django.contrib.auth.decorators import login_required
-from django.contrib.postgres.search import SearchVector
 from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
 from django.db.models import QuerySet
@@ -141,7 +140,9 @@ class DriverEditView(MontaDetailView):
     model: Type[models.Driver] = models.Driver
     template_name = "monta_driver/edit.html"
     permission_required: str = "monta_driver.change_driver"
-    select_related: list[str] = ["profile"]
+    select_related: bool = True
+    select_related_fields: list[str] = ["profile"]
+    query_budget: int = 5
 
 
 class DriverUpdateView(
@@ -203,6 +204,7 @@ class DriverOverviewList(mixins.LoginRequiredMixin, AjaxDatatableView):
 
     model: Type[models.Driver] = models.Driver
     title: str = "Driver Table"
+    query_budget: int = 5
     initial_order: list[list[str]] = [["first_name", "desc"]]
     column_defs: list[dict[str, str | bool]] = [
         {
@@ -337,21 +339,15 @@ class DriverOverviewList(mixins.LoginRequiredMixin, AjaxDatatableView):
 
 class DriverSearchView(MontaSearchView):
     """
-    Class to delete a driver.
+    Class to search drivers.
     """
 
     permission_required: str = "monta_driver.search_drivers"
     model: Type[models.Driver] = models.Driver
     template_name: str = "monta_driver/search.html"
     form_class: Type[forms.SearchForm] = forms.SearchForm
-    search_vector: SearchVector = SearchVector(
-        "organization__name",
-        "first_name",
-        "last_name",
-        "profile__license_state",
-        "profile__license_number",
-        "profile__license_expiration",
-    )
+    search_trigram_fields: tuple[str, ...] = ("driver_id",)
+    search_select_related: tuple[str, ...] = ("profile",)
 
 
 @login_required
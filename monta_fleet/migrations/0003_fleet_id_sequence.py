@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 4.1.2 on 2026-10-17 20:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_fleet", "0002_alter_fleet_description_alter_fleet_fleet_id_and_more"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE IF NOT EXISTS monta_seq_fleet_id INCREMENT BY 20 MINVALUE 1;",
+                "SELECT setval('monta_seq_fleet_id', COALESCE((SELECT MAX(substring(fleet_id FROM '[0-9]+$')::bigint) "
+                "FROM monta_fleet_fleet), 0) + 1, false);",
+            ],
+            reverse_sql="DROP SEQUENCE IF EXISTS monta_seq_fleet_id;",
+        ),
+    ]
@@ -25,6 +25,7 @@ from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 
+from core.sequences import fleet_id_sequence
 from monta_user.models import MontaUser, Organization
 
 
@@ -109,7 +110,7 @@ class Fleet(TimeStampedModel):
         self.full_clean()
         if not self.fleet_id:
             self.fleet_id = self.name[:9].replace(" ", "").upper() + str(
-                int(Fleet.objects.count() + 1)
+                fleet_id_sequence.next_value()
             )
         self.fleet_id = self.fleet_id.upper()
         super().save(**kwargs)
@@ -0,0 +1,62 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:34
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.db import migrations
+import pgtrigger.compiler
+import pgtrigger.migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "monta_locations",
+            "0009_remove_locationcomment_monta_locat_comment_5382f7_idx_and_more",
+        ),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name="location",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Search Vector"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="location_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["location_id"],
+                name="location_location_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="location",
+            trigger=pgtrigger.compiler.Trigger(
+                name="search_vector",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="NEW.search_vector := setweight(to_tsvector('simple', coalesce((NEW.location_id)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.name)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.address_line_1)::text, '')), 'B') || setweight(to_tsvector('simple', coalesce((NEW.city)::text, '')), 'C') || setweight(to_tsvector('simple', coalesce((NEW.state)::text, '')), 'C') || setweight(to_tsvector('simple', coalesce((NEW.zip_code)::text, '')), 'C'); RETURN NEW;",
+                    hash="af725020dec392823c12ce1415f2dbd61896429e",
+                    operation="INSERT OR UPDATE",
+                    pgid="pgtrigger_search_vector_48a47",
+                    table="monta_locations_location",
+                    when="BEFORE",
+                ),
+            ),
+        ),
+        # The trigger builds the vector of every existing row.
+        migrations.RunSQL(
+            sql="UPDATE monta_locations_location SET search_vector = NULL",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -22,6 +22,8 @@ along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 from typing import Any
 
 # Core Django Imports
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.template.defaultfilters import slugify
@@ -30,8 +32,10 @@ from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 
 # Third Party Imports
+import pgtrigger
 from localflavor.us.models import USStateField, USZipCodeField
 
+from core.search import search_vector_trigger
 from monta_driver.models import CommentType
 
 # Monta Imports
@@ -119,6 +123,7 @@ class Location(TimeStampedModel):
         default=False,
         help_text=_("Is the location geocoded?"),
     )
+    search_vector = SearchVectorField(_("Search Vector"), null=True, editable=False)
 
     class Meta:
         """
@@ -130,6 +135,24 @@ class Location(TimeStampedModel):
         ordering: tuple[str, ...] = ("location_id", "name")
         indexes: list[models.Index] = [
             models.Index(fields=["location_id", "name"]),
+            GinIndex(fields=["search_vector"], name="location_search_vector_idx"),
+            GinIndex(
+                fields=["location_id"],
+                name="location_location_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+        triggers: list[pgtrigger.Trigger] = [
+            search_vector_trigger(
+                {
+                    "NEW.location_id": "A",
+                    "NEW.name": "A",
+                    "NEW.address_line_1": "B",
+                    "NEW.city": "C",
+                    "NEW.state": "C",
+                    "NEW.zip_code": "C",
+                }
+            ),
         ]
 
     def __str__(self) -> str:
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 4.1.2 on 2026-10-17 20:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_manifest", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE IF NOT EXISTS monta_seq_manifest_number INCREMENT BY 20 MINVALUE 1;",
+                "SELECT setval('monta_seq_manifest_number', COALESCE((SELECT MAX(substring(manifest_number FROM '[0-9]+$')::bigint) "
+                "FROM monta_manifest_manifest), 0) + 1, false);",
+            ],
+            reverse_sql="DROP SEQUENCE IF EXISTS monta_seq_manifest_number;",
+        ),
+    ]
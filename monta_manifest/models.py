@@ -27,6 +27,7 @@ from django.utils.translation import gettext_lazy as _
 # Core Django Imports
 from django_extensions.db.models import TimeStampedModel
 
+from core.sequences import manifest_number_sequence
 from monta_order.models import Order, StatusChoices
 
 # Monta Imports
@@ -80,16 +81,7 @@ class Manifest(TimeStampedModel):
         :return: new_manifest_number
         :rtype: str
         """
-        last_manifest = self.objects.filter(
-            organization=self.organization,
-        ).last()
-        if last_manifest:
-            last_manifest_number = last_manifest.manifest_number
-            last_manifest_number = int(last_manifest_number[1:])
-            new_manifest_number: str = "M" + str(last_manifest_number + 1)
-        else:
-            new_manifest_number = "M1"
-        return new_manifest_number
+        return f"M{manifest_number_sequence.next_value()}"
 
     def clean(self) -> None:
         pass
@@ -90,6 +90,7 @@ class DelayCodeAdmin(admin.ModelAdmin):
     list_display: tuple[str, ...] = (
         "name",
         "description",
+        "is_default",
         "created",
         "modified",
     )
@@ -137,3 +138,30 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
     inlines: tuple[Type[OrderDocumentationAdmin]] = (OrderDocumentationAdmin,)
+
+
+class RateBreakAdmin(admin.TabularInline):
+    """RateBreak Admin"""
+
+    model: Type[models.RateBreak] = models.RateBreak
+    verbose_name_plural: str = "Rate Breaks"
+    extra: int = 0
+
+
+@admin.register(models.RateTable)
+class RateTableAdmin(admin.ModelAdmin):
+    """Rate Table Admin"""
+
+    list_display: tuple[str, ...] = (
+        "name",
+        "customer",
+        "equipment_type",
+        "rate_method",
+        "effective_date",
+        "expiration_date",
+        "is_active",
+    )
+    list_filter: tuple[str, ...] = ("rate_method", "is_active")
+    search_fields: tuple[str, ...] = ("name",)
+
+    inlines: tuple[Type[RateBreakAdmin]] = (RateBreakAdmin,)
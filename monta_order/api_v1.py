@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterator
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified
+from ninja import NinjaAPI
+from ninja.responses import Response
+
+from monta import decorators
+from monta_order import models, schema
+from monta_order.services import (
+    order_import,
+    order_lookup,
+    order_pages,
+    status_transitions,
+    stop_chain,
+)
+
+"""
+NOTE: Do not add docstrings to this file. Docstrings are added to the generated
+documentation for the API. If you add docstrings to this file, they will be
+included in the documentation.
+"""
+
+api: NinjaAPI = NinjaAPI(csrf=True, version="1.0.0", urls_namespace="order_api")
+
+
+@api.post(
+    "/orders/import",
+    response={201: schema.OrderImportSchema, 400: schema.OrderImportSchema},
+    tags=["Orders"],
+)
+def import_orders(request: ASGIRequest, payload: schema.OrderImportIn) -> Response:
+    """
+    Import a batch of orders with their movements and stops
+
+    Note:
+    - **Organization** is set to the organization of the user making the request
+    - The batch is validated up front, nothing is created if any order is invalid
+    - Errors are keyed by the index of the order in the payload
+    """
+    if not request.user.has_perm("monta_order.add_order"):
+        return Response({"detail": "Permission denied."}, status=403)
+
+    result: order_import.OrderImportResult = order_import.import_orders(
+        organization=request.user.profile.organization,
+        user=request.user,
+        rows=[row.dict() for row in payload.orders],
+    )
+    return 400 if result.errors else 201, result.as_dict()
+
+
+def _etag_response(request: ASGIRequest, data: dict, etag: str) -> HttpResponse:
+    if order_pages.etag_matches(request.headers.get("If-None-Match"), etag):
+        response: HttpResponse = HttpResponseNotModified()
+    else:
+        response = Response(data)
+    response["ETag"] = etag
+    return response
+
+
+@api.get(
+    "/orders",
+    response={200: schema.OrderPageSchema, 304: None, 400: schema.ErrorSchema},
+    tags=["Orders"],
+)
+def list_orders(
+    request: ASGIRequest,
+    cursor: int | None = None,
+    limit: int = order_pages.PAGE_LIMIT,
+    fields: str | None = None,
+    include: str | None = None,
+) -> HttpResponse:
+    """
+    List the orders of the organization, a page at a time
+
+    Note:
+    - **Organization** is set to the organization of the user making the request
+    - Pass the **next_cursor** of a page as **cursor** to get the next page
+    - **fields** is a comma separated list of the order fields to return
+    - **include=movements** adds the movements of each order with their stops
+    - A page the client already has, named by **If-None-Match**, is answered with 304
+    """
+    if not request.user.has_perm("monta_order.view_order"):
+        return Response({"detail": "Permission denied."}, status=403)
+    try:
+        order_fields: list[str] = order_pages.parse_fields(fields)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+
+    page: order_pages.OrderPage = order_pages.get_order_page(
+        request.user.profile.organization_id,
+        fields=order_fields,
+        cursor=cursor,
+        limit=limit,
+        include_movements=include == "movements",
+    )
+    return _etag_response(
+        request,
+        {"results": page.results, "next_cursor": page.next_cursor},
+        page.etag,
+    )
+
+
+@api.get(
+    "/orders/lookup",
+    response=list[schema.OrderLookupSchema],
+    tags=["Orders"],
+)
+def lookup_orders(
+    request: ASGIRequest,
+    bol_number: str | None = None,
+    consignee_ref_num: str | None = None,
+    customer_id: str | None = None,
+    status: models.StatusChoices | None = None,
+    prefix: bool = False,
+    limit: int = order_lookup.LOOKUP_LIMIT,
+) -> Response:
+    """
+    Look orders up by BOL number, consignee reference number or customer
+
+    Note:
+    - **Organization** is set to the organization of the user making the request
+    - BOL and consignee reference numbers match exactly, or as a prefix with **prefix**
+    - Nothing is returned unless a BOL number, consignee reference number or customer is given
+    """
+    if not request.user.has_perm("monta_order.view_order"):
+        return Response({"detail": "Permission denied."}, status=403)
+
+    return order_lookup.lookup_orders(
+        request.user.profile.organization_id,
+        bol_number=bol_number,
+        consignee_ref_num=consignee_ref_num,
+        customer_id=customer_id,
+        status=status,
+        prefix=prefix,
+        limit=limit,
+    )
+
+
+@api.get(
+    "/orders/{order_pk}",
+    response={200: dict, 304: None, 400: schema.ErrorSchema, 404: schema.ErrorSchema},
+    tags=["Orders"],
+)
+def get_order(
+    request: ASGIRequest,
+    order_pk: int,
+    fields: str | None = None,
+    include: str | None = None,
+) -> HttpResponse:
+    """
+    Get an order by id
+
+    Note:
+    - **fields** is a comma separated list of the order fields to return
+    - **include=movements** adds the movements of the order with their stops
+    - An order the client already has, named by **If-None-Match**, is answered with 304
+    """
+    if not request.user.has_perm("monta_order.view_order"):
+        return Response({"detail": "Permission denied."}, status=403)
+    try:
+        order_fields: list[str] = order_pages.parse_fields(fields)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+
+    include_movements: bool = include == "movements"
+    # The queryset is scoped to the organization, an order of another one is not found.
+    try:
+        order: models.Order = order_pages.get_order_queryset(
+            request.user.profile.organization_id, order_fields, include_movements
+        ).get(pk=order_pk)
+    except models.Order.DoesNotExist:
+        return Response({"detail": "Order not found."}, status=404)
+    data: dict = order_pages.serialize_order(order, order_fields, include_movements)
+    return _etag_response(request, data, order_pages.get_etag(data))
+
+
+@api.patch(
+    "/movements/{movement_id}/stops",
+    response={200: schema.StopChainUpdateSchema, 400: schema.StopChainUpdateSchema},
+    tags=["Stops"],
+)
+@decorators.check_organization(models.Movement, lookup="movement_id")
+def update_stops(
+    request: ASGIRequest, movement_id: int, payload: schema.StopChainUpdateIn
+) -> Response:
+    """
+    Update several stops of a movement at once
+
+    Note:
+    - Only the fields sent for a stop are changed
+    - The whole stop chain is validated, nothing is changed if any stop is invalid
+    - Errors are keyed by the id of the stop
+    """
+    if not request.user.has_perm("monta_order.change_stop"):
+        return Response({"detail": "Permission denied."}, status=403)
+
+    changes: dict[int, dict] = {
+        stop.id: stop.dict(exclude={"id"}, exclude_unset=True) for stop in payload.stops
+    }
+    errors: dict[int, list[str]] = stop_chain.update_stop_chain(request.record, changes)
+    if errors:
+        return 400, {"updated": 0, "errors": errors}
+    return 200, {"updated": len(changes), "errors": {}}
+
+
+@api.post(
+    "/status_transitions",
+    response=schema.StatusTransitionBatchSchema,
+    tags=["Orders", "Movements", "Stops"],
+)
+def transition_statuses(
+    request: ASGIRequest, payload: schema.StatusTransitionBatchIn
+) -> dict:
+    """
+    Change the status of many orders, movements and stops at once
+
+    Note:
+    - Every change is checked against the allowed status transitions and the stop chain
+    - Valid changes are applied and the movements and orders are rolled up in one transaction
+    - Each item has its own result, the stops of a movement are applied all together or not at all
+    """
+    items: list[dict] = []
+    denied: set[int] = set()
+    for index, item in enumerate(payload.items):
+        if request.user.has_perm(f"monta_order.change_{item.model}"):
+            items.append(item.dict())
+        else:
+            denied.add(index)
+
+    results: Iterator[status_transitions.TransitionResult] = iter(
+        status_transitions.transition_statuses(
+            request.user.profile.organization_id, items
+        )
+    )
+    response: list[dict] = [
+        (
+            status_transitions.TransitionResult(
+                model=item.model, id=item.id, errors=["Permission denied."]
+            )
+            if index in denied
+            else next(results)
+        ).as_dict()
+        for index, item in enumerate(payload.items)
+    ]
+    applied: int = sum(result["applied"] for result in response)
+    return {
+        "applied": applied,
+        "failed": len(response) - applied,
+        "results": response,
+    }
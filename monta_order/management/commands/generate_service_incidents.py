@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from monta_order.services import service_incidents
+from monta_user.models import Organization
+
+
+class Command(BaseCommand):
+    help: str = "Creates the missing service incidents of late stops completed recently"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--organization", required=True, type=str)
+        parser.add_argument(
+            "--hours", type=int, default=24, help="Size of the window to scan"
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Creates service incidents for the late stops of the window"""
+        try:
+            organization: Organization = Organization.objects.get(
+                name=options["organization"]
+            )
+        except Organization.DoesNotExist as e:
+            raise CommandError(e) from e
+
+        end: datetime = timezone.now()
+        created: int = service_incidents.generate_service_incidents(
+            organization.id, end - timedelta(hours=options["hours"]), end
+        )
+        self.stdout.write(self.style.SUCCESS(f"Created {created} service incidents"))
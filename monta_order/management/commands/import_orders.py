@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from pydantic import ValidationError
+
+from monta_order.schema import OrderImportIn
+from monta_order.services import order_import
+from monta_user.models import MontaUser, Organization
+
+
+class Command(BaseCommand):
+    help: str = "Imports orders, movements and stops from a JSON file"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", type=str, help="JSON file with a list of orders")
+        parser.add_argument("--organization", required=True, type=str)
+        parser.add_argument("--username", required=True, type=str)
+        parser.add_argument(
+            "--batch-size", type=int, default=order_import.IMPORT_BATCH_SIZE
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Imports orders from a JSON file"""
+        try:
+            organization: Organization = Organization.objects.get(
+                name=options["organization"]
+            )
+            user: MontaUser = MontaUser.objects.get(
+                username=options["username"], profile__organization=organization
+            )
+        except (Organization.DoesNotExist, MontaUser.DoesNotExist) as e:
+            raise CommandError(e) from e
+
+        with open(options["path"], encoding="utf-8") as file:
+            data: Any = json.load(file)
+        try:
+            payload: OrderImportIn = OrderImportIn.parse_obj(
+                {"orders": data} if isinstance(data, list) else data
+            )
+        except ValidationError as e:
+            raise CommandError(e) from e
+
+        result: order_import.OrderImportResult = order_import.import_orders(
+            organization=organization,
+            user=user,
+            rows=[row.dict() for row in payload.orders],
+            batch_size=options["batch_size"],
+        )
+        for index, messages in result.errors.items():
+            self.stdout.write(self.style.ERROR(f"Order {index}: {'; '.join(messages)}"))
+        if result.errors:
+            raise CommandError("No orders were imported")
+
+        for batch in result.batches:
+            self.stdout.write(
+                f"{batch['orders']} orders, {batch['stops']} stops in "
+                f"{batch['seconds']}s ({batch['orders_per_second']} orders/s)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.orders_created} orders, "
+                f"{result.movements_created} movements and "
+                f"{result.stops_created} stops"
+            )
+        )
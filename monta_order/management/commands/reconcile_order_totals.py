@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from monta_order.services import totals
+from monta_user.models import Organization
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Repairs order pieces, weight and stop count that drifted from the stops"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--organization", type=str)
+        parser.add_argument(
+            "--batch-size", type=int, default=totals.RECONCILE_BATCH_SIZE
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """Repairs the stop totals of every order"""
+        organization: Organization | None = None
+        if options["organization"]:
+            try:
+                organization = Organization.objects.get(name=options["organization"])
+            except Organization.DoesNotExist as e:
+                raise CommandError(e) from e
+
+        repaired: int = totals.reconcile_order_totals(
+            organization=organization, batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} orders"))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 4.1.2 on 2026-10-17 20:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "monta_order",
+            "0046_alter_revenuecode_options_remove_revenuecode_code_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE IF NOT EXISTS monta_seq_order_id INCREMENT BY 20 MINVALUE 1;",
+                "SELECT setval('monta_seq_order_id', COALESCE((SELECT MAX(substring(order_id FROM '[0-9]+$')::bigint) "
+                "FROM monta_order_order), 0) + 1, false);",
+            ],
+            reverse_sql="DROP SEQUENCE IF EXISTS monta_seq_order_id;",
+        ),
+    ]
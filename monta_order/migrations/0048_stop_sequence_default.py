@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0047_order_id_sequence"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="stop",
+            name="sequence",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="The sequence of the stop in the movement.",
+                null=True,
+                verbose_name="Sequence",
+            ),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:23
+
+import pgtrigger.compiler
+import pgtrigger.migrations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0048_stop_sequence_default"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stop_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Total Stops",
+                verbose_name="Stop Count",
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="stop",
+            trigger=pgtrigger.compiler.Trigger(
+                name="stop_totals_insert",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="\n        UPDATE monta_order_order AS target\n        SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count\n        FROM (\n            SELECT m.order_id,\n                   COALESCE(SUM(s.pieces), 0) AS pieces,\n                   COALESCE(SUM(s.weight), 0) AS weight,\n                   COUNT(s.id) AS stop_count\n            FROM monta_order_movement AS m\n            LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id\n            WHERE m.order_id IN (\n                SELECT order_id FROM monta_order_movement\n                WHERE id IN (SELECT movement_id FROM new_stops)\n            )\n            GROUP BY m.order_id\n        ) AS totals\n        WHERE target.id = totals.order_id\n          AND (target.pieces, target.weight, target.stop_count)\n              IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);\n        RETURN NULL;\n    ",
+                    hash="27793e587065f5631f0bc103fe5402d445943181",
+                    level="STATEMENT",
+                    operation="INSERT",
+                    pgid="pgtrigger_stop_totals_insert_e70c8",
+                    referencing="REFERENCING NEW TABLE AS new_stops ",
+                    table="monta_order_stop",
+                    when="AFTER",
+                ),
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="stop",
+            trigger=pgtrigger.compiler.Trigger(
+                name="stop_totals_update",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="\n        UPDATE monta_order_order AS target\n        SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count\n        FROM (\n            SELECT m.order_id,\n                   COALESCE(SUM(s.pieces), 0) AS pieces,\n                   COALESCE(SUM(s.weight), 0) AS weight,\n                   COUNT(s.id) AS stop_count\n            FROM monta_order_movement AS m\n            LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id\n            WHERE m.order_id IN (\n                SELECT order_id FROM monta_order_movement\n                WHERE id IN (SELECT n.movement_id FROM new_stops AS n JOIN old_stops AS o ON o.id = n.id WHERE (n.movement_id, n.pieces, n.weight) IS DISTINCT FROM (o.movement_id, o.pieces, o.weight) UNION SELECT o.movement_id FROM new_stops AS n JOIN old_stops AS o ON o.id = n.id WHERE (n.movement_id, n.pieces, n.weight) IS DISTINCT FROM (o.movement_id, o.pieces, o.weight))\n            )\n            GROUP BY m.order_id\n        ) AS totals\n        WHERE target.id = totals.order_id\n          AND (target.pieces, target.weight, target.stop_count)\n              IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);\n        RETURN NULL;\n    ",
+                    hash="96a18d8d7b8b2bb542ad2368bb8e7cffff0e42ea",
+                    level="STATEMENT",
+                    operation="UPDATE",
+                    pgid="pgtrigger_stop_totals_update_43ea8",
+                    referencing="REFERENCING OLD TABLE AS old_stops  NEW TABLE AS new_stops ",
+                    table="monta_order_stop",
+                    when="AFTER",
+                ),
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="stop",
+            trigger=pgtrigger.compiler.Trigger(
+                name="stop_totals_delete",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="\n        UPDATE monta_order_order AS target\n        SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count\n        FROM (\n            SELECT m.order_id,\n                   COALESCE(SUM(s.pieces), 0) AS pieces,\n                   COALESCE(SUM(s.weight), 0) AS weight,\n                   COUNT(s.id) AS stop_count\n            FROM monta_order_movement AS m\n            LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id\n            WHERE m.order_id IN (\n                SELECT order_id FROM monta_order_movement\n                WHERE id IN (SELECT movement_id FROM old_stops)\n            )\n            GROUP BY m.order_id\n        ) AS totals\n        WHERE target.id = totals.order_id\n          AND (target.pieces, target.weight, target.stop_count)\n              IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);\n        RETURN NULL;\n    ",
+                    hash="0e59e7ca6e09d39b9343e0789d923f434f99de94",
+                    level="STATEMENT",
+                    operation="DELETE",
+                    pgid="pgtrigger_stop_totals_delete_60d2e",
+                    referencing="REFERENCING OLD TABLE AS old_stops ",
+                    table="monta_order_stop",
+                    when="AFTER",
+                ),
+            ),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE monta_order_order AS target
+                SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count
+                FROM (
+                    SELECT m.order_id,
+                           COALESCE(SUM(s.pieces), 0) AS pieces,
+                           COALESCE(SUM(s.weight), 0) AS weight,
+                           COUNT(s.id) AS stop_count
+                    FROM monta_order_movement AS m
+                    LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id
+                    GROUP BY m.order_id
+                ) AS totals
+                WHERE target.id = totals.order_id
+                  AND (target.pieces, target.weight, target.stop_count)
+                      IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
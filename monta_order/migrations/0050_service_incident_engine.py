@@ -0,0 +1,45 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0049_order_stop_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="delaycode",
+            name="is_default",
+            field=models.BooleanField(
+                default=False,
+                help_text="Delay code given to service incidents recorded for late stops",
+                verbose_name="Is Default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="delaycode",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_default", True)),
+                fields=("organization",),
+                name="unique_default_delay_code",
+            ),
+        ),
+        # Keep the first incident of each stop, later ones are duplicates from re-saving a late stop.
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM monta_order_serviceincident AS duplicate
+                USING monta_order_serviceincident AS first
+                WHERE duplicate.stop_id = first.stop_id AND duplicate.id > first.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="serviceincident",
+            constraint=models.UniqueConstraint(
+                fields=("stop",), name="unique_service_incident_stop"
+            ),
+        ),
+    ]
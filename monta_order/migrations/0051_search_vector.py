@@ -0,0 +1,59 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.db import migrations
+import pgtrigger.compiler
+import pgtrigger.migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0050_service_incident_engine"),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name="order",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Search Vector"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="order_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["order_id"],
+                name="order_order_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="order",
+            trigger=pgtrigger.compiler.Trigger(
+                name="search_vector",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="NEW.search_vector := setweight(to_tsvector('simple', coalesce((NEW.order_id)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.bol_number)::text, '')), 'A') || setweight(to_tsvector('simple', coalesce((NEW.consignee_ref_num)::text, '')), 'B') || setweight(to_tsvector('simple', coalesce((NEW.origin_address)::text, '')), 'C') || setweight(to_tsvector('simple', coalesce((NEW.destination_address)::text, '')), 'C'); RETURN NEW;",
+                    hash="4b587e1a7c04cf4b718d8a5e502187ff32b9ca2d",
+                    operation="INSERT OR UPDATE",
+                    pgid="pgtrigger_search_vector_747c9",
+                    table="monta_order_order",
+                    when="BEFORE",
+                ),
+            ),
+        ),
+        # The trigger builds the vector of every existing row.
+        migrations.RunSQL(
+            sql="UPDATE monta_order_order SET search_vector = NULL",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
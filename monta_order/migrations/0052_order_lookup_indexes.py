@@ -0,0 +1,38 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0051_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("bol_number__isnull", False)),
+                fields=["organization", "bol_number"],
+                name="order_org_bol_number_idx",
+                opclasses=["int8_ops", "varchar_pattern_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("consignee_ref_num__isnull", False)),
+                fields=["organization", "consignee_ref_num"],
+                name="order_org_consignee_ref_idx",
+                opclasses=["int8_ops", "varchar_pattern_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["organization", "customer", "status"],
+                name="order_org_customer_status_idx",
+            ),
+        ),
+    ]
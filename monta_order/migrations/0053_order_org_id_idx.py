@@ -0,0 +1,17 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0052_order_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["organization", "id"], name="order_org_id_idx"),
+        ),
+    ]
@@ -0,0 +1,224 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:47
+
+from decimal import Decimal
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_customer", "0017_search_vector"),
+        ("monta_locations", "0010_search_vector"),
+        ("monta_user", "0018_alter_organization_description"),
+        ("monta_equipment", "0010_alter_equipmenttype_description_and_more"),
+        ("monta_order", "0053_order_org_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateTable",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    django_extensions.db.fields.ModificationDateTimeField(
+                        auto_now=True, verbose_name="modified"
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="Name")),
+                (
+                    "rate_method",
+                    models.CharField(
+                        choices=[
+                            ("FLAT", "Flat"),
+                            ("PER_MILE", "Per Mile"),
+                            ("PER_STOP", "Per Stop"),
+                            ("POUNDS", "Pounds"),
+                        ],
+                        default="FLAT",
+                        max_length=20,
+                        verbose_name="Rating Method",
+                    ),
+                ),
+                (
+                    "rate",
+                    models.DecimalField(
+                        decimal_places=4,
+                        help_text="Rate per unit of the rating method, when no break matches",
+                        max_digits=10,
+                        verbose_name="Rate",
+                    ),
+                ),
+                (
+                    "minimum_charge",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=10,
+                        verbose_name="Minimum Charge",
+                    ),
+                ),
+                ("effective_date", models.DateField(verbose_name="Effective Date")),
+                (
+                    "expiration_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="Expiration Date"
+                    ),
+                ),
+                (
+                    "is_active",
+                    models.BooleanField(default=True, verbose_name="Is Active"),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Customer the rates apply to, empty for every customer",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rate_tables",
+                        related_query_name="rate_table",
+                        to="monta_customer.customer",
+                        verbose_name="Customer",
+                    ),
+                ),
+                (
+                    "destination_location",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Destination of the lane, empty for every destination",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="destination_rate_tables",
+                        related_query_name="destination_rate_table",
+                        to="monta_locations.location",
+                        verbose_name="Destination Location",
+                    ),
+                ),
+                (
+                    "equipment_type",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Equipment type the rates apply to, empty for every type",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rate_tables",
+                        related_query_name="rate_table",
+                        to="monta_equipment.equipmenttype",
+                        verbose_name="Equipment Type",
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rate_tables",
+                        related_query_name="rate_table",
+                        to="monta_user.organization",
+                        verbose_name="Organization",
+                    ),
+                ),
+                (
+                    "origin_location",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Origin of the lane, empty for every origin",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="origin_rate_tables",
+                        related_query_name="origin_rate_table",
+                        to="monta_locations.location",
+                        verbose_name="Origin Location",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Rate Table",
+                "verbose_name_plural": "Rate Tables",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RateBreak",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "break_type",
+                    models.CharField(
+                        choices=[("WEIGHT", "Weight"), ("MILEAGE", "Mileage")],
+                        max_length=10,
+                        verbose_name="Break Type",
+                    ),
+                ),
+                (
+                    "minimum",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Lowest weight or mileage of the bracket",
+                        max_digits=10,
+                        verbose_name="Minimum",
+                    ),
+                ),
+                (
+                    "rate",
+                    models.DecimalField(
+                        decimal_places=4, max_digits=10, verbose_name="Rate"
+                    ),
+                ),
+                (
+                    "rate_table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="breaks",
+                        related_query_name="break",
+                        to="monta_order.ratetable",
+                        verbose_name="Rate Table",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Rate Break",
+                "verbose_name_plural": "Rate Breaks",
+                "ordering": ["rate_table", "break_type", "minimum"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ratetable",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["organization", "customer"],
+                name="rate_table_org_customer_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="ratebreak",
+            constraint=models.UniqueConstraint(
+                fields=("rate_table", "break_type", "minimum"), name="unique_rate_break"
+            ),
+        ),
+    ]
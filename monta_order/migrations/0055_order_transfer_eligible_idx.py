@@ -0,0 +1,21 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0054_rate_tables"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("transferred_to_billing", False)),
+                fields=["organization", "ready_to_bill", "billed", "status"],
+                name="order_transfer_eligible_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.1.2 on 2026-10-17 21:09
+
+from django.db import migrations, models
+import pgtrigger.compiler
+import pgtrigger.migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0055_order_transfer_eligible_idx"),
+    ]
+
+    operations = [
+        pgtrigger.migrations.RemoveTrigger(
+            model_name="stop",
+            name="stop_totals_insert",
+        ),
+        pgtrigger.migrations.RemoveTrigger(
+            model_name="stop",
+            name="stop_totals_update",
+        ),
+        pgtrigger.migrations.RemoveTrigger(
+            model_name="stop",
+            name="stop_totals_delete",
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="pieces",
+            field=models.PositiveIntegerField(
+                blank=True,
+                default=0,
+                editable=False,
+                help_text="Total Pieces",
+                null=True,
+                verbose_name="Pieces",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="weight",
+            field=models.PositiveIntegerField(
+                blank=True,
+                default=0,
+                editable=False,
+                help_text="Total Weight",
+                null=True,
+                verbose_name="Weight",
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="stop",
+            trigger=pgtrigger.compiler.Trigger(
+                name="stop_totals_insert",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="\n        UPDATE monta_order_order AS target\n        SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count,\n            modified = now()\n        FROM (\n            SELECT m.order_id,\n                   COALESCE(SUM(s.pieces), 0) AS pieces,\n                   COALESCE(SUM(s.weight), 0) AS weight,\n                   COUNT(s.id) AS stop_count\n            FROM monta_order_movement AS m\n            LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id\n            WHERE m.order_id IN (\n                SELECT order_id FROM monta_order_movement\n                WHERE id IN (SELECT movement_id FROM new_stops)\n            )\n            GROUP BY m.order_id\n        ) AS totals\n        WHERE target.id = totals.order_id\n          AND (target.pieces, target.weight, target.stop_count)\n              IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);\n        RETURN NULL;\n    ",
+                    hash="4799df9e88696e55253a244392241ef74d14dc99",
+                    level="STATEMENT",
+                    operation="INSERT",
+                    pgid="pgtrigger_stop_totals_insert_e70c8",
+                    referencing="REFERENCING NEW TABLE AS new_stops ",
+                    table="monta_order_stop",
+                    when="AFTER",
+                ),
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="stop",
+            trigger=pgtrigger.compiler.Trigger(
+                name="stop_totals_update",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="\n        UPDATE monta_order_order AS target\n        SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count,\n            modified = now()\n        FROM (\n            SELECT m.order_id,\n                   COALESCE(SUM(s.pieces), 0) AS pieces,\n                   COALESCE(SUM(s.weight), 0) AS weight,\n                   COUNT(s.id) AS stop_count\n            FROM monta_order_movement AS m\n            LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id\n            WHERE m.order_id IN (\n                SELECT order_id FROM monta_order_movement\n                WHERE id IN (SELECT n.movement_id FROM new_stops AS n JOIN old_stops AS o ON o.id = n.id WHERE (n.movement_id, n.pieces, n.weight) IS DISTINCT FROM (o.movement_id, o.pieces, o.weight) UNION SELECT o.movement_id FROM new_stops AS n JOIN old_stops AS o ON o.id = n.id WHERE (n.movement_id, n.pieces, n.weight) IS DISTINCT FROM (o.movement_id, o.pieces, o.weight))\n            )\n            GROUP BY m.order_id\n        ) AS totals\n        WHERE target.id = totals.order_id\n          AND (target.pieces, target.weight, target.stop_count)\n              IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);\n        RETURN NULL;\n    ",
+                    hash="056188fd48fc02110300e4f96aab64ebb4190cb1",
+                    level="STATEMENT",
+                    operation="UPDATE",
+                    pgid="pgtrigger_stop_totals_update_43ea8",
+                    referencing="REFERENCING OLD TABLE AS old_stops  NEW TABLE AS new_stops ",
+                    table="monta_order_stop",
+                    when="AFTER",
+                ),
+            ),
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name="stop",
+            trigger=pgtrigger.compiler.Trigger(
+                name="stop_totals_delete",
+                sql=pgtrigger.compiler.UpsertTriggerSql(
+                    func="\n        UPDATE monta_order_order AS target\n        SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count,\n            modified = now()\n        FROM (\n            SELECT m.order_id,\n                   COALESCE(SUM(s.pieces), 0) AS pieces,\n                   COALESCE(SUM(s.weight), 0) AS weight,\n                   COUNT(s.id) AS stop_count\n            FROM monta_order_movement AS m\n            LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id\n            WHERE m.order_id IN (\n                SELECT order_id FROM monta_order_movement\n                WHERE id IN (SELECT movement_id FROM old_stops)\n            )\n            GROUP BY m.order_id\n        ) AS totals\n        WHERE target.id = totals.order_id\n          AND (target.pieces, target.weight, target.stop_count)\n              IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);\n        RETURN NULL;\n    ",
+                    hash="a248d1f44d5a5d4a09ba48b8e13a86c3c5c44e0d",
+                    level="STATEMENT",
+                    operation="DELETE",
+                    pgid="pgtrigger_stop_totals_delete_60d2e",
+                    referencing="REFERENCING OLD TABLE AS old_stops ",
+                    table="monta_order_stop",
+                    when="AFTER",
+                ),
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.2 on 2026-10-17 22:10
+
+from django.db import migrations
+from django.db.models import Min
+
+
+def mark_default_delay_codes(apps, schema_editor):
+    """
+    Mark the first delay code of every organization without a default as its
+    default, so service incidents keep being recorded after the upgrade.
+    """
+    DelayCode = apps.get_model("monta_order", "DelayCode")
+    with_default = DelayCode.objects.filter(is_default=True).values("organization_id")
+    first_codes = (
+        DelayCode.objects.exclude(organization_id__in=with_default)
+        .values("organization_id")
+        .annotate(first_pk=Min("pk"))
+        .values("first_pk")
+    )
+    DelayCode.objects.filter(pk__in=first_codes).update(is_default=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_order", "0056_order_stop_totals_modified"),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_default_delay_codes, migrations.RunPython.noop),
+    ]
@@ -23,21 +23,76 @@ from __future__ import annotations
 import decimal
 from typing import Any, final
 
+import pgtrigger
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.aggregates import Sum
 from django.template.defaultfilters import slugify
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 
+from core.mixins import FieldTrackerMixin
+from core.search import search_vector_trigger
+from core.sequences import order_id_sequence
 from monta_customer.models import Customer, DocumentClassification
 from monta_driver.models import Driver
 from monta_equipment.models import Equipment, EquipmentType
 from monta_hazardous_material.models import HazardousMaterial
 from monta_locations.models import Location
+from monta_order.services import rollup
+from monta_routes.services import distance
 from monta_user.models import MontaUser, Organization
 
+# Order columns the stop triggers keep equal to the totals of the order's stops.
+STOP_TOTAL_FIELDS: tuple[str, ...] = ("pieces", "weight", "stop_count")
+
+# Updated stops whose movement, pieces or weight changed. Renumbering stops does not touch the totals.
+CHANGED_STOPS: str = (
+    "FROM new_stops AS n JOIN old_stops AS o ON o.id = n.id "
+    "WHERE (n.movement_id, n.pieces, n.weight) "
+    "IS DISTINCT FROM (o.movement_id, o.pieces, o.weight)"
+)
+
+
+def stop_totals_sql(changed_movements: str) -> str:
+    """
+    Trigger body that recomputes the stop totals of the orders of the given movements.
+
+    Each affected order is totaled from its own stops instead of applying a
+    delta, so a stop moving between movements or orders cannot leave drift
+    behind. Orders whose totals did not change are not written, changed ones
+    get a new modified time like any other write.
+
+    :param changed_movements: Query selecting the movement_id of the changed stops
+    :type changed_movements: str
+    :return: PL/pgSQL statements
+    :rtype: str
+    """
+    return f"""
+        UPDATE monta_order_order AS target
+        SET pieces = totals.pieces, weight = totals.weight, stop_count = totals.stop_count,
+            modified = now()
+        FROM (
+            SELECT m.order_id,
+                   COALESCE(SUM(s.pieces), 0) AS pieces,
+                   COALESCE(SUM(s.weight), 0) AS weight,
+                   COUNT(s.id) AS stop_count
+            FROM monta_order_movement AS m
+            LEFT JOIN monta_order_stop AS s ON s.movement_id = m.id
+            WHERE m.order_id IN (
+                SELECT order_id FROM monta_order_movement
+                WHERE id IN ({changed_movements})
+            )
+            GROUP BY m.order_id
+        ) AS totals
+        WHERE target.id = totals.order_id
+          AND (target.pieces, target.weight, target.stop_count)
+              IS DISTINCT FROM (totals.pieces, totals.weight, totals.stop_count);
+        RETURN NULL;
+    """
+
 
 def order_documentation_upload_to(instance: Order, filename: str) -> str:
     """
@@ -90,6 +145,16 @@ class RateMethodChoices(models.TextChoices):
     POUNDS = "POUNDS", _("Pounds")
 
 
+@final
+class RateBreakChoices(models.TextChoices):
+    """
+    Quantity a rate break bracket is measured on
+    """
+
+    WEIGHT = "WEIGHT", _("Weight")
+    MILEAGE = "MILEAGE", _("Mileage")
+
+
 class DelayCode(TimeStampedModel):
     """
     Delay Code Model Fields
@@ -120,6 +185,11 @@ class DelayCode(TimeStampedModel):
         blank=True,
         null=True,
     )
+    is_default = models.BooleanField(
+        _("Is Default"),
+        default=False,
+        help_text=_("Delay code given to service incidents recorded for late stops"),
+    )
 
     class Meta:
         """
@@ -132,6 +202,13 @@ class DelayCode(TimeStampedModel):
         indexes: list[models.Index] = [
             models.Index(fields=["delay_code_id", "name"]),
         ]
+        constraints: list[models.BaseConstraint] = [
+            models.UniqueConstraint(
+                fields=["organization"],
+                condition=models.Q(is_default=True),
+                name="unique_default_delay_code",
+            ),
+        ]
 
     def __str__(self) -> str:
         """
@@ -322,7 +399,197 @@ class OrderType(TimeStampedModel):
         return reverse("order_type_detail", kwargs={"pk": self.pk})
 
 
-class Order(TimeStampedModel):
+class RateTable(TimeStampedModel):
+    """
+    Rate Table Model Fields
+
+    ----------------------------------------
+    NOTE: A rate table prices orders of a customer, lane and equipment type.
+    Each of the three may be left empty to match any order, the most specific
+    table in effect on the order's origin appointment date is used. See
+    monta_order.services.rating.
+    ----------------------------------------
+    """
+
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name="rate_tables",
+        related_query_name="rate_table",
+        verbose_name=_("Organization"),
+    )
+    name = models.CharField(_("Name"), max_length=100)
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name="rate_tables",
+        related_query_name="rate_table",
+        verbose_name=_("Customer"),
+        blank=True,
+        null=True,
+        help_text=_("Customer the rates apply to, empty for every customer"),
+    )
+    origin_location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name="origin_rate_tables",
+        related_query_name="origin_rate_table",
+        verbose_name=_("Origin Location"),
+        blank=True,
+        null=True,
+        help_text=_("Origin of the lane, empty for every origin"),
+    )
+    destination_location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name="destination_rate_tables",
+        related_query_name="destination_rate_table",
+        verbose_name=_("Destination Location"),
+        blank=True,
+        null=True,
+        help_text=_("Destination of the lane, empty for every destination"),
+    )
+    equipment_type = models.ForeignKey(
+        EquipmentType,
+        on_delete=models.CASCADE,
+        related_name="rate_tables",
+        related_query_name="rate_table",
+        verbose_name=_("Equipment Type"),
+        blank=True,
+        null=True,
+        help_text=_("Equipment type the rates apply to, empty for every type"),
+    )
+    rate_method = models.CharField(
+        _("Rating Method"),
+        max_length=20,
+        choices=RateMethodChoices.choices,
+        default=RateMethodChoices.FLAT,
+    )
+    rate = models.DecimalField(
+        _("Rate"),
+        max_digits=10,
+        decimal_places=4,
+        help_text=_("Rate per unit of the rating method, when no break matches"),
+    )
+    minimum_charge = models.DecimalField(
+        _("Minimum Charge"),
+        max_digits=10,
+        decimal_places=2,
+        default=decimal.Decimal("0.00"),
+    )
+    effective_date = models.DateField(_("Effective Date"))
+    expiration_date = models.DateField(
+        _("Expiration Date"),
+        blank=True,
+        null=True,
+    )
+    is_active = models.BooleanField(_("Is Active"), default=True)
+
+    class Meta:
+        """
+        Metaclass for the Rate Table model.
+        """
+
+        verbose_name: str = _("Rate Table")
+        verbose_name_plural: str = _("Rate Tables")
+        ordering: list[str] = ["name"]
+        indexes: list[models.Index] = [
+            models.Index(
+                fields=["organization", "customer"],
+                name="rate_table_org_customer_idx",
+                condition=models.Q(is_active=True),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """
+        String representation of the Rate Table
+
+        :return: The name of the Rate Table
+        :rtype: str
+        """
+        return self.name
+
+    def clean(self) -> None:
+        """
+        Clean the Rate Table model.
+
+        :return: None
+        :rtype: None
+        :raises ValidationError
+        """
+        if self.expiration_date and self.expiration_date < self.effective_date:
+            raise ValidationError(
+                {
+                    "expiration_date": _(
+                        "Expiration date cannot be before the effective date"
+                    )
+                }
+            )
+        if bool(self.origin_location_id) != bool(self.destination_location_id):
+            raise ValidationError(
+                _("A lane needs both an origin and a destination location")
+            )
+
+
+class RateBreak(models.Model):
+    """
+    Rate Break Model Fields
+
+    A bracket of a rate table. The rate of the highest bracket whose minimum
+    the order reaches replaces the rate of the table.
+    """
+
+    rate_table = models.ForeignKey(
+        RateTable,
+        on_delete=models.CASCADE,
+        related_name="breaks",
+        related_query_name="break",
+        verbose_name=_("Rate Table"),
+    )
+    break_type = models.CharField(
+        _("Break Type"),
+        max_length=10,
+        choices=RateBreakChoices.choices,
+    )
+    minimum = models.DecimalField(
+        _("Minimum"),
+        max_digits=10,
+        decimal_places=2,
+        help_text=_("Lowest weight or mileage of the bracket"),
+    )
+    rate = models.DecimalField(
+        _("Rate"),
+        max_digits=10,
+        decimal_places=4,
+    )
+
+    class Meta:
+        """
+        Metaclass for the Rate Break model.
+        """
+
+        verbose_name: str = _("Rate Break")
+        verbose_name_plural: str = _("Rate Breaks")
+        ordering: list[str] = ["rate_table", "break_type", "minimum"]
+        constraints: list[models.BaseConstraint] = [
+            models.UniqueConstraint(
+                fields=["rate_table", "break_type", "minimum"],
+                name="unique_rate_break",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """
+        String representation of the Rate Break
+
+        :return: Break type and minimum of the bracket
+        :rtype: str
+        """
+        return f"{self.break_type} {self.minimum}"
+
+
+class Order(FieldTrackerMixin, TimeStampedModel):
     """
     Order Model Fields
     """
@@ -371,6 +638,7 @@ class Order(TimeStampedModel):
         default=0,
         null=True,
         blank=True,
+        editable=False,
     )
     weight = models.PositiveIntegerField(
         _("Weight"),
@@ -378,6 +646,13 @@ class Order(TimeStampedModel):
         default=0,
         null=True,
         blank=True,
+        editable=False,
+    )
+    stop_count = models.PositiveIntegerField(
+        _("Stop Count"),
+        help_text=_("Total Stops"),
+        default=0,
+        editable=False,
     )
     origin_location = models.ForeignKey(
         Location,
@@ -557,6 +832,7 @@ class Order(TimeStampedModel):
         blank=True,
         help_text=_("Consignee Reference Number"),
     )
+    search_vector = SearchVectorField(_("Search Vector"), null=True, editable=False)
 
     class Meta:
         """
@@ -568,6 +844,48 @@ class Order(TimeStampedModel):
         ordering: list[str] = ["order_id"]
         indexes: list[models.Index] = [
             models.Index(fields=["order_id"]),
+            # Pattern operators serve both exact and prefix lookups.
+            models.Index(
+                fields=["organization", "bol_number"],
+                name="order_org_bol_number_idx",
+                opclasses=["int8_ops", "varchar_pattern_ops"],
+                condition=models.Q(bol_number__isnull=False),
+            ),
+            models.Index(
+                fields=["organization", "consignee_ref_num"],
+                name="order_org_consignee_ref_idx",
+                opclasses=["int8_ops", "varchar_pattern_ops"],
+                condition=models.Q(consignee_ref_num__isnull=False),
+            ),
+            models.Index(
+                fields=["organization", "customer", "status"],
+                name="order_org_customer_status_idx",
+            ),
+            # Orders waiting to be transferred to billing.
+            models.Index(
+                fields=["organization", "ready_to_bill", "billed", "status"],
+                name="order_transfer_eligible_idx",
+                condition=models.Q(transferred_to_billing=False),
+            ),
+            # Keyset pages of the orders API.
+            models.Index(fields=["organization", "id"], name="order_org_id_idx"),
+            GinIndex(fields=["search_vector"], name="order_search_vector_idx"),
+            GinIndex(
+                fields=["order_id"],
+                name="order_order_id_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+        triggers: list[pgtrigger.Trigger] = [
+            search_vector_trigger(
+                {
+                    "NEW.order_id": "A",
+                    "NEW.bol_number": "A",
+                    "NEW.consignee_ref_num": "B",
+                    "NEW.origin_address": "C",
+                    "NEW.destination_address": "C",
+                }
+            ),
         ]
 
     def __str__(self) -> str:
@@ -587,15 +905,7 @@ class Order(TimeStampedModel):
         :return: Order ID
         :rtype: str
         """
-        last_order = Order.objects.all().order_by("-order_id").last()
-        if last_order:
-            order_id: int = last_order.order_id
-            order_id: int = order_id[1:]
-            order_id: int = int(order_id) + 1
-            new_order_id: str = "S" + str(order_id)
-        else:
-            new_order_id = "S1"
-        return new_order_id
+        return f"S{order_id_sequence.next_value()}"
 
     def create_stops(self) -> tuple[Stop, Stop]:
         """
@@ -612,6 +922,8 @@ class Order(TimeStampedModel):
             location=self.origin_location,
             address_line=self.origin_address,
             appointment_time=self.origin_appointment_time,
+            pieces=self.pieces,
+            weight=self.weight,
         )
         destination_stop: Stop = Stop.objects.create(
             organization=self.organization,
@@ -637,130 +949,36 @@ class Order(TimeStampedModel):
         )
         self.create_stops()
 
-    # def get_or_create_route(self) -> ApiError | Any:
-    #     """
-    #     Function to get or create route for the order.
-
-    #     # TODO: Move this to a service. FUCK I REMEMBER I NEED TO FIX THE WAY THE GOOGLE API GIVES BACK DISTANCE AND DURATION
-    #     **********************************************************************************************************************
-    #     * NOTE: If the Organization does not have generated routes active, and a Google api key is not provided, the
-    #     function will not create a route. *
-    #     **********************************************************************************************************************
-
-    #     :return: Distance of the route
-    #     :rtype: decimal.Decimal
-
-    #     """
-    #     # Check if the organization has generating routes enabled
-    #     organization_settings = OrganizationSettings.objects.filter(
-    #         organization__exact=self.organization,
-    #     ).get()
-    #     if organization_settings.generate_routes is True:
-    #         # Check if the route already exists
-    #         route = Route.objects.filter(
-    #             organization=self.organization,
-    #             origin=self.origin_location.location_id,
-    #             destination=self.destination_location.location_id,
-    #         ).first()
-    #         if route:
-    #             # If the route already exists return the distance
-    #             return route.distance
-    #         else:
-    #             # Otherwise run the process of creating the route
-    #             # Get the API key from the Integration model
-    #             integration_api = (
-    #                 Integration.objects.filter(
-    #                     organization=self.organization,
-    #                     name__exact=IntegrationChoices.GOOGLE_MAPS,
-    #                     is_active=True,
-    #                 )
-    #                 .first()
-    #                 .api_key
-    #             )
-    #             if integration_api:
-    #                 # If the API key exists, start the process of creating the route
-    #                 try:
-    #                     gmaps = googlemaps.Client(key=integration_api)
-    #                 except googlemaps.exceptions.ApiError as ApiError:
-    #                     return ApiError
-
-    #                 # Call the Google Maps Distance Matrix API to get the distance between the two stops.
-    #                 direction_result = gmaps.distance_matrix(
-    #                     origins=self.origin_location.get_address_combination,
-    #                     destinations=self.destination_location.get_address_combination,
-    #                     mode="driving",
-    #                     departure_time="now",
-    #                     language=organization_settings.language,
-    #                     units=organization_settings.mileage_unit,
-    #                     traffic_model=organization_settings.traffic_model,
-    #                 )
-
-    #                 print(
-    #                     "Im Here",
-    #                     direction_result["rows"][0]["elements"][0]["duration"][
-    #                         "text"
-    #                     ].split(" ")[0],
-    #                 )
-    #                 created_route = Route.objects.create(
-    #                     organization=self.organization,
-    #                     origin=self.origin_location.location_id,
-    #                     destination=self.destination_location.location_id,
-    #                     distance=direction_result["rows"][0]["elements"][0]["distance"][
-    #                         "text"
-    #                     ].split(" ")[0],
-    #                     duration=direction_result["rows"][0]["elements"][0]["duration"][
-    #                         "text"
-    #                     ].split(" ")[0],
-    #                 )
-    #                 return created_route.distance
-
-    def calculate_total(self) -> decimal.Decimal:
+    def get_or_create_route(self) -> decimal.Decimal | None:
         """
-        Function to calculate the total for the order.
+        Get the distance between the origin and destination of the order.
 
-        :return: Total for the order
-        :rtype: decimal.Decimal
-        """
-
-        # Handle Flat fee calculation
-        if self.rate_method == RateMethodChoices.FLAT:
-            if self.other_charge_amount and self.freight_charge_amount:
-                return self.freight_charge_amount + self.other_charge_amount
-            if self.freight_charge_amount:
-                return decimal.Decimal(self.freight_charge_amount)
-
-        # Handle Mileage calculation
-        elif self.rate_method == RateMethodChoices.PER_MILE:
-            if self.other_charge_amount and self.mileage and self.freight_charge_amount:
-                return (
-                    self.freight_charge_amount + self.other_charge_amount + self.mileage
-                )
-            if self.mileage and self.freight_charge_amount:
-                return self.freight_charge_amount + self.mileage
-
-        return decimal.Decimal(self.freight_charge_amount)
+        The distance comes from the route cache, the Route table, or the
+        organization's distance provider, in that order. If the organization
+        does not generate routes and no route exists, no distance is returned.
 
-    def total_pieces(self) -> int:
+        :return: Distance of the route
+        :rtype: decimal.Decimal | None
         """
-        get the pieces for the order.
+        return distance.get_route_distance(
+            self.organization, self.origin_location, self.destination_location
+        )
 
-        :return: Pieces for the order
-        :rtype: int
+    def calculate_total(self) -> decimal.Decimal:
         """
-        return Stop.objects.filter(movement__order__exact=self).aggregate(
-            Sum("pieces")
-        )["pieces__sum"]
+        Function to calculate the total for the order.
 
-    def total_weight(self) -> int:
-        """
-        Get the weight for the order.
+        The order is rated by its rate table, or without one by its freight
+        charge amount per unit of its rating method, see
+        monta_order.services.rating.
 
-        :return: Weight for the order
-        :rtype: int
+        :return: Total for the order
+        :rtype: decimal.Decimal
         """
-        return Stop.objects.filter(movement__order__exact=self).aggregate(
-            Sum("weight")
-        )["weight__sum"]
+        # Imported here, the rating service depends on these models.
+        from monta_order.services import rating
+
+        return rating.rate_order(self)
 
     def clean(self) -> None:
         """
@@ -784,6 +1002,23 @@ class Order(TimeStampedModel):
                     _("Mileage is required for per mile rating method")
                 )
 
+        if self.bol_number and self.has_changed("bol_number"):
+            # Imported here, the lookup service depends on the models of this module.
+            from monta_order.services import order_lookup
+
+            duplicate: str | None = order_lookup.find_duplicate_order(
+                self.organization_id, self.bol_number, exclude_pk=self.pk
+            )
+            if duplicate:
+                raise ValidationError(
+                    {
+                        "bol_number": _(
+                            "BOL number is already on open order %(order_id)s"
+                        )
+                        % {"order_id": duplicate}
+                    }
+                )
+
         if self.ready_to_bill:
             # if the order is marked ready to bill, but the order status is not complete, raise an error.
             if self.status != StatusChoices.COMPLETED:
@@ -806,17 +1041,12 @@ class Order(TimeStampedModel):
             # If the order ID is not set, generate one.
             self.order_id = self.generate_order_id()
 
-        self.origin_address = f"{self.origin_location.get_address_combination}"
-        self.destination_address = (
-            f"{self.destination_location.get_address_combination}"
-        )
-
-        # If the order status is complete, add the piece and weight from each stop to the order.
-        if self.status == StatusChoices.COMPLETED:
-            # Only total the pieces and weight if the existing total is not set.
-            if self.pieces and self.weight is None:
-                self.pieces = self.total_pieces()
-                self.weight = self.total_weight()
+        if self.has_changed("origin_location"):
+            self.origin_address = f"{self.origin_location.get_address_combination}"
+        if self.has_changed("destination_location"):
+            self.destination_address = (
+                f"{self.destination_location.get_address_combination}"
+            )
 
         if self.ready_to_bill:
             self.sub_total = self.calculate_total()
@@ -827,9 +1057,12 @@ class Order(TimeStampedModel):
             if self.mileage is None:
                 # If the mileage is none, get the distance between the two stops.
                 self.mileage = self.get_or_create_route()
-        if not self.movements.exists():
-            self.create_movement()
+        creating: bool = self._state.adding
+        # Only changed columns are written, so a stale instance does not overwrite the stop totals.
         super().save(**kwargs)
+        # The movement references the order, so it can only be created once the order is saved.
+        if creating or not self.movements.exists():
+            self.create_movement()
 
     def get_absolute_url(self) -> str:
         """
@@ -841,7 +1074,7 @@ class Order(TimeStampedModel):
         return reverse("order_detail", kwargs={"pk": self.pk})
 
 
-class Movement(TimeStampedModel):
+class Movement(FieldTrackerMixin, TimeStampedModel):
     """
     Movement Model Fields
     """
@@ -915,26 +1148,26 @@ class Movement(TimeStampedModel):
         """
         return f"{self.order} - {self.assigned_driver}"
 
-    def sequence_stops(self) -> None:
+    def reorder_stops(self, stop_ids: list[int]) -> None:
         """
-        Set the stop sequence number for the stops in the movement based on when the stops were created.
+        Set the stop sequence to the position of each stop in stop_ids with one UPDATE.
 
+        :param stop_ids: Ids of the movement's stops in their new order
+        :type stop_ids: list[int]
         :return: None
         :rtype: None
         """
-        # If the sequence is not ordered currently order it.
-        # add to fix maximum recursion depth exceeded in comparison
-        if (
-            not self.stops.order_by("sequence")
-            .values_list("sequence", flat=True)
-            .distinct()
-            .count()
-            == self.stops.count()
-        ):
-            stops = self.stops.order_by("created")
-            for index, stop in enumerate(stops, start=1):
-                stop.sequence = index
-                stop.save()
+        if not stop_ids:
+            return
+        self.stops.filter(pk__in=stop_ids).update(
+            sequence=models.Case(
+                *(
+                    models.When(pk=stop_id, then=models.Value(position))
+                    for position, stop_id in enumerate(stop_ids, start=1)
+                ),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
 
     def clean(self) -> None:
         """
@@ -947,7 +1180,7 @@ class Movement(TimeStampedModel):
 
         if self.pk:
             if self.status == StatusChoices.AVAILABLE:
-                old_status = Movement.objects.get(pk=self.pk).status
+                old_status = self.get_loaded_value("status")
                 # If the movement status is changed from available to something else, raise an error.
                 if old_status in (StatusChoices.IN_PROGRESS, StatusChoices.COMPLETED):
                     raise ValidationError(
@@ -1013,22 +1246,17 @@ class Movement(TimeStampedModel):
         :rtype: None
         """
         self.full_clean()
-        if self.status == StatusChoices.IN_PROGRESS:
-            self.order.status = StatusChoices.IN_PROGRESS
-            self.order.save()
-
-        if self.assigned_driver:
+        if self.assigned_driver and self.has_changed("assigned_driver"):
             self.equipment = self.assigned_driver.equipments.first()
+        status_changed: bool = self.has_changed("status")
         super().save(**kwargs)
 
-        if self.status == StatusChoices.COMPLETED:
-            if not self.order.movements.filter(
-                status=StatusChoices.IN_PROGRESS
-            ).exists():
-                self.order.status = StatusChoices.COMPLETED
-                self.order.save()
-
-        self.sequence_stops()
+        # Roll the movement status up to the order once the transaction commits.
+        if status_changed and self.status in (
+            StatusChoices.IN_PROGRESS,
+            StatusChoices.COMPLETED,
+        ):
+            rollup.schedule_orders([self.order_id])
 
 
 class ServiceIncident(TimeStampedModel):
@@ -1087,6 +1315,11 @@ class ServiceIncident(TimeStampedModel):
         indexes: list[models.Index] = [
             models.Index(fields=["movement"]),
         ]
+        constraints: list[models.BaseConstraint] = [
+            models.UniqueConstraint(
+                fields=["stop"], name="unique_service_incident_stop"
+            ),
+        ]
 
     def __str__(self) -> str:
         """
@@ -1118,7 +1351,7 @@ class ServiceIncident(TimeStampedModel):
         return reverse("service_incident-detail", kwargs={"pk": self.pk})
 
 
-class Stop(TimeStampedModel):
+class Stop(FieldTrackerMixin, TimeStampedModel):
     """
     Stop model fields
 
@@ -1136,7 +1369,6 @@ class Stop(TimeStampedModel):
     )
     sequence = models.PositiveIntegerField(
         _("Sequence"),
-        default=1,
         null=True,
         blank=True,
         help_text=_("The sequence of the stop in the movement."),
@@ -1215,6 +1447,36 @@ class Stop(TimeStampedModel):
         indexes: list[models.Index] = [
             models.Index(fields=["sequence"]),
         ]
+        # Statement level, so bulk_create, update() and delete() refresh each order once.
+        triggers: list[pgtrigger.Trigger] = [
+            pgtrigger.Trigger(
+                name="stop_totals_insert",
+                level=pgtrigger.Statement,
+                when=pgtrigger.After,
+                operation=pgtrigger.Insert,
+                referencing=pgtrigger.Referencing(new="new_stops"),
+                func=stop_totals_sql("SELECT movement_id FROM new_stops"),
+            ),
+            pgtrigger.Trigger(
+                name="stop_totals_update",
+                level=pgtrigger.Statement,
+                when=pgtrigger.After,
+                operation=pgtrigger.Update,
+                referencing=pgtrigger.Referencing(old="old_stops", new="new_stops"),
+                func=stop_totals_sql(
+                    f"SELECT n.movement_id {CHANGED_STOPS} "
+                    f"UNION SELECT o.movement_id {CHANGED_STOPS}"
+                ),
+            ),
+            pgtrigger.Trigger(
+                name="stop_totals_delete",
+                level=pgtrigger.Statement,
+                when=pgtrigger.After,
+                operation=pgtrigger.Delete,
+                referencing=pgtrigger.Referencing(old="old_stops"),
+                func=stop_totals_sql("SELECT movement_id FROM old_stops"),
+            ),
+        ]
 
     def __str__(self) -> str:
         """
@@ -1234,97 +1496,16 @@ class Stop(TimeStampedModel):
         :raises ValidationError
         """
         if self.pk:
-            # If the stop is in progress or completed, the appointment time cannot be changed back to available.
-            if self.status == StatusChoices.AVAILABLE:
-                old_status = Stop.objects.get(pk__exact=self.pk).status
-                if old_status in (StatusChoices.IN_PROGRESS, StatusChoices.COMPLETED):
-                    raise ValidationError(
-                        _("Stop status cannot be changed back to available")
-                    )
-            if self.sequence:
-                if self.sequence > 1:
-                    previous_stop = self.movement.stops.filter(
-                        sequence__exact=self.sequence - 1
-                    ).first()
-                    if previous_stop:
-                        # If the current stop appointment time is before the previous
-                        # stop appointment time, raise an error
-                        if self.appointment_time < previous_stop.appointment_time:
-                            raise ValidationError(
-                                _(
-                                    "Stop appointment time cannot be before the previous stop appointment time"
-                                )
-                            )
-                        # If previous stop is in available or in progress, current stop cannot be
-                        # completed or in progress
-                        if previous_stop.status != StatusChoices.COMPLETED:
-                            if self.status in (
-                                StatusChoices.IN_PROGRESS,
-                                StatusChoices.COMPLETED,
-                            ):
-                                raise ValidationError(
-                                    _(
-                                        "The previous stop must be completed before the next stop can be put in progress "
-                                        "or completed "
-                                    )
-                                )
-            # Sequence the stops
-            if self.sequence < self.movement.stops.count():
-                next_stop = self.movement.stops.filter(
-                    sequence__exact=self.sequence + 1
-                ).first()
-                if next_stop:
-                    # If the appointment time of current stop is greater than the next stop, then raise an error
-                    if self.appointment_time > next_stop.appointment_time:
-                        raise ValidationError(
-                            _(
-                                "Stop appointment time cannot be after the next stop appointment time"
-                            )
-                        )
+            # Imported here, the validator depends on the models of this module.
+            from monta_order.services import stop_chain
 
-                    # If the next stop is in progress or completed, the current stop cannot be available
-                    if self.status != StatusChoices.COMPLETED:
-                        if next_stop.status in (
-                            StatusChoices.COMPLETED,
-                            StatusChoices.IN_PROGRESS,
-                        ):
-                            raise ValidationError(
-                                _(
-                                    "The next stop must be available before the previous stop can be put in progress "
-                                    "or completed "
-                                )
-                            )
-
-            # If the movement has no driver or equipment ,but the status is in progress or completed, raise an error
-            if self.movement.assigned_driver and self.movement.equipment is None:
-                if self.status in (StatusChoices.COMPLETED, StatusChoices.IN_PROGRESS):
-                    raise ValidationError(
-                        _(
-                            "Movement must have a driver and equipment to be in progress or completed"
-                        )
-                    )
-
-                # if arrival_time or departure_time is set, without a driver or equipment, raise error
-                if self.arrival_time or self.departure_time:
-                    raise ValidationError(
-                        _(
-                            "Movement must have a driver and equipment to have arrival or departure time"
-                        )
-                    )
-
-            # If the stop has a departure time ,but not arrival time, throw an error
-            if self.departure_time:
-                if not self.arrival_time:
-                    raise ValidationError(
-                        _(
-                            "Stop arrival time must be set before the stop departure time"
-                        )
-                    )
-                # If the departure time is before the arrival time, throw an error
-                if self.departure_time < self.arrival_time:
-                    raise ValidationError(
-                        _("Stop departure time cannot be before the stop arrival time")
-                    )
+            errors: dict[int, list[str]] = stop_chain.validate_stop_chain(
+                self.movement, {self.pk: stop_chain.get_stop_changes(self)}
+            )
+            if errors:
+                raise ValidationError(
+                    [message for messages in errors.values() for message in messages]
+                )
         super().clean()
 
     def save(self, **kwargs: Any) -> None:
@@ -1336,19 +1517,20 @@ class Stop(TimeStampedModel):
         :return: None
         :rtype: None
         """
-        # If the status changes to in progress, change the movement status associated to this stop to in progress.
-        if self.status == StatusChoices.IN_PROGRESS:
-            self.movement.status = StatusChoices.IN_PROGRESS
-            self.movement.save()
-
-        # if the last stop is completed, change the movement status to complete.
-        if self.status == StatusChoices.COMPLETED:
-            if (
-                self.movement.stops.filter(status=StatusChoices.COMPLETED).count()
-                == self.movement.stops.count()
-            ):
-                self.movement.status = StatusChoices.COMPLETED
-                self.movement.save()
+        if self._state.adding:
+            if self.sequence is None:
+                # Append the stop to the end of the movement.
+                self.sequence = (
+                    Stop.objects.filter(movement_id=self.movement_id).aggregate(
+                        models.Max("sequence")
+                    )["sequence__max"]
+                    or 0
+                ) + 1
+            else:
+                # Insert the stop, moving the stops at and after its position down.
+                Stop.objects.filter(
+                    movement_id=self.movement_id, sequence__gte=self.sequence
+                ).update(sequence=models.F("sequence") + 1)
 
         # If the arrival time is set, change the status to in progress.
         if self.arrival_time:
@@ -1358,18 +1540,27 @@ class Stop(TimeStampedModel):
         if self.arrival_time and self.departure_time:
             self.status = StatusChoices.COMPLETED
 
-        # If the arrival time of the stop is after the appointment time, create a service incident.
-        if self.arrival_time:
-            if self.arrival_time > self.appointment_time:
-                ServiceIncident.objects.create(
-                    organization=self.movement.order.organization,
-                    movement=self.movement,
-                    stop=self,
-                    delay_code=DelayCode.objects.filter(pk__exact=1).first(),
-                    delay_time=self.arrival_time - self.appointment_time,
-                )
+        # A stop that arrived, or whose arrival was cleared, may have become late or on time.
+        lateness_changed: bool = bool(
+            self.arrival_time or self.get_loaded_value("arrival_time")
+        ) and (self.has_changed("arrival_time") or self.has_changed("appointment_time"))
+        status_changed: bool = self.has_changed("status")
         super().save(**kwargs)
 
+        # Record a service incident if the stop arrived after its appointment time, or remove a stale one.
+        if lateness_changed:
+            # Imported here, the engine depends on the models of this module.
+            from monta_order.services import service_incidents
+
+            service_incidents.record_service_incidents(self.organization_id, [self])
+
+        # Roll the stop status up to the movement and order once the transaction commits.
+        if status_changed and self.status in (
+            StatusChoices.IN_PROGRESS,
+            StatusChoices.COMPLETED,
+        ):
+            rollup.schedule_movements([self.movement_id])
+
     def get_absolute_url(self) -> str:
         """
         Get the absolute url of the Stop object
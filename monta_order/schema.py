@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Literal
+
+from ninja import Field, Schema
+
+from monta_order import models
+
+
+class StopImportIn(Schema):
+    """
+    Schema for a stop of an imported order.
+    """
+
+    stop_type: models.StopChoices
+    location_id: str
+    appointment_time: datetime
+    pieces: int = 0
+    weight: int = 0
+
+
+class OrderImportRow(Schema):
+    """
+    Schema for one imported order.
+
+    Related records are referenced by their natural keys. Orders without
+    stops get a pickup at the origin and a delivery at the destination, and
+    the pieces and weight of the order are those of its stops.
+    """
+
+    customer_id: str
+    order_type_id: str
+    commodity_id: str
+    equipment_type_id: str
+    origin_location_id: str
+    origin_appointment_time: datetime
+    destination_location_id: str
+    destination_appointment_time: datetime
+    rate_method: models.RateMethodChoices = models.RateMethodChoices.FLAT
+    freight_charge_amount: Decimal | None = None
+    mileage: Decimal | None = None
+    pieces: int = 0
+    weight: int = 0
+    bol_number: str | None = None
+    consignee_ref_num: str | None = None
+    comment: str | None = None
+    stops: list[StopImportIn] = []
+
+
+class OrderImportIn(Schema):
+    """
+    Schema for importing a batch of orders.
+    """
+
+    orders: list[OrderImportRow]
+
+
+class OrderImportBatchSchema(Schema):
+    """
+    Throughput of one bulk insert batch.
+    """
+
+    orders: int
+    stops: int
+    seconds: float
+    orders_per_second: float | None
+
+
+class OrderImportSchema(Schema):
+    """
+    Result of an order import.
+    """
+
+    orders_created: int
+    movements_created: int
+    stops_created: int
+    errors: dict[int, list[str]]
+    batches: list[OrderImportBatchSchema]
+
+
+class StopUpdateIn(Schema):
+    """
+    Schema for a change to one stop of a movement.
+
+    Only the fields sent are changed.
+    """
+
+    id: int
+    status: models.StatusChoices | None
+    appointment_time: datetime | None
+    arrival_time: datetime | None
+    departure_time: datetime | None
+    pieces: int | None
+    weight: int | None
+
+
+class StopChainUpdateIn(Schema):
+    """
+    Schema for changing several stops of a movement at once.
+    """
+
+    stops: list[StopUpdateIn]
+
+
+class StopChainUpdateSchema(Schema):
+    """
+    Result of a stop chain update.
+    """
+
+    updated: int
+    errors: dict[int, list[str]]
+
+
+class OrderLookupSchema(Schema):
+    """
+    An order found by an order lookup.
+    """
+
+    id: int
+    order_id: str
+    status: models.StatusChoices
+    customer_id: str = Field(..., alias="customer.customer_id")
+    bol_number: str | None
+    consignee_ref_num: str | None
+    origin_appointment_time: datetime
+    destination_appointment_time: datetime
+
+
+class OrderPageSchema(Schema):
+    """
+    A page of orders.
+
+    Each order holds the fields that were asked for.
+    """
+
+    results: list[dict[str, Any]]
+    next_cursor: int | None
+
+
+class ErrorSchema(Schema):
+    """
+    Error of a request that could not be served.
+    """
+
+    detail: str
+
+
+class StatusTransitionIn(Schema):
+    """
+    Schema for changing the status of one order, movement or stop.
+
+    Stops may set their arrival and departure times instead of a status,
+    their status then follows the times.
+    """
+
+    model: Literal["order", "movement", "stop"]
+    id: int
+    status: models.StatusChoices | None
+    arrival_time: datetime | None
+    departure_time: datetime | None
+
+
+class StatusTransitionBatchIn(Schema):
+    """
+    Schema for changing the status of many records at once.
+    """
+
+    items: list[StatusTransitionIn]
+
+
+class StatusTransitionResultSchema(Schema):
+    """
+    Result of one status change.
+    """
+
+    model: str
+    id: int
+    status: str | None
+    applied: bool
+    errors: list[str]
+
+
+class StatusTransitionBatchSchema(Schema):
+    """
+    Result of a batch of status changes, in the order they were sent.
+    """
+
+    applied: int
+    failed: int
+    results: list[StatusTransitionResultSchema]
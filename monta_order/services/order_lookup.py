@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterable
+
+from django.db.models import QuerySet
+
+from monta_order import models
+
+LOOKUP_LIMIT: int = 50
+MAX_LOOKUP_LIMIT: int = 500
+
+# Orders that can still be dispatched, a BOL on one of them is taken.
+OPEN_STATUSES: tuple[str, ...] = (
+    models.StatusChoices.AVAILABLE,
+    models.StatusChoices.IN_PROGRESS,
+)
+
+
+def lookup_orders(
+    organization_id: int,
+    *,
+    bol_number: str | None = None,
+    consignee_ref_num: str | None = None,
+    customer_id: str | None = None,
+    status: str | None = None,
+    prefix: bool = False,
+    limit: int = LOOKUP_LIMIT,
+) -> QuerySet[models.Order]:
+    """
+    Look orders up by BOL number, consignee reference number or customer.
+
+    Each criterion is served by an index that starts with the organization.
+    BOL and consignee reference numbers match exactly, or as a prefix when
+    prefix is set; the pattern operator class of their indexes serves both.
+    No orders are returned when no criterion is given.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param bol_number: BOL number to match
+    :type bol_number: str | None
+    :param consignee_ref_num: Consignee reference number to match
+    :type consignee_ref_num: str | None
+    :param customer_id: Customer ID of the orders
+    :type customer_id: str | None
+    :param status: Status of the orders
+    :type status: str | None
+    :param prefix: Match the numbers as prefixes
+    :type prefix: bool
+    :param limit: Maximum number of orders, capped at MAX_LOOKUP_LIMIT
+    :type limit: int
+    :return: Matching orders with their customer
+    :rtype: QuerySet[models.Order]
+    """
+    lookup: str = "startswith" if prefix else "exact"
+    filters: dict[str, str] = {}
+    if bol_number:
+        filters[f"bol_number__{lookup}"] = bol_number
+    if consignee_ref_num:
+        filters[f"consignee_ref_num__{lookup}"] = consignee_ref_num
+    if customer_id:
+        filters["customer__customer_id"] = customer_id
+    if not filters:
+        return models.Order.objects.none()
+    if status:
+        filters["status"] = status
+
+    return models.Order.objects.filter(
+        organization_id=organization_id, **filters
+    ).select_related("customer")[: max(1, min(limit, MAX_LOOKUP_LIMIT))]
+
+
+def find_duplicate_order(
+    organization_id: int, bol_number: str, exclude_pk: int | None = None
+) -> str | None:
+    """
+    Find an open order that already has a BOL number.
+
+    The check is one probe of the organization and BOL number index.
+
+    :param organization_id: Organization of the order
+    :type organization_id: int
+    :param bol_number: BOL number of the new order
+    :type bol_number: str
+    :param exclude_pk: Primary key of the order being checked, if it exists
+    :type exclude_pk: int | None
+    :return: Order ID of the open order, None if there is none
+    :rtype: str | None
+    """
+    orders: QuerySet[models.Order] = models.Order.objects.filter(
+        organization_id=organization_id,
+        bol_number=bol_number,
+        status__in=OPEN_STATUSES,
+    )
+    if exclude_pk is not None:
+        orders = orders.exclude(pk=exclude_pk)
+    # Unordered, first() would sort by the primary key.
+    return next(iter(orders.order_by().values_list("order_id", flat=True)[:1]), None)
+
+
+def find_duplicate_orders(
+    organization_id: int, bol_numbers: Iterable[str]
+) -> dict[str, str]:
+    """
+    Find the open orders that already have any of several BOL numbers, with one query.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param bol_numbers: BOL numbers of the new orders
+    :type bol_numbers: Iterable[str]
+    :return: Order ID of an open order, keyed by BOL number
+    :rtype: dict[str, str]
+    """
+    bol_numbers = {bol_number for bol_number in bol_numbers if bol_number}
+    if not bol_numbers:
+        return {}
+    return dict(
+        models.Order.objects.filter(
+            organization_id=organization_id,
+            bol_number__in=bol_numbers,
+            status__in=OPEN_STATUSES,
+        )
+        .order_by()
+        .values_list("bol_number", "order_id")
+    )
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, Prefetch, QuerySet
+from django.utils.http import parse_etags
+
+from monta_order import models
+
+PAGE_LIMIT: int = 100
+MAX_PAGE_LIMIT: int = 1000
+
+# API field names mapped to the model fields they are read from.
+ORDER_FIELDS: dict[str, str] = {
+    "id": "id",
+    "order_id": "order_id",
+    "status": "status",
+    "customer_id": "customer__customer_id",
+    "order_type_id": "order_type__order_type_id",
+    "commodity_id": "commodity__commodity_id",
+    "equipment_type_id": "equipment_type__equip_type_id",
+    "origin_location_id": "origin_location__location_id",
+    "origin_address": "origin_address",
+    "origin_appointment_time": "origin_appointment_time",
+    "destination_location_id": "destination_location__location_id",
+    "destination_address": "destination_address",
+    "destination_appointment_time": "destination_appointment_time",
+    "pieces": "pieces",
+    "weight": "weight",
+    "stop_count": "stop_count",
+    "mileage": "mileage",
+    "rate_method": "rate_method",
+    "freight_charge_amount": "freight_charge_amount",
+    "other_charge_amount": "other_charge_amount",
+    "sub_total": "sub_total",
+    "bol_number": "bol_number",
+    "consignee_ref_num": "consignee_ref_num",
+    "ready_to_bill": "ready_to_bill",
+    "billed": "billed",
+    "created": "created",
+    "modified": "modified",
+}
+DEFAULT_ORDER_FIELDS: tuple[str, ...] = (
+    "id",
+    "order_id",
+    "status",
+    "customer_id",
+    "origin_location_id",
+    "origin_appointment_time",
+    "destination_location_id",
+    "destination_appointment_time",
+    "modified",
+)
+MOVEMENT_FIELDS: dict[str, str] = {
+    "id": "id",
+    "status": "status",
+    "assigned_driver_id": "assigned_driver__driver_id",
+    "equipment_id": "equipment__equip_id",
+    "modified": "modified",
+}
+STOP_FIELDS: dict[str, str] = {
+    "id": "id",
+    "sequence": "sequence",
+    "stop_type": "stop_type",
+    "status": "status",
+    "location_id": "location__location_id",
+    "address_line": "address_line",
+    "appointment_time": "appointment_time",
+    "arrival_time": "arrival_time",
+    "departure_time": "departure_time",
+    "pieces": "pieces",
+    "weight": "weight",
+    "modified": "modified",
+}
+
+
+@dataclass
+class OrderPage:
+    """
+    Serialized orders with the cursor of the next page and their ETag.
+    """
+
+    results: list[dict[str, Any]] = field(default_factory=list)
+    next_cursor: int | None = None
+    etag: str = ""
+
+
+def parse_fields(value: str | None) -> list[str]:
+    """
+    Parse a comma separated list of order fields.
+
+    :param value: Field names, the default fields if empty
+    :type value: str | None
+    :return: Field names in the order given
+    :rtype: list[str]
+    :raises ValueError: If a field name is unknown
+    """
+    if not value:
+        return list(DEFAULT_ORDER_FIELDS)
+    fields: list[str] = list(
+        dict.fromkeys(name.strip() for name in value.split(",") if name.strip())
+    )
+    unknown: list[str] = [name for name in fields if name not in ORDER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _select(
+    queryset: QuerySet[Model], paths: list[str], *always: str
+) -> QuerySet[Model]:
+    """
+    Load only the columns behind the given paths, joining the related models they read.
+    """
+    related: set[str] = {path.split("__")[0] for path in paths if "__" in path}
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*always, *related, *paths)
+
+
+def _read(instance: Model, path: str) -> Any:
+    """
+    Follow a field path on an instance, None once a relation is empty.
+    """
+    value: Any = instance
+    for name in path.split("__"):
+        if value is None:
+            return None
+        value = getattr(value, name)
+    return value
+
+
+def get_order_queryset(
+    organization_id: int, fields: list[str], include_movements: bool = False
+) -> QuerySet[models.Order]:
+    """
+    Orders of an organization loading only what the requested fields need.
+
+    Movements and their stops are loaded with one prefetch_related, their
+    related models are joined.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param fields: Order fields to load
+    :type fields: list[str]
+    :param include_movements: Load the movements and stops of the orders
+    :type include_movements: bool
+    :return: Queryset of orders
+    :rtype: QuerySet[models.Order]
+    """
+    queryset: QuerySet[models.Order] = _select(
+        models.Order.objects.filter(organization_id=organization_id),
+        [ORDER_FIELDS[name] for name in fields],
+        "id",
+        "modified",
+    )
+    if include_movements:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "movements",
+                queryset=_select(
+                    models.Movement.objects.order_by("id"),
+                    list(MOVEMENT_FIELDS.values()),
+                    "order",
+                ).prefetch_related(
+                    Prefetch(
+                        "stops",
+                        queryset=_select(
+                            models.Stop.objects.order_by("sequence", "id"),
+                            list(STOP_FIELDS.values()),
+                            "movement",
+                        ),
+                    )
+                ),
+            )
+        )
+    return queryset
+
+
+def serialize_order(
+    order: models.Order, fields: list[str], include_movements: bool = False
+) -> dict[str, Any]:
+    """
+    Serialize the requested fields of an order.
+
+    :param order: Order loaded by get_order_queryset
+    :type order: models.Order
+    :param fields: Order fields to serialize
+    :type fields: list[str]
+    :param include_movements: Serialize the movements and stops of the order
+    :type include_movements: bool
+    :return: Serialized order
+    :rtype: dict[str, Any]
+    """
+    data: dict[str, Any] = {name: _read(order, ORDER_FIELDS[name]) for name in fields}
+    if include_movements:
+        data["movements"] = [
+            {
+                **{
+                    name: _read(movement, path)
+                    for name, path in MOVEMENT_FIELDS.items()
+                },
+                "stops": [
+                    {name: _read(stop, path) for name, path in STOP_FIELDS.items()}
+                    for stop in movement.stops.all()
+                ],
+            }
+            for movement in order.movements.all()
+        ]
+    return data
+
+
+def get_etag(data: Any) -> str:
+    """
+    ETag of a serialized response, a hash of the payload itself.
+
+    Hashing the payload instead of modified times catches writes that do
+    not touch modified, like the stop totals trigger and sequence shifts.
+
+    :param data: Serialized response
+    :type data: Any
+    :return: Quoted ETag
+    :rtype: str
+    """
+    content: str = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return f'"{hashlib.md5(content.encode()).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag.
+
+    :param if_none_match: Value of the If-None-Match header
+    :type if_none_match: str | None
+    :param etag: Quoted ETag of the response
+    :type etag: str
+    :return: True if the client already has the response
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+    etags: list[str] = parse_etags(if_none_match)
+    return "*" in etags or etag in etags
+
+
+def get_order_page(
+    organization_id: int,
+    *,
+    fields: list[str],
+    cursor: int | None = None,
+    limit: int = PAGE_LIMIT,
+    include_movements: bool = False,
+) -> OrderPage:
+    """
+    Get a page of orders after a cursor.
+
+    Pages are ordered by id and the cursor is the id of the last order of
+    the previous page, so the organization and id index finds every page in
+    the same time no matter how deep it is.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param fields: Order fields to serialize
+    :type fields: list[str]
+    :param cursor: Id of the last order of the previous page
+    :type cursor: int | None
+    :param limit: Orders per page, capped at MAX_PAGE_LIMIT
+    :type limit: int
+    :param include_movements: Serialize the movements and stops of the orders
+    :type include_movements: bool
+    :return: Page of orders
+    :rtype: OrderPage
+    """
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+    queryset: QuerySet[models.Order] = get_order_queryset(
+        organization_id, fields, include_movements
+    ).order_by("id")
+    if cursor is not None:
+        queryset = queryset.filter(id__gt=cursor)
+
+    orders: list[models.Order] = list(queryset[: limit + 1])
+    next_cursor: int | None = orders[limit - 1].pk if len(orders) > limit else None
+    results: list[dict[str, Any]] = [
+        serialize_order(order, fields, include_movements) for order in orders[:limit]
+    ]
+    return OrderPage(
+        results=results,
+        next_cursor=next_cursor,
+        etag=get_etag({"results": results, "next_cursor": next_cursor}),
+    )
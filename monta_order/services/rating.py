@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import itertools
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import generations
+from monta_order import models
+
+RERATE_BATCH_SIZE: int = 2000
+CENT: Decimal = Decimal("0.01")
+ZERO: Decimal = Decimal("0.00")
+
+# Bracket the rate of each rating method is looked up in.
+BREAK_TYPES: dict[str, str] = {
+    models.RateMethodChoices.FLAT: models.RateBreakChoices.WEIGHT,
+    models.RateMethodChoices.POUNDS: models.RateBreakChoices.WEIGHT,
+    models.RateMethodChoices.PER_MILE: models.RateBreakChoices.MILEAGE,
+}
+
+# Order columns rating reads, in the order rate_orders expects them.
+RATING_FIELDS: tuple[str, ...] = (
+    "customer_id",
+    "origin_location_id",
+    "destination_location_id",
+    "equipment_type_id",
+    "origin_appointment_time",
+    "rate_method",
+    "freight_charge_amount",
+    "other_charge_amount",
+    "mileage",
+    "weight",
+    "stop_count",
+)
+
+# Match keys of a table, (customer, origin, destination, equipment type), with
+# None matching any order. Most specific first: the customer outranks the
+# lane, which outranks the equipment type.
+_SPECIFICITY: list[tuple[bool, bool, bool, bool]] = sorted(
+    (
+        (customer, lane, lane, equipment)
+        for customer, lane, equipment in itertools.product((True, False), repeat=3)
+    ),
+    key=lambda key: (-4 * key[0] - 2 * key[1] - key[3]),
+)
+
+
+@dataclass
+class CompiledRateTable:
+    """
+    A rate table with its breaks as sorted arrays for binary search.
+    """
+
+    id: int
+    rate_method: str
+    rate: Decimal
+    minimum_charge: Decimal
+    effective_date: date
+    expiration_date: date | None
+    minimums: dict[str, list[Decimal]] = field(default_factory=dict)
+    rates: dict[str, list[Decimal]] = field(default_factory=dict)
+
+    def get_rate(self, break_type: str | None, value: Decimal) -> Decimal:
+        """
+        Get the rate of the highest bracket the value reaches.
+
+        :param break_type: Bracket to look in, None for the table rate
+        :type break_type: str | None
+        :param value: Weight or mileage of the order
+        :type value: Decimal
+        :return: Rate of the bracket, the table rate below the lowest one
+        :rtype: Decimal
+        """
+        minimums: list[Decimal] = self.minimums.get(break_type, [])
+        index: int = bisect_right(minimums, value) - 1
+        return self.rates[break_type][index] if index >= 0 else self.rate
+
+
+class RateTables:
+    """
+    The rate tables of an organization, indexed by their match key.
+
+    Versions of a table with the same match key are kept sorted by effective
+    date, so finding the table of an order is a handful of dictionary
+    lookups and a binary search.
+    """
+
+    def __init__(self, tables: Iterable[tuple[tuple, CompiledRateTable]]) -> None:
+        """
+        :param tables: Match keys and their tables
+        :type tables: Iterable[tuple[tuple, CompiledRateTable]]
+        """
+        by_key: defaultdict[tuple, list[CompiledRateTable]] = defaultdict(list)
+        for key, table in tables:
+            by_key[key].append(table)
+        self._tables: dict[tuple, list[CompiledRateTable]] = {}
+        self._dates: dict[tuple, list[date]] = {}
+        for key, versions in by_key.items():
+            versions.sort(key=lambda table: table.effective_date)
+            self._tables[key] = versions
+            self._dates[key] = [table.effective_date for table in versions]
+
+    def __len__(self) -> int:
+        return sum(len(versions) for versions in self._tables.values())
+
+    def find(
+        self,
+        customer_id: int | None,
+        origin_location_id: int | None,
+        destination_location_id: int | None,
+        equipment_type_id: int | None,
+        on: date,
+    ) -> CompiledRateTable | None:
+        """
+        Find the most specific table matching an order on a date.
+
+        :param customer_id: Customer of the order
+        :type customer_id: int | None
+        :param origin_location_id: Origin of the order
+        :type origin_location_id: int | None
+        :param destination_location_id: Destination of the order
+        :type destination_location_id: int | None
+        :param equipment_type_id: Equipment type of the order
+        :type equipment_type_id: int | None
+        :param on: Date the table must be in effect on
+        :type on: date
+        :return: Rate table, None if no table matches
+        :rtype: CompiledRateTable | None
+        """
+        values: tuple = (
+            customer_id,
+            origin_location_id,
+            destination_location_id,
+            equipment_type_id,
+        )
+        for specific in _SPECIFICITY:
+            key: tuple = tuple(
+                value if keep else None for value, keep in zip(values, specific)
+            )
+            dates: list[date] | None = self._dates.get(key)
+            if dates is None:
+                continue
+            index: int = bisect_right(dates, on) - 1
+            if index < 0:
+                continue
+            table: CompiledRateTable = self._tables[key][index]
+            if table.expiration_date is None or table.expiration_date >= on:
+                return table
+        return None
+
+
+def load_rate_tables(
+    organization_id: int, customer_ids: Iterable[int] | None = None
+) -> RateTables:
+    """
+    Load the active rate tables of an organization with their breaks, in two queries.
+
+    :param organization_id: Organization of the tables
+    :type organization_id: int
+    :param customer_ids: Only load the tables of these customers and those of every customer
+    :type customer_ids: Iterable[int] | None
+    :return: Rate tables
+    :rtype: RateTables
+    """
+    tables = models.RateTable.objects.filter(
+        organization_id=organization_id, is_active=True
+    )
+    if customer_ids is not None:
+        tables = tables.filter(
+            Q(customer_id__in=set(customer_ids)) | Q(customer__isnull=True)
+        )
+
+    compiled: dict[int, tuple[tuple, CompiledRateTable]] = {
+        row[0]: (
+            row[1:5],
+            CompiledRateTable(
+                id=row[0],
+                rate_method=row[5],
+                rate=row[6],
+                minimum_charge=row[7],
+                effective_date=row[8],
+                expiration_date=row[9],
+            ),
+        )
+        for row in tables.order_by().values_list(
+            "id",
+            "customer_id",
+            "origin_location_id",
+            "destination_location_id",
+            "equipment_type_id",
+            "rate_method",
+            "rate",
+            "minimum_charge",
+            "effective_date",
+            "expiration_date",
+        )
+    }
+    for table_id, break_type, minimum, rate in (
+        models.RateBreak.objects.filter(rate_table_id__in=compiled)
+        .order_by("rate_table_id", "break_type", "minimum")
+        .values_list("rate_table_id", "break_type", "minimum", "rate")
+    ):
+        table: CompiledRateTable = compiled[table_id][1]
+        table.minimums.setdefault(break_type, []).append(minimum)
+        table.rates.setdefault(break_type, []).append(rate)
+    return RateTables(compiled.values())
+
+
+def get_quantity(
+    rate_method: str,
+    mileage: Decimal | None,
+    weight: int | None,
+    stop_count: int | None,
+) -> Decimal:
+    """
+    Units of an order the rate is multiplied by.
+    """
+    if rate_method == models.RateMethodChoices.PER_MILE:
+        return mileage or ZERO
+    if rate_method == models.RateMethodChoices.POUNDS:
+        return Decimal(weight or 0)
+    if rate_method == models.RateMethodChoices.PER_STOP:
+        return Decimal(stop_count or 0)
+    return Decimal(1)
+
+
+def rate_orders(tables: RateTables, rows: list[tuple[Any, ...]]) -> list[Decimal]:
+    """
+    Compute the sub total of many orders in memory.
+
+    The freight charge of an order comes from its rate table: the rate, or
+    the rate of the weight or mileage bracket the order reaches, times the
+    units of the rating method, but at least the minimum charge. An order
+    without a table is charged its freight charge amount per unit of its own
+    rating method. Other charges are added and the total is rounded to cents.
+
+    :param tables: Rate tables of the organization
+    :type tables: RateTables
+    :param rows: Values of RATING_FIELDS of every order
+    :type rows: list[tuple[Any, ...]]
+    :return: Sub total of every order, in the order given
+    :rtype: list[Decimal]
+    """
+    today: date = timezone.localdate()
+    sub_totals: list[Decimal] = []
+    for (
+        customer_id,
+        origin_location_id,
+        destination_location_id,
+        equipment_type_id,
+        appointment_time,
+        rate_method,
+        freight_charge_amount,
+        other_charge_amount,
+        mileage,
+        weight,
+        stop_count,
+    ) in rows:
+        on: date = (
+            timezone.localdate(appointment_time)
+            if isinstance(appointment_time, datetime)
+            else today
+        )
+        table: CompiledRateTable | None = tables.find(
+            customer_id,
+            origin_location_id,
+            destination_location_id,
+            equipment_type_id,
+            on,
+        )
+        if table is None:
+            freight: Decimal = (freight_charge_amount or ZERO) * get_quantity(
+                rate_method, mileage, weight, stop_count
+            )
+        else:
+            break_type: str | None = BREAK_TYPES.get(table.rate_method)
+            measure: Decimal = (
+                mileage or ZERO
+                if break_type == models.RateBreakChoices.MILEAGE
+                else Decimal(weight or 0)
+            )
+            freight = max(
+                table.get_rate(break_type, measure)
+                * get_quantity(table.rate_method, mileage, weight, stop_count),
+                table.minimum_charge,
+            )
+        sub_totals.append(
+            (freight + (other_charge_amount or ZERO)).quantize(CENT, ROUND_HALF_UP)
+        )
+    return sub_totals
+
+
+def rate_order(order: models.Order) -> Decimal:
+    """
+    Compute the sub total of one order.
+
+    :param order: Order to rate
+    :type order: models.Order
+    :return: Sub total of the order
+    :rtype: Decimal
+    """
+    tables: RateTables = load_rate_tables(
+        order.organization_id, customer_ids=[order.customer_id]
+    )
+    return rate_orders(tables, [tuple(getattr(order, name) for name in RATING_FIELDS)])[
+        0
+    ]
+
+
+def rerate_orders(
+    organization_id: int,
+    *,
+    start: date | None = None,
+    end: date | None = None,
+    customer_ids: Iterable[int] | None = None,
+    order_ids: Iterable[int] | None = None,
+    batch_size: int = RERATE_BATCH_SIZE,
+) -> int:
+    """
+    Recompute the sub total of an organization's unbilled orders after a rate change.
+
+    The rate tables are loaded once. Orders are read in primary key batches
+    of only the columns rating needs, rated in memory, and the orders whose
+    sub total changed are written with one bulk_update per batch. Billed
+    orders keep the total they were invoiced for.
+
+    :param organization_id: Organization of the orders
+    :type organization_id: int
+    :param start: First origin appointment date to re-rate
+    :type start: date | None
+    :param end: Last origin appointment date to re-rate
+    :type end: date | None
+    :param customer_ids: Only re-rate the orders of these customers
+    :type customer_ids: Iterable[int] | None
+    :param order_ids: Only re-rate these orders
+    :type order_ids: Iterable[int] | None
+    :param batch_size: Orders rated per batch
+    :type batch_size: int
+    :return: Number of orders whose sub total changed
+    :rtype: int
+    """
+    if customer_ids is not None:
+        customer_ids = set(customer_ids)
+    tables: RateTables = load_rate_tables(organization_id, customer_ids)
+    orders = models.Order.objects.filter(
+        organization_id=organization_id, billed=False
+    ).order_by("pk")
+    if start is not None:
+        orders = orders.filter(origin_appointment_time__date__gte=start)
+    if end is not None:
+        orders = orders.filter(origin_appointment_time__date__lte=end)
+    if customer_ids is not None:
+        orders = orders.filter(customer_id__in=customer_ids)
+    if order_ids is not None:
+        orders = orders.filter(pk__in=set(order_ids))
+
+    changed: int = 0
+    last_pk: int = 0
+    while True:
+        rows: list[tuple[Any, ...]] = list(
+            orders.filter(pk__gt=last_pk).values_list(
+                "pk", "sub_total", *RATING_FIELDS
+            )[:batch_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+
+        now: datetime = timezone.now()
+        updated: list[models.Order] = [
+            models.Order(pk=row[0], sub_total=sub_total, modified=now)
+            for row, sub_total in zip(
+                rows, rate_orders(tables, [row[2:] for row in rows])
+            )
+            if row[1] != sub_total
+        ]
+        if updated:
+            with transaction.atomic():
+                models.Order.objects.bulk_update(updated, ["sub_total", "modified"])
+                generations.bump_generations([organization_id], generations.ORDERS)
+            changed += len(updated)
+        if len(rows) < batch_size:
+            break
+    return changed
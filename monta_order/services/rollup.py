@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+from collections.abc import Iterable
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core import generations
+
+_pending = threading.local()
+
+
+def _get_pending() -> tuple[set[int], set[int]]:
+    """
+    Movement and order ids waiting for a roll-up in this thread.
+    """
+    if not hasattr(_pending, "movements"):
+        _pending.movements = set()
+        _pending.orders = set()
+    return _pending.movements, _pending.orders
+
+
+def schedule_movements(movement_ids: Iterable[int]) -> None:
+    """
+    Roll the stop statuses of movements up to the movements and their orders
+    once the current transaction commits.
+
+    Every stop saved in a transaction adds its movement to a set, so the
+    roll-up runs a fixed number of queries per transaction however many stops
+    changed. Outside a transaction it runs immediately.
+
+    :param movement_ids: Movements whose stops changed
+    :type movement_ids: Iterable[int]
+    :return: None
+    :rtype: None
+    """
+    _get_pending()[0].update(movement_ids)
+    transaction.on_commit(flush)
+
+
+def schedule_orders(order_ids: Iterable[int]) -> None:
+    """
+    Roll the movement statuses of orders up to the orders once the current
+    transaction commits.
+
+    :param order_ids: Orders whose movements changed
+    :type order_ids: Iterable[int]
+    :return: None
+    :rtype: None
+    """
+    _get_pending()[1].update(order_ids)
+    transaction.on_commit(flush)
+
+
+def flush() -> None:
+    """
+    Apply every scheduled roll-up with bulk updates.
+
+    Statuses are derived from the current rows, so running a roll-up twice or
+    for an id whose transaction rolled back is harmless. Roll-ups only move
+    statuses forward: a movement or order is in progress once any of its
+    children is in progress or completed, and completed once all of them are.
+
+    :return: None
+    :rtype: None
+    """
+    # Imported here because the models schedule roll-ups from save().
+    from monta_order.models import Movement, Order, StatusChoices, Stop
+
+    movement_ids, order_ids = _get_pending()
+    if not movement_ids and not order_ids:
+        return
+    movement_ids, _pending.movements = set(movement_ids), set()
+    order_ids, _pending.orders = set(order_ids), set()
+    now = timezone.now()
+
+    if movement_ids:
+        stop_counts = (
+            Stop.objects.filter(movement_id__in=movement_ids)
+            .values("movement_id")
+            .annotate(
+                total=Count("id"),
+                completed=Count("id", filter=Q(status=StatusChoices.COMPLETED)),
+                started=Count(
+                    "id",
+                    filter=Q(
+                        status__in=(StatusChoices.IN_PROGRESS, StatusChoices.COMPLETED)
+                    ),
+                ),
+            )
+        )
+        completed: list[int] = []
+        started: list[int] = []
+        for row in stop_counts:
+            if row["completed"] == row["total"]:
+                completed.append(row["movement_id"])
+            elif row["started"]:
+                started.append(row["movement_id"])
+        Movement.objects.filter(pk__in=completed).exclude(
+            status=StatusChoices.COMPLETED
+        ).update(status=StatusChoices.COMPLETED, modified=now)
+        Movement.objects.filter(pk__in=started, status=StatusChoices.AVAILABLE).update(
+            status=StatusChoices.IN_PROGRESS, modified=now
+        )
+        order_ids.update(
+            Movement.objects.filter(pk__in=movement_ids).values_list(
+                "order_id", flat=True
+            )
+        )
+
+    movement_counts = (
+        Movement.objects.filter(order_id__in=order_ids)
+        .values("order_id")
+        .annotate(
+            total=Count("id"),
+            completed=Count("id", filter=Q(status=StatusChoices.COMPLETED)),
+            started=Count(
+                "id",
+                filter=Q(
+                    status__in=(StatusChoices.IN_PROGRESS, StatusChoices.COMPLETED)
+                ),
+            ),
+        )
+    )
+    completed = []
+    started = []
+    for row in movement_counts:
+        if row["completed"] == row["total"]:
+            completed.append(row["order_id"])
+        elif row["started"]:
+            started.append(row["order_id"])
+    changed: int = (
+        Order.objects.filter(pk__in=completed)
+        .exclude(status__in=(StatusChoices.COMPLETED, StatusChoices.CANCELLED))
+        .update(status=StatusChoices.COMPLETED, modified=now)
+    )
+    changed += Order.objects.filter(
+        pk__in=started, status=StatusChoices.AVAILABLE
+    ).update(status=StatusChoices.IN_PROGRESS, modified=now)
+    if changed:
+        generations.bump_generations(
+            Order.objects.filter(pk__in=order_ids)
+            .order_by()
+            .values_list("organization_id", flat=True)
+            .distinct(),
+            generations.ORDERS,
+        )
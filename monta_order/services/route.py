@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable
+from decimal import Decimal
+
+from django.utils import timezone
+
+from core import generations
+from monta_order.models import Order
+from monta_routes.services import distance
+
+
+def precompute_order_mileage(
+    orders: Iterable[Order], provider: distance.DistanceProvider | None = None
+) -> int:
+    """
+    Fill in the mileage of every order that has none.
+
+    The location pairs of all orders are resolved together per organization
+    with distance.get_route_distances, so a batch of orders costs one Route
+    query and as few matrix requests as the provider allows, instead of one
+    lookup per order. The orders need their organization, origin_location and
+    destination_location loaded.
+
+    :param orders: Orders to update
+    :type orders: Iterable[Order]
+    :param provider: Provider for missing routes, defaults to the organization's
+    :type provider: distance.DistanceProvider | None
+    :return: Number of orders updated
+    :rtype: int
+    """
+    orders_by_organization: defaultdict[int, list[Order]] = defaultdict(list)
+    for order in orders:
+        if order.mileage is None:
+            orders_by_organization[order.organization_id].append(order)
+
+    updated: list[Order] = []
+    now = timezone.now()
+    for organization_orders in orders_by_organization.values():
+        distances: dict[tuple[str, str], Decimal] = distance.get_route_distances(
+            organization_orders[0].organization,
+            [
+                (order.origin_location, order.destination_location)
+                for order in organization_orders
+            ],
+            provider,
+        )
+        for order in organization_orders:
+            mileage: Decimal | None = distances.get(
+                (
+                    order.origin_location.location_id,
+                    order.destination_location.location_id,
+                )
+            )
+            if mileage is not None:
+                order.mileage = mileage
+                order.modified = now
+                updated.append(order)
+
+    Order.objects.bulk_update(updated, ["mileage", "modified"], batch_size=1000)
+    generations.bump_generations(
+        {order.organization_id for order in updated}, generations.ORDERS
+    )
+    return len(updated)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+from collections.abc import Iterable
+from datetime import datetime
+from typing import NamedTuple
+
+from django.db.models import F
+from django.utils import timezone
+
+from monta_order import models
+
+# Other processes only see a changed default delay code once their entry expires.
+DELAY_CODE_CACHE_TIMEOUT: int = 60 * 5
+
+
+class DefaultDelayCode(NamedTuple):
+    """
+    The parts of an organization's default delay code an incident needs.
+    """
+
+    id: int
+    description: str | None
+
+
+class DelayCodeCache:
+    """
+    Thread safe cache of the default delay code of each organization.
+
+    Organizations without a default delay code are cached as well, so a late
+    stop never costs more than one lookup per organization and timeout.
+    """
+
+    def __init__(self, timeout: int = DELAY_CODE_CACHE_TIMEOUT) -> None:
+        """
+        :param timeout: Seconds an entry is kept
+        :type timeout: int
+        """
+        self.timeout: int = timeout
+        self._lock: threading.Lock = threading.Lock()
+        self._codes: dict[int, tuple[float, DefaultDelayCode | None]] = {}
+
+    def get(self, organization_id: int) -> DefaultDelayCode | None:
+        """
+        Get the default delay code of an organization, loading it on a miss.
+
+        :param organization_id: Id of the organization
+        :type organization_id: int
+        :return: Default delay code or None if the organization has none
+        :rtype: DefaultDelayCode | None
+        """
+        with self._lock:
+            entry = self._codes.get(organization_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        row: tuple[int, str | None] | None = (
+            models.DelayCode.objects.filter(
+                organization_id=organization_id, is_default=True
+            )
+            .values_list("id", "description")
+            .first()
+        )
+        code: DefaultDelayCode | None = DefaultDelayCode(*row) if row else None
+        with self._lock:
+            self._codes[organization_id] = (time.monotonic() + self.timeout, code)
+        return code
+
+    def invalidate(self, organization_id: int) -> None:
+        """
+        Remove the entry of an organization.
+
+        :param organization_id: Id of the organization
+        :type organization_id: int
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self._codes.pop(organization_id, None)
+
+    def clear(self) -> None:
+        """
+        Remove every entry.
+
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self._codes.clear()
+
+
+delay_code_cache: DelayCodeCache = DelayCodeCache()
+
+
+def record_service_incidents(organization_id: int, stops: Iterable[models.Stop]) -> int:
+    """
+    Create or update the service incident of every late stop with one query.
+
+    A stop is late when it arrived after its appointment time. Each stop has
+    at most one incident, so recording a stop again only updates its delay
+    time and keeps the delay code and reason a user may have changed. The
+    incidents of stops that are no longer late, because their arrival or
+    appointment time was corrected, are deleted with one more query. Nothing
+    is recorded when the organization has no default delay code.
+
+    :param organization_id: Organization of the stops
+    :type organization_id: int
+    :param stops: Saved stops to check
+    :type stops: Iterable[models.Stop]
+    :return: Number of late stops recorded
+    :rtype: int
+    """
+    late_stops: list[models.Stop] = []
+    on_time_stop_ids: list[int] = []
+    for stop in stops:
+        if stop.arrival_time and stop.arrival_time > stop.appointment_time:
+            late_stops.append(stop)
+        else:
+            on_time_stop_ids.append(stop.pk)
+    if on_time_stop_ids:
+        models.ServiceIncident.objects.filter(stop_id__in=on_time_stop_ids).delete()
+    if not late_stops:
+        return 0
+    delay_code: DefaultDelayCode | None = delay_code_cache.get(organization_id)
+    if delay_code is None:
+        return 0
+
+    now: datetime = timezone.now()
+    models.ServiceIncident.objects.bulk_create(
+        [
+            models.ServiceIncident(
+                organization_id=organization_id,
+                movement_id=stop.movement_id,
+                stop_id=stop.pk,
+                delay_code_id=delay_code.id,
+                delay_reason=delay_code.description,
+                delay_time=stop.arrival_time - stop.appointment_time,
+                created=now,
+                modified=now,
+            )
+            for stop in late_stops
+        ],
+        update_conflicts=True,
+        # Django 4.1 writes these names into ON CONFLICT as they are, so name the column.
+        unique_fields=["stop_id"],
+        update_fields=["delay_time", "modified"],
+    )
+    return len(late_stops)
+
+
+def generate_service_incidents(
+    organization_id: int, start: datetime, end: datetime
+) -> int:
+    """
+    Create the missing service incidents of late stops completed in a time window.
+
+    The late stops without an incident are found with one query and their
+    incidents are created with one bulk_create. Running it again for the same
+    window creates nothing.
+
+    :param organization_id: Organization to scan
+    :type organization_id: int
+    :param start: Start of the window, compared to the stop departure time
+    :type start: datetime
+    :param end: End of the window, exclusive
+    :type end: datetime
+    :return: Number of incidents created
+    :rtype: int
+    """
+    delay_code: DefaultDelayCode | None = delay_code_cache.get(organization_id)
+    if delay_code is None:
+        return 0
+
+    stops: list[tuple[int, int, datetime, datetime]] = list(
+        models.Stop.objects.filter(
+            organization_id=organization_id,
+            status=models.StatusChoices.COMPLETED,
+            departure_time__gte=start,
+            departure_time__lt=end,
+            arrival_time__gt=F("appointment_time"),
+            service_incident__isnull=True,
+        ).values_list("id", "movement_id", "arrival_time", "appointment_time")
+    )
+    now: datetime = timezone.now()
+    created: list[models.ServiceIncident] = models.ServiceIncident.objects.bulk_create(
+        [
+            models.ServiceIncident(
+                organization_id=organization_id,
+                movement_id=movement_id,
+                stop_id=stop_id,
+                delay_code_id=delay_code.id,
+                delay_reason=delay_code.description,
+                delay_time=arrival_time - appointment_time,
+                created=now,
+                modified=now,
+            )
+            for stop_id, movement_id, arrival_time, appointment_time in stops
+        ],
+        ignore_conflicts=True,
+    )
+    return len(created)
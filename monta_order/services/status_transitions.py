@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from core import generations
+from monta_order import models
+from monta_order.services import rollup, service_incidents, stop_chain
+
+# Statuses each status may change to, staying in the same status is always allowed.
+STATUS_TRANSITIONS: dict[str, frozenset[str]] = {
+    models.StatusChoices.AVAILABLE: frozenset(
+        {
+            models.StatusChoices.IN_PROGRESS,
+            models.StatusChoices.COMPLETED,
+            models.StatusChoices.CANCELLED,
+        }
+    ),
+    models.StatusChoices.IN_PROGRESS: frozenset(
+        {models.StatusChoices.COMPLETED, models.StatusChoices.CANCELLED}
+    ),
+    models.StatusChoices.COMPLETED: frozenset(),
+    models.StatusChoices.CANCELLED: frozenset({models.StatusChoices.AVAILABLE}),
+}
+
+MODELS: tuple[str, ...] = ("order", "movement", "stop")
+
+
+@dataclass
+class TransitionResult:
+    """
+    Outcome of one requested transition.
+    """
+
+    model: str
+    id: int
+    status: str | None = None
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def applied(self) -> bool:
+        """
+        :return: True if the transition was applied
+        :rtype: bool
+        """
+        return not self.errors
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Serialize the result for an API response.
+
+        :return: Dictionary of the result
+        :rtype: dict[str, Any]
+        """
+        return {
+            "model": self.model,
+            "id": self.id,
+            "status": self.status,
+            "applied": self.applied,
+            "errors": self.errors,
+        }
+
+
+def check_transition(current: str, new: str) -> str | None:
+    """
+    Check a status change against the state machine table.
+
+    :param current: Stored status
+    :type current: str
+    :param new: Requested status
+    :type new: str
+    :return: Error message, None if the change is allowed
+    :rtype: str | None
+    """
+    if new == current or new in STATUS_TRANSITIONS.get(current, ()):
+        return None
+    return _("Status cannot be changed from %(current)s to %(new)s") % {
+        "current": current,
+        "new": new,
+    }
+
+
+def _check_stops(
+    items: list[tuple[dict[str, Any], TransitionResult]],
+    movements: dict[int, models.Movement],
+    stops: dict[int, models.Stop],
+) -> list[models.Stop]:
+    """
+    Check stop transitions movement by movement, returning the stops to write.
+
+    A movement's stop chain is validated with all of its requested changes
+    applied, so if any stop of a movement fails, none of its stops change.
+    """
+    chains: dict[int, dict[int, stop_chain.ChainStop]] = defaultdict(dict)
+    for stop in stops.values():
+        chains[stop.movement_id][stop.pk] = stop_chain.ChainStop(
+            id=stop.pk,
+            stored_status=stop.status,
+            **{name: getattr(stop, name) for name in stop_chain.CHAIN_FIELDS},
+        )
+
+    by_movement: dict[int, list[tuple[dict[str, Any], TransitionResult]]] = defaultdict(
+        list
+    )
+    for item, result in items:
+        by_movement[stops[item["id"]].movement_id].append((item, result))
+
+    changed: list[models.Stop] = []
+    for movement_id, movement_items in by_movement.items():
+        chain: dict[int, stop_chain.ChainStop] = chains[movement_id]
+        for item, result in movement_items:
+            chain_stop: stop_chain.ChainStop = chain[item["id"]]
+            stop_chain.apply_stop_changes(
+                chain_stop,
+                {
+                    name: item[name]
+                    for name in ("arrival_time", "departure_time")
+                    if item.get(name) is not None
+                },
+            )
+            requested: str | None = item.get("status")
+            if requested and not chain_stop.arrival_time:
+                # Without times the requested status is taken as is, the way a form sets it.
+                chain_stop.status = requested
+            elif requested and requested != chain_stop.status:
+                result.errors.append(
+                    _("Stop status follows its arrival and departure times")
+                )
+            result.status = chain_stop.status
+            error: str | None = check_transition(
+                chain_stop.stored_status, chain_stop.status
+            )
+            if error:
+                result.errors.append(error)
+
+        chain_errors: dict[int, list[str]] = stop_chain.validate_stop_chain(
+            movements[movement_id], {}, chain
+        )
+        for item, result in movement_items:
+            result.errors.extend(chain_errors.get(item["id"], []))
+        if any(result.errors for _item, result in movement_items):
+            for _item, result in movement_items:
+                if not result.errors:
+                    result.errors.append(
+                        _("Not applied, another stop of the movement is invalid")
+                    )
+            continue
+
+        for item, result in movement_items:
+            stop: models.Stop = stops[item["id"]]
+            chain_stop = chain[item["id"]]
+            stop.status = chain_stop.status
+            stop.arrival_time = chain_stop.arrival_time
+            stop.departure_time = chain_stop.departure_time
+            changed.append(stop)
+    return changed
+
+
+def transition_statuses(
+    organization_id: int, items: list[dict[str, Any]]
+) -> list[TransitionResult]:
+    """
+    Change the status of many orders, movements and stops at once.
+
+    Every transition is checked in memory against STATUS_TRANSITIONS and
+    the rules of the model. Stops are checked against their whole stop
+    chain, and setting arrival and departure times derives their status the
+    way Stop.save does. Valid transitions are written with one bulk UPDATE
+    per model. Movements and orders are then rolled up once per parent, all
+    in one transaction. Invalid transitions are reported and skipped, the
+    stops of a movement are applied all together or not at all.
+
+    :param organization_id: Organization of the records
+    :type organization_id: int
+    :param items: Transitions, each with model, id, status and for stops
+        optionally arrival_time and departure_time
+    :type items: list[dict[str, Any]]
+    :return: Result of every item, in the order given
+    :rtype: list[TransitionResult]
+    """
+    results: list[TransitionResult] = [
+        TransitionResult(model=item["model"], id=item["id"]) for item in items
+    ]
+    ids: dict[str, set[int]] = {model: set() for model in MODELS}
+    for item, result in zip(items, results):
+        if item["model"] not in MODELS:
+            result.errors.append(
+                _("Unknown model %(model)s") % {"model": item["model"]}
+            )
+        elif item["id"] in ids[item["model"]]:
+            result.errors.append(_("Listed more than once"))
+        else:
+            ids[item["model"]].add(item["id"])
+
+    orders: dict[int, models.Order] = models.Order.objects.filter(
+        organization_id=organization_id
+    ).in_bulk(ids["order"])
+    movements: dict[int, models.Movement] = {
+        movement.pk: movement
+        for movement in models.Movement.objects.filter(
+            Q(pk__in=ids["movement"])
+            | Q(
+                pk__in=models.Stop.objects.filter(pk__in=ids["stop"]).values(
+                    "movement_id"
+                )
+            ),
+            organization_id=organization_id,
+        )
+    }
+    stops: dict[int, models.Stop] = {
+        stop.pk: stop
+        for stop in models.Stop.objects.filter(
+            movement_id__in=movements, organization_id=organization_id
+        )
+    }
+    loaded: dict[str, dict[int, Any]] = {
+        "order": orders,
+        "movement": movements,
+        "stop": stops,
+    }
+
+    stop_items: list[tuple[dict[str, Any], TransitionResult]] = []
+    changed_orders: list[models.Order] = []
+    changed_movements: list[models.Movement] = []
+    for item, result in zip(items, results):
+        if result.errors:
+            continue
+        record: Any = loaded[item["model"]].get(item["id"])
+        if record is None:
+            result.errors.append(_("Record not found"))
+        elif item["model"] == "stop":
+            stop_items.append((item, result))
+        elif not item.get("status"):
+            result.errors.append(_("Status is required"))
+        else:
+            result.status = item["status"]
+            error: str | None = check_transition(record.status, item["status"])
+            if error:
+                result.errors.append(error)
+            elif item["model"] == "movement":
+                if item["status"] == models.StatusChoices.IN_PROGRESS:
+                    if record.assigned_driver_id is None:
+                        result.errors.append(
+                            _(
+                                "Movement cannot be in progress without an assigned driver"
+                            )
+                        )
+                    if record.equipment_id is None:
+                        result.errors.append(
+                            _(
+                                "Movement cannot be in progress without an assigned equipment"
+                            )
+                        )
+                if not result.errors:
+                    record.status = item["status"]
+                    changed_movements.append(record)
+            else:
+                if (
+                    record.ready_to_bill
+                    and item["status"] != models.StatusChoices.COMPLETED
+                ):
+                    result.errors.append(
+                        _(
+                            "Cannot mark an order ready to bill if the order status is not complete"
+                        )
+                    )
+                else:
+                    record.status = item["status"]
+                    changed_orders.append(record)
+    changed_stops: list[models.Stop] = _check_stops(stop_items, movements, stops)
+
+    now: datetime = timezone.now()
+    for record in (*changed_orders, *changed_movements, *changed_stops):
+        record.modified = now
+    with transaction.atomic():
+        if changed_stops:
+            models.Stop.objects.bulk_update(
+                changed_stops, ["status", "arrival_time", "departure_time", "modified"]
+            )
+            service_incidents.record_service_incidents(organization_id, changed_stops)
+            rollup.schedule_movements({stop.movement_id for stop in changed_stops})
+        if changed_movements:
+            models.Movement.objects.bulk_update(
+                changed_movements, ["status", "modified"]
+            )
+            rollup.schedule_orders(
+                {movement.order_id for movement in changed_movements}
+            )
+        if changed_orders:
+            models.Order.objects.bulk_update(changed_orders, ["status", "modified"])
+        # Roll up now, so the parents change in the same transaction.
+        rollup.flush()
+        if changed_orders or changed_movements or changed_stops:
+            generations.bump_generations([organization_id], generations.ORDERS)
+    return results
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from monta_order import models
+from monta_order.services import rollup, service_incidents
+
+# Stop fields the chain rules look at and a change may set.
+CHAIN_FIELDS: tuple[str, ...] = (
+    "sequence",
+    "status",
+    "appointment_time",
+    "arrival_time",
+    "departure_time",
+)
+
+STARTED_STATUSES: tuple[str, ...] = (
+    models.StatusChoices.IN_PROGRESS,
+    models.StatusChoices.COMPLETED,
+)
+
+
+@dataclass
+class ChainStop:
+    """
+    A stop of a movement with any proposed change applied.
+    """
+
+    id: int
+    sequence: int | None
+    status: str
+    appointment_time: datetime
+    arrival_time: datetime | None
+    departure_time: datetime | None
+    stored_status: str
+    changed: bool = False
+
+
+def load_stop_chain(movement: models.Movement) -> dict[int, ChainStop]:
+    """
+    Load every stop of the movement with one query.
+
+    :param movement: Movement to load the stops of
+    :type movement: models.Movement
+    :return: Stops keyed by id
+    :rtype: dict[int, ChainStop]
+    """
+    return {
+        row["id"]: ChainStop(stored_status=row["status"], **row)
+        for row in models.Stop.objects.filter(movement_id=movement.pk).values(
+            "id", *CHAIN_FIELDS
+        )
+    }
+
+
+def get_stop_changes(stop: models.Stop) -> dict[str, Any]:
+    """
+    Get the chain fields of an unsaved stop instance as a proposed change.
+
+    :param stop: Stop being validated
+    :type stop: models.Stop
+    :return: Chain field values of the stop
+    :rtype: dict[str, Any]
+    """
+    return {field: getattr(stop, field) for field in CHAIN_FIELDS}
+
+
+def apply_stop_changes(stop: ChainStop, changes: dict[str, Any]) -> None:
+    """
+    Apply a proposed change to a stop the way Stop.save would store it.
+
+    Setting the arrival time puts the stop in progress and setting both the
+    arrival and departure time completes it.
+
+    :param stop: Stop to change
+    :type stop: ChainStop
+    :param changes: Chain field values to set
+    :type changes: dict[str, Any]
+    :return: None
+    :rtype: None
+    """
+    for field, value in changes.items():
+        if field in CHAIN_FIELDS:
+            setattr(stop, field, value)
+    if stop.arrival_time:
+        stop.status = models.StatusChoices.IN_PROGRESS
+    if stop.arrival_time and stop.departure_time:
+        stop.status = models.StatusChoices.COMPLETED
+    stop.changed = True
+
+
+def _check_stop(
+    movement: models.Movement,
+    stop: ChainStop,
+    previous_stop: ChainStop | None,
+    next_stop: ChainStop | None,
+) -> list[str]:
+    """
+    Check one stop against its neighbours and its movement.
+    """
+    errors: list[str] = []
+    if (
+        stop.status == models.StatusChoices.AVAILABLE
+        and stop.stored_status in STARTED_STATUSES
+    ):
+        errors.append(_("Stop status cannot be changed back to available"))
+
+    if previous_stop is not None:
+        if stop.appointment_time < previous_stop.appointment_time:
+            errors.append(
+                _(
+                    "Stop appointment time cannot be before the previous stop appointment time"
+                )
+            )
+        if (
+            previous_stop.status != models.StatusChoices.COMPLETED
+            and stop.status in STARTED_STATUSES
+        ):
+            errors.append(
+                _(
+                    "The previous stop must be completed before the next stop can be put in progress "
+                    "or completed "
+                )
+            )
+
+    if next_stop is not None:
+        if stop.appointment_time > next_stop.appointment_time:
+            errors.append(
+                _(
+                    "Stop appointment time cannot be after the next stop appointment time"
+                )
+            )
+        if (
+            stop.status != models.StatusChoices.COMPLETED
+            and next_stop.status in STARTED_STATUSES
+        ):
+            errors.append(
+                _(
+                    "The next stop must be available before the previous stop can be put in progress "
+                    "or completed "
+                )
+            )
+
+    if movement.assigned_driver_id and movement.equipment_id is None:
+        if stop.status in STARTED_STATUSES:
+            errors.append(
+                _(
+                    "Movement must have a driver and equipment to be in progress or completed"
+                )
+            )
+        if stop.arrival_time or stop.departure_time:
+            errors.append(
+                _(
+                    "Movement must have a driver and equipment to have arrival or departure time"
+                )
+            )
+
+    if stop.departure_time:
+        if not stop.arrival_time:
+            errors.append(
+                _("Stop arrival time must be set before the stop departure time")
+            )
+        elif stop.departure_time < stop.arrival_time:
+            errors.append(
+                _("Stop departure time cannot be before the stop arrival time")
+            )
+    return errors
+
+
+def validate_stop_chain(
+    movement: models.Movement,
+    changes: dict[int, dict[str, Any]] | None = None,
+    chain: dict[int, ChainStop] | None = None,
+) -> dict[int, list[str]]:
+    """
+    Validate proposed stop changes against the whole stop chain of a movement.
+
+    The stops are loaded with one query and every rule is checked in memory:
+    appointment times must follow the stop sequence, a stop can only start
+    once the previous stop is completed and cannot go back to available, and
+    arrival and departure times must be consistent. Only the changed stops are
+    checked, or every stop when no changes are given.
+
+    :param movement: Movement whose stops change
+    :type movement: models.Movement
+    :param changes: Chain field values to set, keyed by stop id
+    :type changes: dict[int, dict[str, Any]] | None
+    :param chain: Stops already loaded with load_stop_chain, changed in place
+    :type chain: dict[int, ChainStop] | None
+    :return: Error messages keyed by stop id
+    :rtype: dict[int, list[str]]
+    """
+    if chain is None:
+        chain = load_stop_chain(movement)
+
+    errors: dict[int, list[str]] = {}
+    for stop_id, stop_changes in (changes or {}).items():
+        if stop_id not in chain:
+            errors[stop_id] = [_("Stop does not belong to the movement")]
+            continue
+        apply_stop_changes(chain[stop_id], stop_changes)
+
+    ordered: list[ChainStop] = sorted(
+        chain.values(),
+        key=lambda stop: (stop.sequence is None, stop.sequence or 0, stop.id),
+    )
+    for index, stop in enumerate(ordered):
+        if changes is not None and not stop.changed:
+            continue
+        stop_errors: list[str] = _check_stop(
+            movement,
+            stop,
+            ordered[index - 1] if index > 0 else None,
+            ordered[index + 1] if index + 1 < len(ordered) else None,
+        )
+        if stop_errors:
+            errors[stop.id] = stop_errors
+    return errors
+
+
+def update_stop_chain(
+    movement: models.Movement, changes: dict[int, dict[str, Any]]
+) -> dict[int, list[str]]:
+    """
+    Validate and apply changes to several stops of a movement at once.
+
+    Nothing is written if any change is invalid. Otherwise the stops are
+    written with one bulk UPDATE, late arrivals get a service incident with
+    one upsert, and the stop statuses are rolled up on commit.
+
+    :param movement: Movement whose stops change
+    :type movement: models.Movement
+    :param changes: Stop field values to set, keyed by stop id
+    :type changes: dict[int, dict[str, Any]]
+    :return: Error messages keyed by stop id, empty if the changes were applied
+    :rtype: dict[int, list[str]]
+    """
+    stops: dict[int, models.Stop] = {
+        stop.pk: stop for stop in models.Stop.objects.filter(movement_id=movement.pk)
+    }
+    chain: dict[int, ChainStop] = {
+        stop.pk: ChainStop(
+            id=stop.pk,
+            stored_status=stop.status,
+            **{field: getattr(stop, field) for field in CHAIN_FIELDS},
+        )
+        for stop in stops.values()
+    }
+    errors: dict[int, list[str]] = validate_stop_chain(movement, changes, chain)
+    if errors or not changes:
+        return errors
+
+    now = timezone.now()
+    fields: set[str] = {"status", "modified"}
+    changed_stops: list[models.Stop] = []
+    for stop_id, stop_changes in changes.items():
+        stop: models.Stop = stops[stop_id]
+        for field, value in stop_changes.items():
+            setattr(stop, field, value)
+        stop.status = chain[stop_id].status
+        stop.modified = now
+        fields.update(stop_changes)
+        changed_stops.append(stop)
+
+    with transaction.atomic():
+        models.Stop.objects.bulk_update(changed_stops, sorted(fields))
+        service_incidents.record_service_incidents(
+            movement.organization_id,
+            [
+                stop
+                for stop in changed_stops
+                if {"arrival_time", "appointment_time"} & changes[stop.pk].keys()
+            ],
+        )
+        if any(stop.status in STARTED_STATUSES for stop in changed_stops):
+            rollup.schedule_movements([movement.pk])
+    return errors
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from django.db.models import Count, Expression, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core import generations
+from monta_order import models
+from monta_user.models import Organization
+
+RECONCILE_BATCH_SIZE: int = 1000
+
+
+def get_stop_totals() -> dict[str, Expression]:
+    """
+    Expressions totaling the stops of the outer order, keyed by the order column they maintain.
+
+    :return: Expressions for pieces, weight and stop_count
+    :rtype: dict[str, Expression]
+    """
+    stops = (
+        models.Stop.objects.filter(movement__order=OuterRef("pk"))
+        .order_by()
+        .values("movement__order")
+    )
+    return {
+        "pieces": Coalesce(
+            Subquery(stops.annotate(total=Sum("pieces")).values("total")), 0
+        ),
+        "weight": Coalesce(
+            Subquery(stops.annotate(total=Sum("weight")).values("total")), 0
+        ),
+        "stop_count": Coalesce(
+            Subquery(stops.annotate(total=Count("pk")).values("total")), 0
+        ),
+    }
+
+
+def reconcile_order_totals(
+    *,
+    organization: Organization | None = None,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+) -> int:
+    """
+    Repair orders whose pieces, weight or stop count no longer match their stops.
+
+    The stop triggers keep the totals current, this repairs rows written while
+    the triggers were not installed. Orders are walked by primary key in
+    batches, each batch costs one query to find the drifted orders and one
+    UPDATE to fix them.
+
+    :param organization: Restrict the repair to this organization
+    :type organization: Organization | None
+    :param batch_size: Orders checked per batch
+    :type batch_size: int
+    :return: Number of orders repaired
+    :rtype: int
+    """
+    orders = models.Order.objects.order_by("pk")
+    if organization is not None:
+        orders = orders.filter(organization=organization)
+
+    totals: dict[str, Expression] = get_stop_totals()
+    fields: tuple[str, ...] = models.STOP_TOTAL_FIELDS
+    repaired: int = 0
+    last_pk: int = 0
+    while True:
+        rows: list[tuple] = list(
+            orders.filter(pk__gt=last_pk)
+            .annotate(**{f"expected_{name}": totals[name] for name in fields})
+            .values_list("pk", *fields, *(f"expected_{name}" for name in fields))[
+                :batch_size
+            ]
+        )
+        if not rows:
+            return repaired
+        last_pk = rows[-1][0]
+
+        drifted: list[int] = [
+            row[0] for row in rows if row[1 : len(fields) + 1] != row[len(fields) + 1 :]
+        ]
+        if drifted:
+            repaired += models.Order.objects.filter(pk__in=drifted).update(
+                **totals, modified=timezone.now()
+            )
+            generations.bump_generations(
+                models.Order.objects.filter(pk__in=drifted)
+                .order_by()
+                .values_list("organization_id", flat=True)
+                .distinct(),
+                generations.ORDERS,
+            )
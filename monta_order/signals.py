@@ -18,16 +18,44 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from django.db.models.signals import post_save
+from django.db.models import Case, PositiveIntegerField, Value, When
+from django.db.models.signals import post_delete, post_save
 
 # Core Django Imports
 from django.dispatch import receiver
 
 # Monta Imports
 from monta_order import models
-
-
-@receiver(post_save, sender=models.Stop)
-def sequence_stops(sender, instance, created, **kwargs):
-    if created:
-        instance.movement.sequence_stops()
+from monta_order.services.service_incidents import delay_code_cache
+
+
+@receiver(post_delete, sender=models.Stop)
+def close_sequence_gap(sender, instance, **kwargs):
+    # Renumber from the rows left in the database, the sequence of the deleted
+    # instance is stale once a queryset deletes several stops of a movement.
+    stops = models.Stop.objects.filter(
+        movement_id=instance.movement_id, sequence__isnull=False
+    )
+    moved: dict[int, int] = {
+        stop_id: position
+        for position, (stop_id, sequence) in enumerate(
+            stops.order_by("sequence", "pk").values_list("pk", "sequence"), start=1
+        )
+        if sequence != position
+    }
+    if moved:
+        stops.filter(pk__in=moved).update(
+            sequence=Case(
+                *(
+                    When(pk=stop_id, then=Value(position))
+                    for stop_id, position in moved.items()
+                ),
+                output_field=PositiveIntegerField(),
+            )
+        )
+
+
+@receiver(post_save, sender=models.DelayCode)
+@receiver(post_delete, sender=models.DelayCode)
+def invalidate_delay_code_cache(sender, instance, **kwargs):
+    delay_code_cache.invalidate(instance.organization_id)
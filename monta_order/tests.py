@@ -17,7 +17,47 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+from ninja.testing import TestClient
+
+from monta_customer.models import Customer
+from monta_equipment.models import EquipmentType
+from monta_locations.models import Location
+from monta_order import api_v1
+from monta_order.models import (
+    Commodity,
+    DelayCode,
+    Order,
+    OrderType,
+    RateBreak,
+    RateBreakChoices,
+    RateMethodChoices,
+    RateTable,
+    ServiceIncident,
+    StatusChoices,
+    Stop,
+    StopChoices,
+)
+from monta_order.services import (
+    order_import,
+    order_lookup,
+    order_pages,
+    rating,
+    service_incidents,
+    status_transitions,
+    stop_chain,
+    totals,
+)
+from monta_user.factories.user import ProfileFactory
 
 
 class OrderTest(TestCase):
@@ -35,3 +75,870 @@ class OrderTest(TestCase):
 
     def test_delete_order(self) -> None:
         pass
+
+
+class OrderIdTest(TestCase):
+    def test_generate_order_id(self) -> None:
+        """
+        Test that generated order ids are unique and increasing
+        """
+        first = Order.generate_order_id()
+        second = Order.generate_order_id()
+        self.assertTrue(first.startswith("S"))
+        self.assertLess(int(first[1:]), int(second[1:]))
+
+
+class OrderImportValidationTest(TestCase):
+    def setUp(self) -> None:
+        self.lookups = order_import.OrderLookups(
+            customers={"CUST": 1},
+            order_types={"FTL": 1},
+            commodities={"FOOD": 1},
+            equipment_types={"VAN"},
+            locations={"ORIGIN": None, "DEST": None},
+            open_bol_numbers={"BOL-1": "S000001"},
+        )
+        self.pickup_time = datetime(2022, 10, 1, 8)
+        self.row = {
+            "customer_id": "CUST",
+            "order_type_id": "FTL",
+            "commodity_id": "FOOD",
+            "equipment_type_id": "VAN",
+            "origin_location_id": "ORIGIN",
+            "origin_appointment_time": self.pickup_time,
+            "destination_location_id": "DEST",
+            "destination_appointment_time": self.pickup_time + timedelta(hours=6),
+            "rate_method": RateMethodChoices.FLAT,
+            "freight_charge_amount": Decimal("100.00"),
+            "stops": [],
+        }
+
+    def test_valid_row(self) -> None:
+        """
+        Test that a complete row has no errors and gets a pickup and delivery
+        """
+        self.assertEqual(order_import.validate_order_rows([self.row], self.lookups), {})
+        self.assertEqual(
+            [stop["stop_type"] for stop in order_import.get_stop_rows(self.row)],
+            [StopChoices.PICKUP, StopChoices.DELIVERY],
+        )
+
+    def test_invalid_rows_are_keyed_by_index(self) -> None:
+        """
+        Test that every problem of a row is reported under its index
+        """
+        invalid_row = {
+            **self.row,
+            "customer_id": "MISSING",
+            "freight_charge_amount": None,
+            "stops": [
+                {
+                    "stop_type": StopChoices.PICKUP,
+                    "location_id": "ORIGIN",
+                    "appointment_time": self.pickup_time,
+                },
+                {
+                    "stop_type": StopChoices.DELIVERY,
+                    "location_id": "ELSEWHERE",
+                    "appointment_time": self.pickup_time - timedelta(hours=1),
+                },
+            ],
+        }
+        errors = order_import.validate_order_rows([self.row, invalid_row], self.lookups)
+        self.assertEqual(list(errors), [1])
+        self.assertEqual(
+            errors[1],
+            [
+                "Unknown customer MISSING",
+                "Unknown location ELSEWHERE",
+                "Freight Charge Amount is required for flat rating method.",
+                "Stop appointment time cannot be before the previous stop appointment time",
+            ],
+        )
+
+    def test_duplicate_bol_numbers(self) -> None:
+        """
+        Test that a BOL number on an open order or earlier in the batch is reported
+        """
+        errors = order_import.validate_order_rows(
+            [
+                {**self.row, "bol_number": "BOL-1"},
+                {**self.row, "bol_number": "BOL-2"},
+                {**self.row, "bol_number": "BOL-2"},
+            ],
+            self.lookups,
+        )
+        self.assertEqual(
+            errors,
+            {
+                0: ["BOL number BOL-1 is already on open order S000001"],
+                2: ["BOL number BOL-2 is already on order 1 of the batch"],
+            },
+        )
+
+
+class OrderFixtureMixin:
+    def setUp(self) -> None:
+        profile = ProfileFactory.create()
+        self.organization = profile.organization
+        self.locations = [
+            Location.objects.create(
+                organization=self.organization,
+                name=f"Location {index}",
+                address_line_1=f"{index} Main St",
+                city="Charlotte",
+                state="NC",
+                zip_code="28202",
+            )
+            for index in range(3)
+        ]
+        now = timezone.now()
+        self.order_values = dict(
+            organization=self.organization,
+            user=profile.user,
+            customer=Customer.objects.create(
+                organization=self.organization, name="Customer"
+            ),
+            order_type=OrderType.objects.create(
+                organization=self.organization, order_type_id="ftl", name="FTL"
+            ),
+            commodity=Commodity.objects.create(
+                organization=self.organization, commodity_id="food", name="Food"
+            ),
+            equipment_type=EquipmentType.objects.create(
+                organization=self.organization, equip_type_id="VAN", name="Van"
+            ),
+            origin_location=self.locations[0],
+            origin_appointment_time=now,
+            destination_location=self.locations[1],
+            destination_appointment_time=now + timezone.timedelta(hours=4),
+            freight_charge_amount=Decimal("100.00"),
+            mileage=Decimal("10.00"),
+        )
+        self.order = self.create_order()
+        self.movement = self.order.movements.get()
+
+    def create_order(self, **kwargs) -> Order:
+        return Order.objects.create(**{**self.order_values, **kwargs})
+
+    def get_sequence(self) -> list[tuple[str, int]]:
+        return list(
+            self.movement.stops.order_by("sequence").values_list(
+                "stop_type", "sequence"
+            )
+        )
+
+    def add_stop(self, **kwargs) -> Stop:
+        return Stop.objects.create(
+            organization=self.order.organization,
+            movement=self.movement,
+            stop_type=StopChoices.SPLIT_PICKUP,
+            location=self.locations[2],
+            address_line=self.locations[2].get_address_combination,
+            appointment_time=self.order.origin_appointment_time,
+            **kwargs,
+        )
+
+
+class StopSequenceTest(OrderFixtureMixin, TestCase):
+    def test_new_stops_are_appended(self) -> None:
+        """
+        Test that order creation sequences the pickup before the delivery
+        """
+        self.assertEqual(
+            self.get_sequence(),
+            [(StopChoices.PICKUP, 1), (StopChoices.DELIVERY, 2)],
+        )
+
+    def test_insert_and_delete_shift_with_one_update(self) -> None:
+        """
+        Test that inserting and deleting a stop renumber the others in one query
+        """
+        with self.assertNumQueries(2):
+            stop = self.add_stop(sequence=2)
+        self.assertEqual(
+            self.get_sequence(),
+            [
+                (StopChoices.PICKUP, 1),
+                (StopChoices.SPLIT_PICKUP, 2),
+                (StopChoices.DELIVERY, 3),
+            ],
+        )
+        stop.delete()
+        self.assertEqual(
+            self.get_sequence(),
+            [(StopChoices.PICKUP, 1), (StopChoices.DELIVERY, 2)],
+        )
+
+    def test_queryset_delete_closes_every_gap(self) -> None:
+        """
+        Test that deleting non-adjacent stops in one query renumbers the rest from one
+        """
+        pickup = self.movement.stops.get(sequence=1)
+        # Created out of sequence order, so the deletes are not signalled in it.
+        first = self.add_stop(sequence=1)
+        last = self.add_stop(sequence=4)
+        self.assertEqual(
+            self.get_sequence(),
+            [
+                (StopChoices.SPLIT_PICKUP, 1),
+                (StopChoices.PICKUP, 2),
+                (StopChoices.DELIVERY, 3),
+                (StopChoices.SPLIT_PICKUP, 4),
+            ],
+        )
+        self.movement.stops.filter(sequence__in=[1, 3]).delete()
+        self.assertEqual(
+            list(
+                self.movement.stops.order_by("sequence").values_list("pk", "sequence")
+            ),
+            [(pickup.pk, 1), (last.pk, 2)],
+        )
+        self.assertFalse(Stop.objects.filter(pk=first.pk).exists())
+
+    def test_reorder_stops(self) -> None:
+        """
+        Test that reordering sets every sequence with one query
+        """
+        pickup, delivery = self.movement.stops.order_by("sequence")
+        with self.assertNumQueries(1):
+            self.movement.reorder_stops([delivery.id, pickup.id])
+        self.assertEqual(
+            self.get_sequence(),
+            [(StopChoices.DELIVERY, 1), (StopChoices.PICKUP, 2)],
+        )
+
+    def test_status_rolls_up_once_per_transaction(self) -> None:
+        """
+        Test that completing every stop completes the movement and the order on commit
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for stop in self.movement.stops.order_by("sequence"):
+                    stop.status = StatusChoices.COMPLETED
+                    stop.save()
+                self.movement.refresh_from_db()
+                self.assertEqual(self.movement.status, StatusChoices.AVAILABLE)
+
+        self.movement.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.movement.status, StatusChoices.COMPLETED)
+        self.assertEqual(self.order.status, StatusChoices.COMPLETED)
+
+    def test_status_edit_is_one_update(self) -> None:
+        """
+        Test that changing the status of a stop writes the status and nothing else
+        """
+        stop = self.movement.stops.get(sequence=1)
+        stop.status = StatusChoices.IN_PROGRESS
+        with self.assertNumQueries(1) as queries:
+            stop.save()
+        self.assertNotIn("appointment_time", queries.captured_queries[0]["sql"])
+
+    def test_reconcile_order_totals(self) -> None:
+        """
+        Test that reconciling repairs drifted orders and leaves correct ones alone
+        """
+        self.add_stop(pieces=5, weight=100)
+        Order.objects.filter(pk=self.order.pk).update(pieces=0, weight=0, stop_count=0)
+        modified = Order.objects.values_list("modified", flat=True).get(
+            pk=self.order.pk
+        )
+
+        self.assertEqual(totals.reconcile_order_totals(), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(
+            (self.order.pieces, self.order.weight, self.order.stop_count), (5, 100, 3)
+        )
+        self.assertGreater(self.order.modified, modified)
+        self.assertEqual(totals.reconcile_order_totals(), 0)
+
+    def test_save_does_not_overwrite_stop_totals(self) -> None:
+        """
+        Test that saving a stale order keeps the totals maintained by the stop triggers
+        """
+        Order.objects.filter(pk=self.order.pk).update(pieces=5, stop_count=3)
+        self.order.comment = "Updated"
+        self.order.save()
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.comment, "Updated")
+        self.assertEqual((self.order.pieces, self.order.stop_count), (5, 3))
+
+
+class StopChainTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.pickup, self.delivery = self.movement.stops.order_by("sequence")
+        self.user = self.order.user
+        self.user.is_superuser = True
+        self.user.save()
+        # The API is also mounted in the url conf, let the test client reuse it.
+        patcher = mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(api_v1.api)
+
+    def test_clean_loads_the_chain_once(self) -> None:
+        """
+        Test that Stop.clean checks the neighbours of the stop with one query
+        """
+        self.delivery.status = StatusChoices.COMPLETED
+        with self.assertNumQueries(1), self.assertRaises(ValidationError) as error:
+            self.delivery.clean()
+        self.assertIn(
+            "The previous stop must be completed before the next stop can be put in progress "
+            "or completed ",
+            error.exception.messages,
+        )
+
+    def test_every_error_is_returned(self) -> None:
+        """
+        Test that the validator reports the errors of every changed stop at once
+        """
+        errors = stop_chain.validate_stop_chain(
+            self.movement,
+            {
+                self.pickup.id: {"departure_time": self.order.origin_appointment_time},
+                self.delivery.id: {
+                    "appointment_time": self.order.origin_appointment_time
+                    - timedelta(hours=1)
+                },
+            },
+        )
+        self.assertEqual(
+            errors,
+            {
+                self.pickup.id: [
+                    "Stop appointment time cannot be after the next stop appointment time",
+                    "Stop arrival time must be set before the stop departure time",
+                ],
+                self.delivery.id: [
+                    "Stop appointment time cannot be before the previous stop appointment time"
+                ],
+            },
+        )
+
+    def test_update_stops(self) -> None:
+        """
+        Test that the bulk API completes both stops of the movement in one request
+        """
+        arrival = self.order.origin_appointment_time
+        response = self.client.patch(
+            f"/movements/{self.movement.id}/stops",
+            json={
+                "stops": [
+                    {
+                        "id": stop.id,
+                        "arrival_time": arrival.isoformat(),
+                        "departure_time": (arrival + timedelta(hours=1)).isoformat(),
+                    }
+                    for stop in (self.pickup, self.delivery)
+                ]
+            },
+            user=self.user,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"updated": 2, "errors": {}})
+        self.assertEqual(
+            set(self.movement.stops.values_list("status", flat=True)),
+            {StatusChoices.COMPLETED},
+        )
+
+    def test_invalid_update_changes_nothing(self) -> None:
+        """
+        Test that one invalid stop rejects the whole update
+        """
+        response = self.client.patch(
+            f"/movements/{self.movement.id}/stops",
+            json={
+                "stops": [
+                    {"id": self.pickup.id, "pieces": 5},
+                    {"id": self.delivery.id, "status": StatusChoices.COMPLETED},
+                ]
+            },
+            user=self.user,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(response.json()["errors"]), {str(self.pickup.id), str(self.delivery.id)}
+        )
+        self.pickup.refresh_from_db()
+        self.assertEqual(self.pickup.pieces, 0)
+
+
+class ServiceIncidentTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        service_incidents.delay_code_cache.clear()
+        self.addCleanup(service_incidents.delay_code_cache.clear)
+        self.delay_code = DelayCode.objects.create(
+            organization=self.order.organization,
+            name="Late",
+            description="Arrived late",
+            is_default=True,
+        )
+        self.pickup = self.movement.stops.get(sequence=1)
+
+    def test_late_stop_has_one_incident(self) -> None:
+        """
+        Test that re-saving a late stop updates its incident instead of adding one
+        """
+        self.pickup.arrival_time = self.pickup.appointment_time + timedelta(hours=1)
+        self.pickup.save()
+        self.pickup.arrival_time += timedelta(hours=1)
+        with self.assertNumQueries(2):
+            self.pickup.save()
+
+        incident = ServiceIncident.objects.get()
+        self.assertEqual(incident.stop, self.pickup)
+        self.assertEqual(incident.delay_code, self.delay_code)
+        self.assertEqual(incident.delay_reason, "Arrived late")
+        self.assertEqual(incident.delay_time, timedelta(hours=2))
+
+    def test_corrected_stop_loses_incident(self) -> None:
+        """
+        Test that a late stop corrected to on time no longer has an incident
+        """
+        self.pickup.arrival_time = self.pickup.appointment_time + timedelta(hours=1)
+        self.pickup.save()
+        self.assertTrue(ServiceIncident.objects.filter(stop=self.pickup).exists())
+
+        self.pickup.arrival_time = self.pickup.appointment_time
+        self.pickup.save()
+        self.assertFalse(ServiceIncident.objects.exists())
+
+        self.pickup.arrival_time += timedelta(minutes=5)
+        self.pickup.save()
+        self.pickup.arrival_time = None
+        self.pickup.save()
+        self.assertFalse(ServiceIncident.objects.exists())
+
+    def test_generate_service_incidents(self) -> None:
+        """
+        Test that the batch creates the missing incidents of a window once
+        """
+        appointment_time = self.pickup.appointment_time
+        Stop.objects.filter(pk=self.pickup.pk).update(
+            status=StatusChoices.COMPLETED,
+            arrival_time=appointment_time + timedelta(minutes=30),
+            departure_time=appointment_time + timedelta(hours=1),
+        )
+        start = appointment_time - timedelta(days=1)
+        end = appointment_time + timedelta(days=1)
+
+        organization_id = self.order.organization_id
+        self.assertEqual(
+            service_incidents.generate_service_incidents(organization_id, start, end),
+            1,
+        )
+        self.assertEqual(
+            service_incidents.generate_service_incidents(organization_id, start, end),
+            0,
+        )
+        self.assertEqual(
+            ServiceIncident.objects.get().delay_time, timedelta(minutes=30)
+        )
+
+    def test_default_delay_code_is_cached(self) -> None:
+        """
+        Test that the default delay code is read once and reloaded after a change
+        """
+        organization_id = self.order.organization_id
+        service_incidents.delay_code_cache.get(organization_id)
+        with self.assertNumQueries(0):
+            service_incidents.delay_code_cache.get(organization_id)
+
+        self.delay_code.is_default = False
+        self.delay_code.save()
+        self.assertIsNone(service_incidents.delay_code_cache.get(organization_id))
+
+
+class OrderLookupTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.order.bol_number = "BOL-100"
+        self.order.consignee_ref_num = "REF-7"
+        self.order.save()
+
+    def get_new_order(self) -> Order:
+        return Order(
+            organization=self.order.organization,
+            customer=self.order.customer,
+            rate_method=RateMethodChoices.FLAT,
+            freight_charge_amount=Decimal("100.00"),
+            bol_number="BOL-100",
+        )
+
+    def test_lookup_orders(self) -> None:
+        """
+        Test exact and prefix lookups by BOL and consignee reference number
+        """
+        organization_id = self.order.organization_id
+        self.assertEqual(
+            list(order_lookup.lookup_orders(organization_id, bol_number="BOL-100")),
+            [self.order],
+        )
+        self.assertEqual(
+            list(order_lookup.lookup_orders(organization_id, bol_number="BOL-1")), []
+        )
+        self.assertEqual(
+            list(
+                order_lookup.lookup_orders(
+                    organization_id, consignee_ref_num="REF", prefix=True
+                )
+            ),
+            [self.order],
+        )
+        self.assertEqual(list(order_lookup.lookup_orders(organization_id)), [])
+
+    def test_duplicate_bol_is_flagged(self) -> None:
+        """
+        Test that a new order cannot reuse the BOL number of an open order, with one query
+        """
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError) as context:
+                self.get_new_order().clean()
+        self.assertIn("bol_number", context.exception.message_dict)
+
+        # Saving the order again does not check its own BOL number.
+        with self.assertNumQueries(0):
+            self.order.clean()
+
+        Order.objects.filter(pk=self.order.pk).update(status=StatusChoices.COMPLETED)
+        self.get_new_order().clean()
+
+    @mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+    def test_lookup_api(self) -> None:
+        """
+        Test that the lookup endpoint returns the orders of the organization
+        """
+        user = self.order.user
+        user.is_superuser = True
+        user.save()
+        client = TestClient(api_v1.api)
+        response = client.get("/orders/lookup?bol_number=BOL&prefix=true", user=user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(order["order_id"], order["customer_id"]) for order in response.json()],
+            [(self.order.order_id, self.order.customer.customer_id)],
+        )
+
+
+class OrderPageTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = self.order.user
+        self.user.is_superuser = True
+        self.user.save()
+        self.client = TestClient(api_v1.api)
+
+    def test_order_pages(self) -> None:
+        """
+        Test that the cursor of a page leads to the next one in a constant number of queries
+        """
+        second = Order.objects.create(
+            **{
+                field: getattr(self.order, field)
+                for field in (
+                    "organization",
+                    "user",
+                    "customer",
+                    "order_type",
+                    "commodity",
+                    "equipment_type",
+                    "origin_location",
+                    "origin_appointment_time",
+                    "destination_location",
+                    "destination_appointment_time",
+                    "freight_charge_amount",
+                    "mileage",
+                )
+            }
+        )
+        organization_id = self.order.organization_id
+        with self.assertNumQueries(3):
+            page = order_pages.get_order_page(
+                organization_id,
+                fields=["order_id", "customer_id"],
+                limit=1,
+                include_movements=True,
+            )
+        self.assertEqual(
+            page.results[0]["customer_id"], self.order.customer.customer_id
+        )
+        self.assertEqual(
+            [stop["id"] for stop in page.results[0]["movements"][0]["stops"]],
+            list(self.movement.stops.order_by("sequence").values_list("id", flat=True)),
+        )
+        self.assertEqual(page.next_cursor, self.order.pk)
+
+        page = order_pages.get_order_page(
+            organization_id, fields=["order_id"], cursor=page.next_cursor, limit=1
+        )
+        self.assertEqual(page.results, [{"order_id": second.order_id}])
+        self.assertIsNone(page.next_cursor)
+
+    def test_unknown_field(self) -> None:
+        """
+        Test that an unknown field is rejected
+        """
+        with self.assertRaises(ValueError):
+            order_pages.parse_fields("order_id,secret")
+        self.assertEqual(order_pages.parse_fields("id, id,status"), ["id", "status"])
+
+    @mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+    def test_etag(self) -> None:
+        """
+        Test that an unchanged response is answered with 304 until its payload changes
+        """
+        path = f"/orders/{self.order.pk}?fields=order_id,status"
+        response = self.client.get(path, user=self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"order_id": self.order.order_id, "status": self.order.status},
+        )
+        etag = response["ETag"]
+
+        response = self.client.get(
+            path, user=self.user, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Fields that are not returned leave the response as it is.
+        self.order.bol_number = "BOL-9"
+        self.order.save()
+        response = self.client.get(
+            path, user=self.user, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        Order.objects.filter(pk=self.order.pk).update(status=StatusChoices.CANCELLED)
+        response = self.client.get(
+            path, user=self.user, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+    def test_get_order_loads_once(self) -> None:
+        """
+        Test that an order is read with one query and other organizations' orders are not found
+        """
+        path = f"/orders/{self.order.pk}?fields=order_id,status"
+        with self.assertNumQueries(1):
+            response = self.client.get(path, user=self.user)
+        self.assertEqual(response.status_code, 200)
+
+        other = ProfileFactory.create().user
+        other.is_superuser = True
+        other.save()
+        response = self.client.get(path, user=other)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Order not found."})
+
+    @mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+    def test_etag_follows_writes_without_modified(self) -> None:
+        """
+        Test that a stop sequence shift, which leaves modified alone, changes the ETag
+        """
+        path = f"/orders/{self.order.pk}?fields=order_id&include=movements"
+        etag = self.client.get(path, user=self.user)["ETag"]
+        # The shift of an inserted stop, one UPDATE that leaves modified alone.
+        self.movement.stops.update(sequence=F("sequence") + 1)
+        response = self.client.get(
+            path, user=self.user, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class StatusTransitionTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.pickup, self.delivery = self.movement.stops.order_by("sequence")
+        self.arrival = self.order.origin_appointment_time
+
+    def complete(self, stop: Stop) -> dict:
+        return {
+            "model": "stop",
+            "id": stop.id,
+            "arrival_time": self.arrival,
+            "departure_time": self.arrival + timedelta(hours=1),
+        }
+
+    def test_complete_stops_and_roll_up(self) -> None:
+        """
+        Test that completing every stop completes the movement and order in the same call
+        """
+        results = status_transitions.transition_statuses(
+            self.order.organization_id,
+            [self.complete(self.pickup), self.complete(self.delivery)],
+        )
+        self.assertEqual([result.errors for result in results], [[], []])
+        self.movement.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.movement.status, StatusChoices.COMPLETED)
+        self.assertEqual(self.order.status, StatusChoices.COMPLETED)
+
+    def test_partial_failure(self) -> None:
+        """
+        Test that invalid transitions are reported while the valid ones are applied
+        """
+        Order.objects.filter(pk=self.order.pk).update(status=StatusChoices.COMPLETED)
+        results = status_transitions.transition_statuses(
+            self.order.organization_id,
+            [
+                self.complete(self.delivery),
+                {"model": "order", "id": self.order.id, "status": "AVAILABLE"},
+                {"model": "movement", "id": self.movement.id, "status": "CANCELLED"},
+                {"model": "stop", "id": 0, "status": "COMPLETED"},
+            ],
+        )
+        self.assertEqual(
+            [result.applied for result in results], [False, False, True, False]
+        )
+        self.assertIn(
+            "The previous stop must be completed before the next stop can be put in progress "
+            "or completed ",
+            results[0].errors,
+        )
+        self.assertEqual(
+            results[1].errors, ["Status cannot be changed from COMPLETED to AVAILABLE"]
+        )
+        self.assertEqual(results[3].errors, ["Record not found"])
+        self.delivery.refresh_from_db()
+        self.movement.refresh_from_db()
+        self.assertEqual(self.delivery.status, StatusChoices.AVAILABLE)
+        self.assertEqual(self.movement.status, StatusChoices.CANCELLED)
+
+    @mock.patch.dict(os.environ, {"NINJA_SKIP_REGISTRY": "yes"})
+    def test_transition_api(self) -> None:
+        """
+        Test that the endpoint reports a result for every item
+        """
+        user = self.order.user
+        user.is_superuser = True
+        user.save()
+        response = TestClient(api_v1.api).post(
+            "/status_transitions",
+            json={
+                "items": [
+                    {
+                        "model": "stop",
+                        "id": self.pickup.id,
+                        "arrival_time": self.arrival.isoformat(),
+                    },
+                    {"model": "order", "id": self.order.id},
+                ]
+            },
+            user=user,
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["applied"], data["failed"]), (1, 1))
+        self.assertEqual(data["results"][0]["status"], StatusChoices.IN_PROGRESS)
+        self.assertEqual(data["results"][1]["errors"], ["Status is required"])
+
+
+class RatingTest(OrderFixtureMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.today = timezone.localdate(self.order.origin_appointment_time)
+        self.table = RateTable.objects.create(
+            organization=self.order.organization,
+            name="Customer per mile",
+            customer=self.order.customer,
+            rate_method=RateMethodChoices.PER_MILE,
+            rate=Decimal("3.0000"),
+            minimum_charge=Decimal("50.00"),
+            effective_date=self.today - timedelta(days=30),
+        )
+        RateBreak.objects.bulk_create(
+            [
+                RateBreak(
+                    rate_table=self.table,
+                    break_type=RateBreakChoices.MILEAGE,
+                    minimum=minimum,
+                    rate=rate,
+                )
+                for minimum, rate in (
+                    (Decimal("100"), Decimal("2.5000")),
+                    (Decimal("500"), Decimal("2.0000")),
+                )
+            ]
+        )
+
+    def rate(self, **values) -> Decimal:
+        row = {name: getattr(self.order, name) for name in rating.RATING_FIELDS}
+        row.update(values)
+        return rating.rate_orders(
+            rating.load_rate_tables(self.order.organization_id),
+            [tuple(row.values())],
+        )[0]
+
+    def test_rate_breaks(self) -> None:
+        """
+        Test that the bracket the mileage reaches sets the rate, above the minimum charge
+        """
+        self.assertEqual(self.rate(mileage=Decimal("10")), Decimal("50.00"))
+        self.assertEqual(self.rate(mileage=Decimal("99")), Decimal("297.00"))
+        self.assertEqual(self.rate(mileage=Decimal("100")), Decimal("250.00"))
+        self.assertEqual(self.rate(mileage=Decimal("600")), Decimal("1200.00"))
+        self.assertEqual(
+            self.rate(mileage=Decimal("600"), other_charge_amount=Decimal("25.005")),
+            Decimal("1225.01"),
+        )
+
+    def test_most_specific_table_in_effect(self) -> None:
+        """
+        Test that a lane table outranks an equipment table and dates select the version
+        """
+        RateTable.objects.create(
+            organization=self.order.organization,
+            name="Lane flat",
+            customer=self.order.customer,
+            origin_location=self.order.origin_location,
+            destination_location=self.order.destination_location,
+            rate_method=RateMethodChoices.FLAT,
+            rate=Decimal("400.0000"),
+            effective_date=self.today,
+        )
+        RateTable.objects.create(
+            organization=self.order.organization,
+            name="Customer van",
+            customer=self.order.customer,
+            equipment_type=self.order.equipment_type,
+            rate_method=RateMethodChoices.FLAT,
+            rate=Decimal("300.0000"),
+            effective_date=self.today - timedelta(days=30),
+        )
+        self.assertEqual(self.rate(), Decimal("400.00"))
+        self.assertEqual(
+            self.rate(origin_appointment_time=timezone.now() - timedelta(days=2)),
+            Decimal("300.00"),
+        )
+        self.assertEqual(
+            self.rate(customer_id=None, rate_method=RateMethodChoices.PER_MILE),
+            Decimal("1000.00"),
+        )
+
+    def test_rate_without_table(self) -> None:
+        """
+        Test that an order without a table multiplies its freight charge by its units
+        """
+        self.table.delete()
+        self.assertEqual(self.rate(), Decimal("100.00"))
+        self.assertEqual(
+            self.rate(rate_method=RateMethodChoices.PER_MILE), Decimal("1000.00")
+        )
+
+    def test_rerate_orders(self) -> None:
+        """
+        Test that re-rating writes only the sub totals that changed, in a few queries
+        """
+        self.assertEqual(rating.rerate_orders(self.order.organization_id), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.sub_total, Decimal("50.00"))
+
+        with self.assertNumQueries(3):
+            self.assertEqual(rating.rerate_orders(self.order.organization_id), 0)
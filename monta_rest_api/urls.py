@@ -23,5 +23,9 @@ from django.urls import path
 
 # Third Party Imports
 from monta_billing import api_v1 as billing_api
+from monta_order import api_v1 as order_api
 
-urlpatterns = [path("billing/", billing_api.api.urls)]
+urlpatterns = [
+    path("billing/", billing_api.api.urls),
+    path("order/", order_api.api.urls),
+]
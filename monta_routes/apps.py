@@ -5,3 +5,6 @@ from django.apps import AppConfig
 class MontaRoutesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "monta_routes"
+
+    def ready(self):
+        import monta_routes.signals
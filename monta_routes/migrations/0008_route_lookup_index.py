@@ -0,0 +1,20 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monta_routes", "0007_route_duration"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="route",
+            index=models.Index(
+                fields=["organization", "origin", "destination"],
+                name="monta_route_organiz_5ce453_idx",
+            ),
+        ),
+    ]
@@ -103,6 +103,7 @@ class Route(TimeStampedModel):
         ordering: list[str] = ["-created"]
         indexes: list[models.Index] = [
             models.Index(fields=["-created"]),
+            models.Index(fields=["organization", "origin", "destination"]),
         ]
 
     def __str__(self) -> str:
@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import math
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from decimal import Decimal
+
+import googlemaps
+
+from monta_locations.models import Location
+from monta_organization.models import (
+    Integration,
+    IntegrationChoices,
+    OrganizationSettings,
+)
+from monta_routes.models import GoogleRouteDistanceUnitChoices, Route
+from monta_user.models import Organization
+
+ROUTE_CACHE_SIZE: int = 4096
+
+METERS_PER_UNIT: dict[str, float] = {
+    GoogleRouteDistanceUnitChoices.IMPERIAL: 1609.344,
+    GoogleRouteDistanceUnitChoices.METRIC: 1000.0,
+}
+
+EARTH_RADIUS_METERS: float = 6371008.8
+
+RouteKey = tuple[int, str, str]
+
+
+@dataclass(frozen=True)
+class RouteDistance:
+    """
+    Distance in the organization's mileage unit and duration in seconds.
+    """
+
+    distance: Decimal
+    duration: int | None = None
+
+
+class RouteCache:
+    """
+    Thread safe LRU cache of route distances in front of the Route table.
+
+    Keys are (organization id, origin location id, destination location id).
+    """
+
+    def __init__(self, maxsize: int = ROUTE_CACHE_SIZE) -> None:
+        """
+        :param maxsize: Number of routes to keep
+        :type maxsize: int
+        """
+        self.maxsize: int = maxsize
+        self._lock: threading.Lock = threading.Lock()
+        self._routes: OrderedDict[RouteKey, Decimal] = OrderedDict()
+
+    def get(self, key: RouteKey) -> Decimal | None:
+        """
+        Get a cached distance and mark it as most recently used.
+
+        :param key: Route key
+        :type key: RouteKey
+        :return: Distance or None on a miss
+        :rtype: Decimal | None
+        """
+        with self._lock:
+            distance: Decimal | None = self._routes.get(key)
+            if distance is not None:
+                self._routes.move_to_end(key)
+            return distance
+
+    def set(self, key: RouteKey, distance: Decimal) -> None:
+        """
+        Cache a distance, evicting the least recently used route if full.
+
+        :param key: Route key
+        :type key: RouteKey
+        :param distance: Distance of the route
+        :type distance: Decimal
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self._routes[key] = distance
+            self._routes.move_to_end(key)
+            while len(self._routes) > self.maxsize:
+                self._routes.popitem(last=False)
+
+    def invalidate(self, key: RouteKey) -> None:
+        """
+        Remove a route from the cache.
+
+        :param key: Route key
+        :type key: RouteKey
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self._routes.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove every route from the cache.
+
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self._routes.clear()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+
+route_cache: RouteCache = RouteCache()
+
+
+class DistanceProvider(ABC):
+    """
+    Source of route distances for pairs of locations.
+
+    A provider resolves one distance matrix per request. max_origins,
+    max_destinations and max_elements describe the largest matrix a single
+    request may ask for, None meaning unlimited.
+    """
+
+    max_origins: int | None = None
+    max_destinations: int | None = None
+    max_elements: int | None = None
+
+    def __init__(self, unit: str = GoogleRouteDistanceUnitChoices.IMPERIAL) -> None:
+        """
+        :param unit: GoogleRouteDistanceUnitChoices value distances are returned in
+        :type unit: str
+        """
+        self.unit: str = unit
+        self.requests: int = 0
+
+    def to_unit(self, meters: float) -> Decimal:
+        """
+        Convert meters to the provider's unit.
+
+        :param meters: Distance in meters
+        :type meters: float
+        :return: Distance rounded to two decimal places
+        :rtype: Decimal
+        """
+        return round(Decimal(meters / METERS_PER_UNIT[self.unit]), 2)
+
+    @abstractmethod
+    def distance_matrix(
+        self, origins: list[Location], destinations: list[Location]
+    ) -> dict[tuple[str, str], RouteDistance]:
+        """
+        Resolve the distance from every origin to every destination.
+
+        :param origins: Origin locations
+        :type origins: list[Location]
+        :param destinations: Destination locations
+        :type destinations: list[Location]
+        :return: Distances keyed by (origin location id, destination location id),
+            pairs the provider cannot resolve are left out
+        :rtype: dict[tuple[str, str], RouteDistance]
+        """
+
+
+class HaversineDistanceProvider(DistanceProvider):
+    """
+    Offline estimator using the great circle distance of geocoded locations.
+
+    The straight line distance is multiplied by road_factor to approximate the
+    driving distance and divided by average_speed to estimate the duration.
+    Locations without coordinates are not resolved.
+    """
+
+    def __init__(
+        self,
+        unit: str = GoogleRouteDistanceUnitChoices.IMPERIAL,
+        road_factor: float = 1.2,
+        average_speed: float = 80467.2,
+    ) -> None:
+        """
+        :param unit: GoogleRouteDistanceUnitChoices value distances are returned in
+        :type unit: str
+        :param road_factor: Ratio of road distance to straight line distance
+        :type road_factor: float
+        :param average_speed: Average driving speed in meters per hour
+        :type average_speed: float
+        """
+        super().__init__(unit)
+        self.road_factor: float = road_factor
+        self.average_speed: float = average_speed
+
+    @staticmethod
+    def haversine(
+        origin: tuple[float, float], destination: tuple[float, float]
+    ) -> float:
+        """
+        Great circle distance between two (latitude, longitude) points.
+
+        :param origin: Latitude and longitude of the origin
+        :type origin: tuple[float, float]
+        :param destination: Latitude and longitude of the destination
+        :type destination: tuple[float, float]
+        :return: Distance in meters
+        :rtype: float
+        """
+        lat1, lng1, lat2, lng2 = map(math.radians, (*origin, *destination))
+        a: float = (
+            math.sin((lat2 - lat1) / 2) ** 2
+            + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+    def distance_matrix(
+        self, origins: list[Location], destinations: list[Location]
+    ) -> dict[tuple[str, str], RouteDistance]:
+        self.requests += 1
+        matrix: dict[tuple[str, str], RouteDistance] = {}
+        for origin in origins:
+            if origin.latitude is None or origin.longitude is None:
+                continue
+            for destination in destinations:
+                if destination.latitude is None or destination.longitude is None:
+                    continue
+                meters: float = self.road_factor * self.haversine(
+                    (origin.latitude, origin.longitude),
+                    (destination.latitude, destination.longitude),
+                )
+                matrix[(origin.location_id, destination.location_id)] = RouteDistance(
+                    distance=self.to_unit(meters),
+                    duration=round(meters / self.average_speed * 3600),
+                )
+        return matrix
+
+
+class GoogleDistanceProvider(DistanceProvider):
+    """
+    Google Distance Matrix API provider.
+    """
+
+    max_origins: int = 25
+    max_destinations: int = 25
+    max_elements: int = 100
+
+    def __init__(
+        self,
+        api_key: str,
+        unit: str = GoogleRouteDistanceUnitChoices.IMPERIAL,
+        language: str = "en",
+        traffic_model: str | None = None,
+    ) -> None:
+        """
+        :param api_key: Google Maps API key
+        :type api_key: str
+        :param unit: GoogleRouteDistanceUnitChoices value distances are returned in
+        :type unit: str
+        :param language: Language of the request
+        :type language: str
+        :param traffic_model: GoogleRouteModelChoices value
+        :type traffic_model: str | None
+        """
+        super().__init__(unit)
+        self.client: googlemaps.Client = googlemaps.Client(key=api_key)
+        self.language: str = language
+        self.traffic_model: str | None = traffic_model
+
+    def distance_matrix(
+        self, origins: list[Location], destinations: list[Location]
+    ) -> dict[tuple[str, str], RouteDistance]:
+        self.requests += 1
+        response = self.client.distance_matrix(
+            origins=[origin.get_address_combination for origin in origins],
+            destinations=[
+                destination.get_address_combination for destination in destinations
+            ],
+            mode="driving",
+            departure_time="now",
+            language=self.language,
+            units=self.unit,
+            traffic_model=self.traffic_model,
+        )
+        matrix: dict[tuple[str, str], RouteDistance] = {}
+        for origin, row in zip(origins, response["rows"]):
+            for destination, element in zip(destinations, row["elements"]):
+                if element.get("status") != "OK":
+                    continue
+                matrix[(origin.location_id, destination.location_id)] = RouteDistance(
+                    distance=self.to_unit(element["distance"]["value"]),
+                    duration=element["duration"]["value"],
+                )
+        return matrix
+
+
+def get_provider(organization: Organization) -> DistanceProvider | None:
+    """
+    Get the distance provider configured for an organization.
+
+    Organizations that do not generate routes get no provider. Organizations
+    without an active Google Maps integration fall back to the offline
+    estimator.
+
+    :param organization: Organization to resolve distances for
+    :type organization: Organization
+    :return: Distance provider or None
+    :rtype: DistanceProvider | None
+    """
+    organization_settings: OrganizationSettings | None = (
+        OrganizationSettings.objects.filter(organization=organization).first()
+    )
+    if organization_settings is None or not organization_settings.generate_routes:
+        return None
+
+    api_key: str | None = (
+        Integration.objects.filter(
+            organization=organization,
+            name=IntegrationChoices.GOOGLE_MAPS,
+            is_active=True,
+        )
+        .values_list("api_key", flat=True)
+        .first()
+    )
+    if api_key:
+        return GoogleDistanceProvider(
+            api_key=api_key,
+            unit=organization_settings.mileage_unit,
+            language=organization_settings.language,
+            traffic_model=organization_settings.traffic_model,
+        )
+    return HaversineDistanceProvider(unit=organization_settings.mileage_unit)
+
+
+def plan_matrix_requests(
+    pairs: Iterable[tuple[str, str]], provider: DistanceProvider
+) -> list[tuple[list[str], list[str]]]:
+    """
+    Pack location pairs into as few matrix requests as the provider allows.
+
+    Pairs are walked by origin and added to the current block while its
+    distinct origins, distinct destinations and their product stay within the
+    provider's limits, otherwise the block is sent and a new one started.
+    Origins sharing destinations end up in the same block, and unrelated lanes
+    share blocks too instead of costing a request each.
+
+    :param pairs: (origin location id, destination location id) pairs
+    :type pairs: Iterable[tuple[str, str]]
+    :param provider: Provider the requests are sent to
+    :type provider: DistanceProvider
+    :return: (origin ids, destination ids) of every request
+    :rtype: list[tuple[list[str], list[str]]]
+    """
+    requests: list[tuple[list[str], list[str]]] = []
+    origins: dict[str, None] = {}
+    destinations: dict[str, None] = {}
+    for origin, destination in sorted(set(pairs)):
+        origin_count: int = len(origins) + (origin not in origins)
+        destination_count: int = len(destinations) + (destination not in destinations)
+        if origins and (
+            origin_count > (provider.max_origins or origin_count)
+            or destination_count > (provider.max_destinations or destination_count)
+            or origin_count * destination_count
+            > (provider.max_elements or origin_count * destination_count)
+        ):
+            requests.append((list(origins), list(destinations)))
+            origins, destinations = {}, {}
+        origins[origin] = None
+        destinations[destination] = None
+    if origins:
+        requests.append((list(origins), list(destinations)))
+    return requests
+
+
+def get_route_distances(
+    organization: Organization,
+    pairs: Iterable[tuple[Location, Location]],
+    provider: DistanceProvider | None = None,
+) -> dict[tuple[str, str], Decimal]:
+    """
+    Resolve the distance of every origin/destination pair.
+
+    Pairs are looked up in the process cache first, then in the Route table
+    with a single query, and whatever is still missing is requested from the
+    provider in as few matrix requests as it allows. New routes are written
+    with one bulk insert.
+
+    :param organization: Organization the routes belong to
+    :type organization: Organization
+    :param pairs: (origin, destination) location pairs
+    :type pairs: Iterable[tuple[Location, Location]]
+    :param provider: Provider for missing routes, defaults to get_provider
+    :type provider: DistanceProvider | None
+    :return: Distances keyed by (origin location id, destination location id),
+        pairs that could not be resolved are left out
+    :rtype: dict[tuple[str, str], Decimal]
+    """
+    locations: dict[str, Location] = {}
+    missing: set[tuple[str, str]] = set()
+    distances: dict[tuple[str, str], Decimal] = {}
+    for origin, destination in pairs:
+        locations[origin.location_id] = origin
+        locations[destination.location_id] = destination
+        key: tuple[str, str] = (origin.location_id, destination.location_id)
+        if origin.location_id == destination.location_id:
+            distances[key] = Decimal("0.00")
+            continue
+        cached: Decimal | None = route_cache.get((organization.id, *key))
+        if cached is None:
+            missing.add(key)
+        else:
+            distances[key] = cached
+    if not missing:
+        return distances
+
+    for origin_id, destination_id, distance in Route.objects.filter(
+        organization=organization,
+        origin__in={origin for origin, _ in missing},
+        destination__in={destination for _, destination in missing},
+        distance__isnull=False,
+    ).values_list("origin", "destination", "distance"):
+        key = (origin_id, destination_id)
+        if key in missing:
+            missing.discard(key)
+            distances[key] = distance
+            route_cache.set((organization.id, *key), distance)
+    if not missing:
+        return distances
+
+    provider = provider or get_provider(organization)
+    if provider is None:
+        return distances
+
+    new_routes: list[Route] = []
+    for origin_ids, destination_ids in plan_matrix_requests(missing, provider):
+        matrix: dict[tuple[str, str], RouteDistance] = provider.distance_matrix(
+            [locations[origin_id] for origin_id in origin_ids],
+            [locations[destination_id] for destination_id in destination_ids],
+        )
+        for key, route in matrix.items():
+            if key not in missing:
+                continue
+            missing.discard(key)
+            distances[key] = route.distance
+            route_cache.set((organization.id, *key), route.distance)
+            new_routes.append(
+                Route(
+                    organization=organization,
+                    origin=key[0],
+                    destination=key[1],
+                    distance=route.distance,
+                    duration=route.duration,
+                )
+            )
+    Route.objects.bulk_create(new_routes)
+    return distances
+
+
+def get_route_distance(
+    organization: Organization,
+    origin: Location,
+    destination: Location,
+    provider: DistanceProvider | None = None,
+) -> Decimal | None:
+    """
+    Resolve the distance between two locations.
+
+    :param organization: Organization the route belongs to
+    :type organization: Organization
+    :param origin: Origin location
+    :type origin: Location
+    :param destination: Destination location
+    :type destination: Location
+    :param provider: Provider for a missing route, defaults to get_provider
+    :type provider: DistanceProvider | None
+    :return: Distance or None if it cannot be resolved
+    :rtype: Decimal | None
+    """
+    return get_route_distances(organization, [(origin, destination)], provider).get(
+        (origin.location_id, destination.location_id)
+    )
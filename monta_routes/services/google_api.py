@@ -18,18 +18,278 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
 import googlemaps
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
 from django.core.handlers.asgi import ASGIRequest
-from django.db.models import QuerySet
 from django.http import JsonResponse
 
 from monta_locations.models import Location
 from monta_organization.models import Integration, IntegrationChoices
+from monta_user.models import Organization
+
+GEOCODE_CONCURRENCY: int = 10
+GEOCODE_RATE_LIMIT: float = 40.0
+GEOCODE_BATCH_SIZE: int = 500
+GEOCODE_CACHE_TIMEOUT: int = 60 * 60 * 24 * 30
+
+# Errors of a single geocoder call, the address counts as failed and the batch goes on.
+GEOCODE_ERRORS: tuple[type[Exception], ...] = (
+    googlemaps.exceptions.ApiError,
+    googlemaps.exceptions.HTTPError,
+    googlemaps.exceptions.Timeout,
+    googlemaps.exceptions.TransportError,
+)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class GeocodeResult:
+    """
+    Coordinates and place id of a geocoded address.
+    """
+
+    latitude: float
+    longitude: float
+    place_id: str | None = None
+
+
+class Geocoder(ABC):
+    """
+    Source of coordinates for addresses.
+    """
+
+    @abstractmethod
+    async def geocode(self, address: str) -> GeocodeResult | None:
+        """
+        Geocode a single address.
+
+        :param address: Address to geocode
+        :type address: str
+        :return: Result or None if the address cannot be geocoded
+        :rtype: GeocodeResult | None
+        """
+
 
+class GoogleGeocoder(Geocoder):
+    """
+    Google Geocoding API geocoder.
+
+    googlemaps is synchronous, so every call runs in a worker thread instead of
+    blocking the event loop.
+    """
+
+    def __init__(self, api_key: str) -> None:
+        """
+        :param api_key: Google Maps API key
+        :type api_key: str
+        """
+        self.client: googlemaps.Client = googlemaps.Client(key=api_key)
+
+    async def geocode(self, address: str) -> GeocodeResult | None:
+        results: list[dict[str, Any]] = await sync_to_async(
+            self.client.geocode, thread_sensitive=False
+        )(address)
+        if not results:
+            return None
+        return GeocodeResult(
+            latitude=results[0]["geometry"]["location"]["lat"],
+            longitude=results[0]["geometry"]["location"]["lng"],
+            place_id=results[0]["place_id"],
+        )
+
+
+class AsyncRateLimiter:
+    """
+    Space calls evenly so no more than rate calls start per second.
+    """
+
+    def __init__(self, rate: float) -> None:
+        """
+        :param rate: Calls per second
+        :type rate: float
+        """
+        self.interval: float = 1 / rate
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._next: float = 0.0
+
+    async def wait(self) -> None:
+        """
+        Wait for the next free slot.
+
+        :return: None
+        :rtype: None
+        """
+        async with self._lock:
+            now: float = asyncio.get_running_loop().time()
+            delay: float = self._next - now
+            self._next = max(now, self._next) + self.interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+def normalize_address(address: str) -> str:
+    """
+    Normalize an address so equivalent spellings share a cache entry.
 
-@async_to_sync
-async def geocode_locations(request: ASGIRequest) -> JsonResponse:
+    :param address: Address to normalize
+    :type address: str
+    :return: Lower cased address with collapsed whitespace
+    :rtype: str
+    """
+    return " ".join(address.replace(" None,", ",").lower().split())
+
+
+def _cache_key(address: str) -> str:
+    """
+    Cache key of a normalized address.
+    """
+    return f"geocode:{hashlib.sha1(address.encode()).hexdigest()}"
+
+
+async def ageocode_addresses(
+    addresses: Iterable[str],
+    geocoder: Geocoder,
+    concurrency: int = GEOCODE_CONCURRENCY,
+    rate: float = GEOCODE_RATE_LIMIT,
+) -> dict[str, GeocodeResult | None]:
+    """
+    Geocode addresses concurrently, each distinct normalized address once.
+
+    Cached results are used first. The remaining addresses are sent to the
+    geocoder with at most concurrency calls in flight and at most rate calls
+    started per second, and their results are cached. An address the
+    geocoder fails on is returned as None and not cached, so it is tried
+    again next time.
+
+    :param addresses: Addresses to geocode
+    :type addresses: Iterable[str]
+    :param geocoder: Geocoder to call
+    :type geocoder: Geocoder
+    :param concurrency: Maximum concurrent geocoder calls
+    :type concurrency: int
+    :param rate: Maximum geocoder calls per second
+    :type rate: float
+    :return: Results keyed by normalized address
+    :rtype: dict[str, GeocodeResult | None]
+    """
+    unique: set[str] = {normalize_address(address) for address in addresses}
+    cached: dict[str, GeocodeResult] = await cache.aget_many(
+        [_cache_key(address) for address in unique]
+    )
+    results: dict[str, GeocodeResult | None] = {}
+    pending: list[str] = []
+    for address in unique:
+        result: GeocodeResult | None = cached.get(_cache_key(address))
+        if result is None:
+            pending.append(address)
+        else:
+            results[address] = result
+
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+    limiter: AsyncRateLimiter = AsyncRateLimiter(rate)
+
+    async def geocode(address: str) -> GeocodeResult | None:
+        async with semaphore:
+            await limiter.wait()
+            try:
+                return await geocoder.geocode(address)
+            except GEOCODE_ERRORS as e:
+                logger.warning("Geocoding %r failed: %s", address, e)
+                return None
+
+    for address, result in zip(
+        pending, await asyncio.gather(*(geocode(address) for address in pending))
+    ):
+        results[address] = result
+    await cache.aset_many(
+        {
+            _cache_key(address): results[address]
+            for address in pending
+            if results[address] is not None
+        },
+        timeout=GEOCODE_CACHE_TIMEOUT,
+    )
+    return results
+
+
+async def ageocode_locations(
+    organization: Organization,
+    geocoder: Geocoder,
+    batch_size: int = GEOCODE_BATCH_SIZE,
+) -> dict[str, int]:
+    """
+    Geocode every location of an organization that is not geocoded yet.
+
+    Locations are processed in batches of batch_size. Each batch is geocoded
+    concurrently and written with a single bulk update.
+
+    :param organization: Organization whose locations are geocoded
+    :type organization: Organization
+    :param geocoder: Geocoder to call
+    :type geocoder: Geocoder
+    :param batch_size: Locations per batch
+    :type batch_size: int
+    :return: Counts of geocoded and failed locations
+    :rtype: dict[str, int]
+    """
+    counts: dict[str, int] = {"geocoded": 0, "failed": 0}
+    last_id: int = 0
+    while True:
+        locations: list[Location] = [
+            location
+            async for location in Location.objects.filter(
+                organization=organization, is_geocoded=False, pk__gt=last_id
+            )
+            .order_by("pk")
+            .only(
+                "id",
+                "address_line_1",
+                "address_line_2",
+                "city",
+                "state",
+                "zip_code",
+            )[:batch_size]
+        ]
+        if not locations:
+            return counts
+        last_id = locations[-1].pk
+
+        results: dict[str, GeocodeResult | None] = await ageocode_addresses(
+            [location.get_address_combination for location in locations], geocoder
+        )
+        geocoded: list[Location] = []
+        for location in locations:
+            result: GeocodeResult | None = results[
+                normalize_address(location.get_address_combination)
+            ]
+            if result is None:
+                counts["failed"] += 1
+                continue
+            location.latitude = result.latitude
+            location.longitude = result.longitude
+            location.place_id = result.place_id
+            location.is_geocoded = True
+            geocoded.append(location)
+
+        await Location.objects.abulk_update(
+            geocoded,
+            fields=["latitude", "longitude", "place_id", "is_geocoded"],
+            batch_size=batch_size,
+        )
+        counts["geocoded"] += len(geocoded)
+
+
+def geocode_locations(request: ASGIRequest) -> JsonResponse:
     """
     Process to geocode locations
 
@@ -39,42 +299,26 @@ async def geocode_locations(request: ASGIRequest) -> JsonResponse:
     :rtype: JsonResponse
     """
     # Get the organization's Google API key
-    google_api: Integration = await Integration.objects.filter(
-        organization=request.user.profile.organization,
-        name__exact=IntegrationChoices.GOOGLE_MAPS,
-        is_active=True,
-    ).aget()
-    if google_api:
-        gmaps: googlemaps.Client = googlemaps.Client(key=google_api.api_key)
-
-        # Query the database for all locations that need to be geocoded
-        locations: QuerySet[Location] = Location.objects.filter(
-            organization=request.user.profile.organization, is_geocoded=False
+    organization: Organization = request.user.profile.organization
+    api_key: str | None = (
+        Integration.objects.filter(
+            organization=organization,
+            name__exact=IntegrationChoices.GOOGLE_MAPS,
+            is_active=True,
         )
-        if locations is None:
-            return JsonResponse({"message": "No locations found."}, status=404)
-
-        # For each location, geocode it and update the database
-        async for location in locations:
-            geocode_result = gmaps.geocode(location.get_address_combination)
-
-            if geocode_result:
-                location.latitude = geocode_result[0]["geometry"]["location"]["lat"]
-                location.longitude = geocode_result[0]["geometry"]["location"]["lng"]
-                location.place_id = geocode_result[0]["place_id"]
-                location.is_geocoded = True
-
-                # Bulk update the database
-                await Location.objects.abulk_update(
-                    [location],
-                    fields=["latitude", "longitude", "place_id", "is_geocoded"],
-                    batch_size=100,
-                )
+        .values_list("api_key", flat=True)
+        .first()
+    )
+    if not api_key:
         return JsonResponse(
-            {"result": "success", "message": "Locations Geocoded"}, status=200
+            {"result": "error", "message ": "No Integration Set"}, status=200
         )
+
+    counts: dict[str, int] = async_to_sync(ageocode_locations)(
+        organization, GoogleGeocoder(api_key)
+    )
     return JsonResponse(
-        {"result": "error", "message ": "No Integration Set"}, status=200
+        {"result": "success", "message": "Locations Geocoded", **counts}, status=200
     )
 
 
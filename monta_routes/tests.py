@@ -18,7 +18,15 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from django.test import TestCase
+import math
+from decimal import Decimal
+
+import googlemaps
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from monta_locations.models import Location
+from monta_routes.services import distance, google_api
 
 
 class LocationTest(TestCase):
@@ -36,3 +44,148 @@ class LocationTest(TestCase):
 
     def test_delete_location(self) -> None:
         pass
+
+
+class FakeMatrixProvider(distance.DistanceProvider):
+    """
+    Provider with the Google Distance Matrix limits that records its requests
+    """
+
+    max_origins = 25
+    max_destinations = 25
+    max_elements = 100
+
+    def distance_matrix(self, origins, destinations):
+        self.requests += 1
+        return {
+            (origin.location_id, destination.location_id): distance.RouteDistance(
+                Decimal("1.00")
+            )
+            for origin in origins
+            for destination in destinations
+        }
+
+
+class RouteDistanceTest(TestCase):
+    def test_route_cache_evicts_least_recently_used(self) -> None:
+        """
+        Test that the cache keeps the most recently used routes
+        """
+        cache = distance.RouteCache(maxsize=2)
+        cache.set((1, "a", "b"), Decimal("1.00"))
+        cache.set((1, "a", "c"), Decimal("2.00"))
+        cache.get((1, "a", "b"))
+        cache.set((1, "a", "d"), Decimal("3.00"))
+        self.assertEqual(cache.get((1, "a", "b")), Decimal("1.00"))
+        self.assertIsNone(cache.get((1, "a", "c")))
+        self.assertEqual(len(cache), 2)
+
+    def test_haversine_estimate(self) -> None:
+        """
+        Test the offline estimate between Charlotte and Raleigh
+        """
+        provider = distance.HaversineDistanceProvider(road_factor=1.0)
+        charlotte = Location(location_id="clt", latitude=35.2271, longitude=-80.8431)
+        raleigh = Location(location_id="rdu", latitude=35.7796, longitude=-78.6382)
+        not_geocoded = Location(location_id="none")
+        matrix = provider.distance_matrix([charlotte], [raleigh, not_geocoded])
+        self.assertEqual(list(matrix), [("clt", "rdu")])
+        self.assertAlmostEqual(float(matrix[("clt", "rdu")].distance), 130, delta=2)
+
+    def test_plan_matrix_requests_respects_limits(self) -> None:
+        """
+        Test that pairs are packed into as few requests as the limits allow
+        """
+        provider = FakeMatrixProvider()
+        pairs = {(f"o{i}", f"d{j}") for i in range(10) for j in range(25)}
+        pairs.add(("o99", "d0"))
+        requests = distance.plan_matrix_requests(pairs, provider)
+        for origins, destinations in requests:
+            self.assertLessEqual(len(origins) * len(destinations), 100)
+        self.assertEqual(len(requests), 3)
+        covered = {
+            (origin, destination)
+            for origins, destinations in requests
+            for origin in origins
+            for destination in destinations
+        }
+        self.assertTrue(pairs <= covered)
+
+    def test_plan_matrix_requests_packs_unrelated_lanes(self) -> None:
+        """
+        Test that lanes sharing no locations are packed into shared blocks
+        """
+        provider = FakeMatrixProvider()
+        for count in (1, 10, 11, 95):
+            pairs = {(f"o{i:03}", f"d{i:03}") for i in range(count)}
+            requests = distance.plan_matrix_requests(pairs, provider)
+            # Ten origins by ten destinations is the largest square block.
+            self.assertEqual(len(requests), math.ceil(count / 10))
+            for origins, destinations in requests:
+                self.assertLessEqual(len(origins), 25)
+                self.assertLessEqual(len(destinations), 25)
+                self.assertLessEqual(len(origins) * len(destinations), 100)
+            covered = {
+                (origin, destination)
+                for origins, destinations in requests
+                for origin in origins
+                for destination in destinations
+            }
+            self.assertTrue(pairs <= covered)
+
+        pairs = {("o000", f"d{i:03}") for i in range(60)}
+        self.assertEqual(len(distance.plan_matrix_requests(pairs, provider)), 3)
+
+
+class FakeGeocoder(google_api.Geocoder):
+    """
+    Geocoder that records the addresses it is asked for
+    """
+
+    def __init__(self) -> None:
+        self.addresses: list[str] = []
+
+    async def geocode(self, address):
+        self.addresses.append(address)
+        if "nowhere" in address:
+            return None
+        if "timeout" in address:
+            raise googlemaps.exceptions.Timeout()
+        return google_api.GeocodeResult(latitude=35.0, longitude=-80.0)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class GeocodeTest(TestCase):
+    def test_addresses_are_deduplicated_and_cached(self) -> None:
+        """
+        Test that each normalized address is geocoded once and then cached
+        """
+        geocoder = FakeGeocoder()
+        addresses = [
+            "1 Main St None, Charlotte NC, 28202",
+            "1  MAIN st, Charlotte NC, 28202",
+            "2 Nowhere Rd None, Charlotte NC, 28202",
+        ]
+        results = async_to_sync(google_api.ageocode_addresses)(addresses, geocoder)
+        self.assertEqual(len(geocoder.addresses), 2)
+        self.assertIsNone(results["2 nowhere rd, charlotte nc, 28202"])
+
+        async_to_sync(google_api.ageocode_addresses)(addresses, geocoder)
+        self.assertEqual(geocoder.addresses[2:], ["2 nowhere rd, charlotte nc, 28202"])
+
+    def test_provider_error_fails_one_address(self) -> None:
+        """
+        Test that an address the provider errors on fails alone and is not cached
+        """
+        geocoder = FakeGeocoder()
+        addresses = ["1 Main St, Charlotte NC", "3 Timeout Ave, Charlotte NC"]
+        with self.assertLogs(google_api.logger, "WARNING"):
+            results = async_to_sync(google_api.ageocode_addresses)(addresses, geocoder)
+        self.assertIsNotNone(results["1 main st, charlotte nc"])
+        self.assertIsNone(results["3 timeout ave, charlotte nc"])
+
+        with self.assertLogs(google_api.logger, "WARNING"):
+            async_to_sync(google_api.ageocode_addresses)(addresses, geocoder)
+        self.assertEqual(geocoder.addresses[2:], ["3 timeout ave, charlotte nc"])
@@ -24,5 +24,5 @@ class MontaUserConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "monta_user"
 
-    # def ready(self):
-    #     import monta_user.signals
+    def ready(self):
+        import monta_user.signals
@@ -15,6 +15,9 @@ class JobTitleFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = JobTitle
 
+    organization = factory.SubFactory(
+        "monta_user.factories.organization.OrganizationFactory"
+    )
     name = factory.Faker("job")
 
 
@@ -59,7 +62,7 @@ class ProfileFactory(factory.django.DjangoModelFactory):
     last_name = factory.Faker("last_name")
     email_verified = factory.Faker("boolean")
     phone = factory.Faker("phone_number")
-    address = factory.Faker("address")
+    address_line_1 = factory.Faker("street_address")
     city = factory.Faker("city")
     state = factory.Faker("state_abbr")
     zip_code = factory.Faker("zipcode")
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+COPYRIGHT 2022 MONTA
+
+This file is part of Monta.
+
+Monta is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Monta is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Monta.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterable
+from typing import Any
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from monta_user.models import MontaUser, Profile
+
+IDENTITY_CACHE_TIMEOUT: int = 60 * 5
+
+# Only what request handling needs, never the password hash. is_active is
+# skipped while MontaUser inherits it from AbstractBaseUser instead of storing it.
+USER_FIELDS: tuple[str, ...] = tuple(
+    name
+    for name in ("id", "username", "email", "is_active", "is_staff", "is_superuser")
+    if name in {field.attname for field in MontaUser._meta.concrete_fields}
+)
+PROFILE_FIELDS: tuple[str, ...] = ("id", "user_id", "organization_id")
+
+
+def get_identity_cache_key(user_id: int) -> str:
+    """
+    Get the cache key of a user's identity.
+
+    :param user_id: Id of the user
+    :type user_id: int
+    :return: Cache key
+    :rtype: str
+    """
+    return f"monta:identity:{user_id}"
+
+
+def load_identity(user_id: int) -> dict[str, Any] | None:
+    """
+    Load a user's identity fields, profile id, organization id and permissions.
+
+    The user and profile are read with one query and the permission set with
+    a second one.
+
+    :param user_id: Id of the user
+    :type user_id: int
+    :return: Identity or None if the user does not exist
+    :rtype: dict[str, Any] | None
+    """
+    row: tuple[Any, ...] | None = (
+        MontaUser.objects.filter(pk=user_id)
+        .values_list(*USER_FIELDS, "profile__id", "profile__organization_id")
+        .first()
+    )
+    if row is None:
+        return None
+
+    user: dict[str, Any] = dict(zip(USER_FIELDS, row))
+    permissions = Permission.objects.all()
+    if not user["is_superuser"]:
+        permissions = permissions.filter(user=user_id) | permissions.filter(
+            group__user=user_id
+        )
+    return {
+        "user": user,
+        "profile_id": row[-2],
+        "organization_id": row[-1],
+        "permissions": set(
+            f"{app_label}.{codename}"
+            for app_label, codename in permissions.values_list(
+                "content_type__app_label", "codename"
+            )
+        ),
+    }
+
+
+def build_user(identity: dict[str, Any]) -> MontaUser:
+    """
+    Rebuild a user with its profile and permission cache attached.
+
+    Fields that are not cached, the organization included, are loaded on
+    access like deferred fields.
+
+    :param identity: Identity from load_identity
+    :type identity: dict[str, Any]
+    :return: User instance
+    :rtype: MontaUser
+    """
+    user: MontaUser = MontaUser.from_db(
+        DEFAULT_DB_ALIAS,
+        list(USER_FIELDS),
+        [identity["user"][name] for name in USER_FIELDS],
+    )
+    if identity["profile_id"] is not None:
+        user.profile = Profile.from_db(
+            DEFAULT_DB_ALIAS,
+            list(PROFILE_FIELDS),
+            [identity["profile_id"], user.pk, identity["organization_id"]],
+        )
+
+    # ModelBackend reads these instead of querying the permission tables.
+    user._perm_cache = set(identity["permissions"])
+    user._user_perm_cache = user._perm_cache
+    user._group_perm_cache = user._perm_cache
+    return user
+
+
+def get_cached_user(user_id: int) -> MontaUser | None:
+    """
+    Get a user from the identity cache, loading it on a miss.
+
+    :param user_id: Id of the user
+    :type user_id: int
+    :return: User or None if the user does not exist
+    :rtype: MontaUser | None
+    """
+    key: str = get_identity_cache_key(user_id)
+    identity: dict[str, Any] | None = cache.get(key)
+    if identity is None:
+        identity = load_identity(user_id)
+        if identity is None:
+            return None
+        cache.set(key, identity, IDENTITY_CACHE_TIMEOUT)
+    return build_user(identity)
+
+
+def invalidate_identities(user_ids: Iterable[int]) -> None:
+    """
+    Drop the cached identity of the given users.
+
+    :param user_ids: Ids of the users
+    :type user_ids: Iterable[int]
+    :return: None
+    :rtype: None
+    """
+    keys: list[str] = [get_identity_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
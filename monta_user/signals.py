@@ -18,16 +18,78 @@ You should have received a copy of the GNU General Public License
 along with Monta.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
 from monta_user import models
+from monta_user.services.identity import invalidate_identities
+
+
+@receiver(post_save, sender=models.MontaUser)
+@receiver(post_delete, sender=models.MontaUser)
+def invalidate_user_identity(sender, instance, **kwargs) -> None:
+    """
+    Drop the cached identity of a changed user
+    """
+    invalidate_identities([instance.pk])
 
 
 @receiver(post_save, sender=models.Profile)
-def create_profile(sender, instance, created, **kwargs) -> None:
+@receiver(post_delete, sender=models.Profile)
+def invalidate_profile_identity(sender, instance, **kwargs) -> None:
+    """
+    Drop the cached identity of the user of a changed profile
+    """
+    invalidate_identities([instance.user_id])
+
+
+@receiver(post_save, sender=models.Organization)
+@receiver(post_delete, sender=models.Organization)
+def invalidate_organization_identities(sender, instance, **kwargs) -> None:
+    """
+    Drop the cached identity of every user of a changed organization
+    """
+    invalidate_identities(
+        models.Profile.objects.filter(organization_id=instance.pk).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+@receiver(m2m_changed, sender=models.MontaUser.user_permissions.through)
+@receiver(m2m_changed, sender=models.MontaUser.groups.through)
+def invalidate_user_permissions(
+    sender, instance, action, reverse, pk_set, **kwargs
+) -> None:
+    """
+    Drop the cached identity of users whose permissions or groups changed
+    """
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate_identities([instance.pk])
+    elif isinstance(instance, Group):
+        invalidate_identities(instance.user_set.values_list("pk", flat=True))
+    else:
+        # A permission was added to or removed from users.
+        invalidate_identities(
+            pk_set
+            if pk_set is not None
+            else instance.user_set.values_list("pk", flat=True)
+        )
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(
+    sender, instance, action, reverse, pk_set, **kwargs
+) -> None:
     """
-    Create a profile for the user
+    Drop the cached identity of the members of groups whose permissions changed
     """
-    if created:
-        models.Profile.objects.create(user=instance)
+    if not action.startswith("post_"):
+        return
+    groups = Group.objects.filter(pk__in=pk_set or []) if reverse else [instance]
+    invalidate_identities(
+        models.MontaUser.objects.filter(groups__in=groups).values_list("pk", flat=True)
+    )
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
-from django.test import TestCase
+from django.contrib import auth
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 
+from monta.backends import MontaBackend
 from monta_user.factories.user import MontaUserFactory, ProfileFactory
+from monta_user.services import identity
 
 
 class MontaUserTest(TestCase):
@@ -32,3 +37,68 @@ class MontaUserTest(TestCase):
         Test that the user has a job title
         """
         self.assertTrue(self.profile.title)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class IdentityCacheTest(TestCase):
+    def setUp(self):
+        self.user = MontaUserFactory.create()
+        self.profile = ProfileFactory.create(user=self.user)
+        self.backend = MontaBackend()
+
+    def test_cached_user_costs_no_queries(self):
+        """
+        Test that a cached user resolves its profile, organization id and permissions without queries
+        """
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertEqual(user.profile.organization_id, self.profile.organization_id)
+            self.assertFalse(self.backend.has_perm(user, "monta_order.add_order"))
+
+    def test_authenticated_request_costs_one_query(self):
+        """
+        Test that a session's user is resolved with only the password hash query
+        """
+        self.client.force_login(self.user, backend="monta.backends.MontaBackend")
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        request.session.load()
+        auth.get_user(request)
+        with self.assertNumQueries(1):
+            user = auth.get_user(request)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_authenticated)
+
+    def test_password_is_not_cached(self):
+        """
+        Test that the cached identity holds no credentials
+        """
+        self.backend.get_user(self.user.pk)
+        cached = cache.get(identity.get_identity_cache_key(self.user.pk))
+        self.assertNotIn("password", cached["user"])
+        self.assertNotIn(self.user.password, repr(cached))
+
+    def test_changes_invalidate_identity(self):
+        """
+        Test that permission and organization changes are picked up
+        """
+        self.backend.get_user(self.user.pk)
+        self.user.user_permissions.add(
+            Permission.objects.get(
+                content_type__app_label="monta_order", codename="add_order"
+            )
+        )
+        self.assertTrue(
+            self.backend.has_perm(
+                self.backend.get_user(self.user.pk), "monta_order.add_order"
+            )
+        )
+
+        self.profile.organization.name = "renamed"
+        self.profile.organization.save()
+        self.assertEqual(
+            self.backend.get_user(self.user.pk).profile.organization.name, "renamed"
+        )